@@ -0,0 +1,24 @@
+
+-- Latest known state of every superform each SuperVault has whitelisted.
+-- Small enough to rebuild in full on every run.
+
+{{ config(
+    materialized='table',
+    engine='MergeTree()',
+    order_by='(chain_id, vault_address, form_id)'
+) }}
+
+select
+    chain_id,
+    vault_address,
+    form_id,
+    argMax(form_id_hex, block_number) as form_id_hex,
+    argMax(superform_address, block_number) as superform_address,
+    argMax(form_implementation_id, block_number) as form_implementation_id,
+    argMax(superform_chain_id, block_number) as superform_chain_id,
+    min(block_number) as first_block,
+    max(block_number) as last_block,
+    min(timestamp) as first_seen,
+    max(timestamp) as last_seen
+from {{ source('super_vault', 'supervault_whitelist') }} final
+group by chain_id, vault_address, form_id
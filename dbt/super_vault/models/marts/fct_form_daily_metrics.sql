@@ -0,0 +1,37 @@
+
+-- Daily open/close share price, TVL and supply per form.
+-- Each run recomputes every (chain_id, form_address, day) that received snapshots since the
+-- latest inserted_at already loaded, including days backfilled late; the newer row for a
+-- (chain_id, form_address, day) replaces the older one through updated_at.
+
+{{ config(
+    materialized='incremental',
+    incremental_strategy='append',
+    on_schema_change='append_new_columns',
+    engine='ReplacingMergeTree(updated_at)',
+    order_by='(chain_id, form_address, day)',
+    partition_by='toYYYYMM(day)'
+) }}
+
+select
+    chain_id,
+    form_address,
+    toDate(block_timestamp) as day,
+    max(vault_decimals) as vault_decimals,
+    argMin(price_per_share, block_number) as open_price_per_share,
+    argMax(price_per_share, block_number) as close_price_per_share,
+    argMax(total_assets, block_number) as tvl,
+    argMax(total_supply, block_number) as total_supply,
+    min(block_number) as first_block,
+    max(block_number) as last_block,
+    max(inserted_at) as inserted_at,
+    now() as updated_at
+from {{ source('super_vault', 'form_snapshots') }}
+{% if is_incremental() %}
+where (chain_id, form_address, toDate(block_timestamp)) in (
+    select chain_id, form_address, toDate(block_timestamp)
+    from {{ source('super_vault', 'form_snapshots') }}
+    where inserted_at >= (select max(inserted_at) from {{ this }}) - interval {{ var('ingestion_lookback_seconds') }} second
+)
+{% endif %}
+group by chain_id, form_address, day
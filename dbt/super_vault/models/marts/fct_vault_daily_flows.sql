@@ -0,0 +1,35 @@
+
+-- Daily deposits, withdrawals and net asset flow per vault.
+-- Like fct_form_daily_metrics, each run recomputes the (chain_id, contract_address, day)
+-- groups with events staged since the latest inserted_at already loaded.
+
+{{ config(
+    materialized='incremental',
+    incremental_strategy='append',
+    on_schema_change='append_new_columns',
+    engine='ReplacingMergeTree(updated_at)',
+    order_by='(chain_id, contract_address, day)',
+    partition_by='toYYYYMM(day)'
+) }}
+
+select
+    chain_id,
+    contract_address,
+    toDate(block_timestamp) as day,
+    sumIf(assets, event_name = 'Deposit') as deposited_assets,
+    sumIf(assets, event_name = 'Withdraw') as withdrawn_assets,
+    toInt256(deposited_assets) - toInt256(withdrawn_assets) as net_assets,
+    countIf(event_name = 'Deposit') as deposits,
+    countIf(event_name = 'Withdraw') as withdrawals,
+    uniqExact(account) as unique_accounts,
+    max(inserted_at) as inserted_at,
+    now() as updated_at
+from {{ ref('stg_vault_flows') }} final
+{% if is_incremental() %}
+where (chain_id, contract_address, toDate(block_timestamp)) in (
+    select chain_id, contract_address, toDate(block_timestamp)
+    from {{ ref('stg_vault_flows') }}
+    where inserted_at >= (select max(inserted_at) from {{ this }}) - interval {{ var('ingestion_lookback_seconds') }} second
+)
+{% endif %}
+group by chain_id, contract_address, day
@@ -0,0 +1,32 @@
+
+-- ERC4626 deposits and withdrawals with their amounts unpacked from the JSON args.
+-- Each run only reads events ingested since the latest inserted_at already loaded, so
+-- backfilled history is picked up however old its blocks are; the overlap is collapsed
+-- by ReplacingMergeTree on the event's primary key.
+
+{{ config(
+    materialized='incremental',
+    incremental_strategy='append',
+    on_schema_change='append_new_columns',
+    engine='ReplacingMergeTree()',
+    order_by='(chain_id, contract_address, block_number, log_index)',
+    partition_by='toYYYYMM(block_timestamp)'
+) }}
+
+select
+    chain_id,
+    contract_address,
+    event_name,
+    block_number,
+    block_timestamp,
+    transaction_hash,
+    log_index,
+    JSONExtractString(args, if(event_name = 'Deposit', 'receiver', 'owner')) as account,
+    toUInt256(JSONExtractString(args, 'assets')) as assets,
+    toUInt256(JSONExtractString(args, 'shares')) as shares,
+    inserted_at
+from {{ source('super_vault', 'contract_events') }}
+where event_name in ('Deposit', 'Withdraw')
+{% if is_incremental() %}
+  and inserted_at >= (select max(inserted_at) from {{ this }}) - interval {{ var('ingestion_lookback_seconds') }} second
+{% endif %}
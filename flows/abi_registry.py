@@ -0,0 +1,201 @@
+import os
+import glob
+import json
+import time
+import pickle
+import threading
+from dotenv import load_dotenv
+from eth_utils import abi_to_signature, event_abi_to_log_topic, function_abi_to_4byte_selector
+
+load_dotenv(".env")
+
+# Global configuration
+ABI_DIR = os.getenv('ABI_DIR', 'abi')
+ABI_REGISTRY_PATH = os.getenv('ABI_REGISTRY_PATH', '.cache/abi_registry.pkl')
+
+_registry = None
+_registry_lock = threading.Lock()
+
+class AbiRegistry:
+    """
+    Process-wide store of parsed ABIs, their function selectors and event topics, and
+    the web3 contract factories built from them.
+
+    Every ABI file is parsed once per process. If a pickled export newer than the JSON
+    sources exists it is loaded instead, so workers skip JSON parsing and keccak hashing.
+    """
+    def __init__(self, abi_dir=ABI_DIR, path=ABI_REGISTRY_PATH):
+        self.abi_dir = abi_dir
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.factories = {}
+        self._load_export()
+
+    def _source(self, name):
+        # Accept bare names ('erc20') as well as paths ('abi/erc20.json')
+        if name.endswith('.json'):
+            return name
+        return os.path.join(self.abi_dir, f"{name}.json")
+
+    def _load_export(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as file:
+            exported = pickle.load(file)
+
+        # Keep only entries whose JSON source is unchanged since the export
+        for source, entry in exported.items():
+            if os.path.exists(source) and os.stat(source).st_mtime_ns == entry['mtime_ns']:
+                self.entries[source] = entry
+
+    def _parse(self, source):
+        with open(source) as file:
+            abi = json.load(file)
+
+        selectors = {}
+        topics = {}
+        for item in abi:
+            if item['type'] == 'function':
+                selectors[abi_to_signature(item)] = '0x' + function_abi_to_4byte_selector(item).hex()
+            elif item['type'] == 'event' and not item.get('anonymous'):
+                topics[abi_to_signature(item)] = '0x' + event_abi_to_log_topic(item).hex()
+
+        return {
+            'mtime_ns': os.stat(source).st_mtime_ns,
+            'abi': abi,
+            'selectors': selectors,
+            'topics': topics,
+        }
+
+    def entry(self, name):
+        source = self._source(name)
+        entry = self.entries.get(source)
+        if entry is None:
+            with self.lock:
+                entry = self.entries.get(source)
+                if entry is None:
+                    if not os.path.exists(source):
+                        raise FileNotFoundError(f"Required file not found: {source}")
+                    entry = self._parse(source)
+                    self.entries[source] = entry
+        return entry
+
+    def abi(self, name):
+        return self.entry(name)['abi']
+
+    def selectors(self, name):
+        """Return {function signature: 4-byte selector hex} for the ABI."""
+        return self.entry(name)['selectors']
+
+    def topics(self, name):
+        """Return {event signature: topic0 hex} for the ABI."""
+        return self.entry(name)['topics']
+
+    def function_signatures(self):
+        """Return {4-byte selector hex: function signature} across every ABI in `abi_dir`."""
+        self.preload()
+        with self.lock:
+            entries = list(self.entries.values())
+        return {
+            selector: signature
+            for entry in entries
+            for signature, selector in entry['selectors'].items()
+        }
+
+    def contract(self, w3, name, address=None):
+        """
+        Return a contract bound to `w3` at `address`.
+
+        The contract factory, whose function and event tables web3 builds from the ABI,
+        is created once per Web3 instance and ABI and reused for every address.
+        """
+        key = (id(w3), self._source(name))
+        factory = self.factories.get(key)
+        if factory is None:
+            factory = w3.eth.contract(abi=self.abi(name))
+            with self.lock:
+                factory = self.factories.setdefault(key, factory)
+        return factory(address=address) if address is not None else factory
+
+    def preload(self):
+        """Parse every ABI in `abi_dir`."""
+        for source in sorted(glob.glob(os.path.join(self.abi_dir, '*.json'))):
+            self.entry(source)
+        return self
+
+    def export(self, path=None):
+        """Write every parsed ABI to a pickle that later processes load instead of the JSON files."""
+        path = path or self.path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            entries = dict(self.entries)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(entries, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+def get_abi_registry():
+    """Return the process-wide ABI registry, loading it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AbiRegistry()
+        return _registry
+
+def get_abi(name):
+    return get_abi_registry().abi(name)
+
+def get_contract(w3, name, address=None):
+    return get_abi_registry().contract(w3, name, address)
+
+def measure_startup(rounds=200):
+    """
+    Compare per-task startup: loading the four SuperformConfig ABIs from JSON and building
+    a contract from each, against the warm registry and a cold start from the pickled export.
+    """
+    from web3 import Web3
+    names = ['erc20', 'erc4626', 'erc4626_form', 'super_vault']
+    address = '0x' + '00' * 20
+    w3 = Web3()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            with open(os.path.join(ABI_DIR, f"{name}.json")) as file:
+                w3.eth.contract(address=address, abi=json.load(file))
+    json_ms = (time.perf_counter() - started) / rounds * 1000
+
+    registry = AbiRegistry(path=None)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            registry.contract(w3, name, address)
+    warm_ms = (time.perf_counter() - started) / rounds * 1000
+
+    registry.preload()
+    export_path = registry.export(ABI_REGISTRY_PATH)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cold = AbiRegistry(path=export_path)
+        for name in names:
+            cold.selectors(name)
+    pickle_ms = (time.perf_counter() - started) / rounds * 1000
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cold = AbiRegistry(path=None)
+        for name in names:
+            cold.selectors(name)
+    parse_ms = (time.perf_counter() - started) / rounds * 1000
+
+    print(f"Per-task startup, {len(names)} ABIs, mean of {rounds} rounds")
+    print(f"  JSON load + contract build     {json_ms:8.3f} ms")
+    print(f"  registry (warm process)        {warm_ms:8.3f} ms")
+    print(f"  cold start, parse + hash JSON  {parse_ms:8.3f} ms")
+    print(f"  cold start, pickled export     {pickle_ms:8.3f} ms")
+
+if __name__ == "__main__":
+    measure_startup()
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from block_index import SECONDS_PER_DAY
+
+SECONDS_PER_YEAR = 365 * SECONDS_PER_DAY
+
+APY_WINDOWS = {
+    '1d': SECONDS_PER_DAY,
+    '7d': 7 * SECONDS_PER_DAY,
+    '30d': 30 * SECONDS_PER_DAY,
+}
+
+# Integers below 2**53 convert to float64 exactly
+MAX_EXACT_FLOAT_INT = 2**53
+
+def split_uint256(values):
+    """
+    Split raw price-per-share integers into float64 (hi, lo) arrays with hi + lo == value.
+
+    uint256 values do not fit any NumPy integer dtype and lose their low digits as a
+    single float64; the pair keeps ~106 bits, so returns between two close prices stay
+    exact. Missing values (None/NaN) become NaN.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return values.astype(np.float64), np.zeros(values.shape)
+    if values.dtype.kind in 'iu' and (values.size == 0 or np.abs(values).max() < MAX_EXACT_FLOAT_INT):
+        return values.astype(np.float64), np.zeros(values.shape)
+
+    objects = values.astype(object)
+    missing = pd.isna(objects)
+    objects = np.where(missing, 0, objects)
+    hi = objects.astype(np.float64)
+    lo = (objects - np.frompyfunc(int, 1, 1)(hi)).astype(np.float64)
+    hi[missing] = np.nan
+    return hi, lo
+
+def period_return(start_hi, start_lo, end_hi, end_lo):
+    # hi parts of close prices subtract exactly, so the difference keeps full precision
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((end_hi - start_hi) + (end_lo - start_lo)) / (start_hi + start_lo)
+
+def annualize(returns, seconds_elapsed, compound=True):
+    """Annualize period returns over `seconds_elapsed`, as a percentage; NaN where no time elapsed."""
+    seconds_elapsed = np.asarray(seconds_elapsed, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        periods_per_year = np.where(seconds_elapsed > 0, SECONDS_PER_YEAR / seconds_elapsed, np.nan)
+        if compound:
+            return np.expm1(np.log1p(returns) * periods_per_year) * 100
+        return returns * periods_per_year * 100
+
+def period_apy(start_prices, end_prices, seconds_elapsed, compound=True):
+    """APY in percent for every (start price, end price, seconds elapsed) triple at once."""
+    start_hi, start_lo = split_uint256(start_prices)
+    end_hi, end_lo = split_uint256(end_prices)
+    return annualize(period_return(start_hi, start_lo, end_hi, end_lo), seconds_elapsed, compound)
+
+def _index_seconds(index):
+    if isinstance(index, pd.DatetimeIndex):
+        seconds = index.as_unit('s').asi8
+    else:
+        seconds = np.asarray(index, dtype=np.int64)
+    if len(seconds) and np.any(np.diff(seconds) < 0):
+        raise ValueError("Price series index must be sorted by time")
+    return seconds
+
+def rolling_apy(prices, windows=APY_WINDOWS, compound=True):
+    """
+    Rolling APY for many forms in one pass.
+
+    `prices` is a DataFrame indexed by block timestamp (DatetimeIndex or unix seconds)
+    with one column of raw price-per-share integers per form. Decimals cancel out of the
+    return, so no scaling is needed. For each row and window the start price is the latest
+    row at least the window length earlier, and the return is annualized over the real
+    seconds between the two rows.
+
+    Returns {window: DataFrame of APY percentages} shaped like `prices`, NaN where the
+    series does not yet cover the window.
+    """
+    timestamps = _index_seconds(prices.index)
+    hi, lo = split_uint256(prices.to_numpy())
+
+    results = {}
+    for window, window_seconds in windows.items():
+        start = np.searchsorted(timestamps, timestamps - window_seconds, side='right') - 1
+        covered = start >= 0
+        start = np.where(covered, start, 0)
+
+        seconds_elapsed = (timestamps - timestamps[start])[:, None]
+        returns = period_return(hi[start], lo[start], hi, lo)
+        apy = annualize(returns, seconds_elapsed, compound)
+        apy[~covered] = np.nan
+
+        results[window] = pd.DataFrame(apy, index=prices.index, columns=prices.columns)
+    return results
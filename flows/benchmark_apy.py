@@ -0,0 +1,61 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from apy_engine import rolling_apy, split_uint256, APY_WINDOWS, SECONDS_PER_YEAR
+
+# Times the vectorized rolling APY engine against the previous per-pair float math.
+# Usage: python flows/benchmark_apy.py [forms] [hours]
+
+DEFAULT_FORMS = 1_000
+DEFAULT_HOURS = 365 * 24
+SECONDS_PER_HOUR = 3600
+
+def make_prices(forms, hours):
+    # 18-decimal share prices growing at 2-12% a year with hourly noise, well above 2**64
+    rng = np.random.default_rng(0)
+    rates = rng.uniform(0.02, 0.12, forms) / (365 * 24)
+    log_growth = np.cumsum(rates + rng.normal(0, 1e-5, (hours, forms)), axis=0)
+    scaled = np.round(np.exp(log_growth) * 10**6).astype(np.int64)
+    prices = scaled.astype(object) * 10**30
+    timestamps = pd.date_range('2024-01-01', periods=hours, freq='h')
+    return pd.DataFrame(prices, index=timestamps, columns=[f'form_{i}' for i in range(forms)])
+
+def scalar_apy(prices, window_seconds, decimals=18):
+    # The previous calculate_apy math, once per (form, row) pair
+    timestamps = prices.index.as_unit('s').asi8
+    values = prices.to_numpy()
+    rows = np.searchsorted(timestamps, timestamps - window_seconds, side='right') - 1
+    for column in range(values.shape[1]):
+        for end, start in enumerate(rows):
+            if start < 0:
+                continue
+            period_return = (values[end, column] / 10**decimals) / (values[start, column] / 10**decimals) - 1
+            seconds_elapsed = timestamps[end] - timestamps[start]
+            ((1 + period_return) ** (SECONDS_PER_YEAR / seconds_elapsed) - 1) * 100
+
+if __name__ == "__main__":
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FORMS
+    hours = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_HOURS
+    prices = make_prices(forms, hours)
+    points = forms * hours
+    print(f"{forms:,} forms x {hours:,} hourly points = {points:,} prices, windows {list(APY_WINDOWS)}")
+
+    started = time.perf_counter()
+    split_uint256(prices.to_numpy())
+    split_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rolling_apy(prices)
+    elapsed = time.perf_counter() - started
+    print(f"  uint256 split          {split_elapsed:8.2f}s")
+    print(f"  vectorized, all windows {elapsed:7.2f}s  {points * len(APY_WINDOWS) / elapsed:>14,.0f} APYs/s")
+
+    # The scalar path is far slower, so time it on a sample of forms and extrapolate
+    sample = prices.iloc[:, :max(1, forms // 100)]
+    started = time.perf_counter()
+    for window_seconds in APY_WINDOWS.values():
+        scalar_apy(sample, window_seconds)
+    scalar_elapsed = (time.perf_counter() - started) * forms / sample.shape[1]
+    print(f"  scalar, all windows    {scalar_elapsed:8.2f}s  (extrapolated from {sample.shape[1]} forms)")
+    print(f"  speedup                {scalar_elapsed / elapsed:8.1f}x")
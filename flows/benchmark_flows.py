@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from mock_rpc import MockChain, MockRPCServer, add_supervault, add_super_positions
+
+# Runs the flows offline against a local mock JSON-RPC server and reports wall time, RPC calls
+# per method, rows/s into ClickHouse and peak RSS for each. Every flow runs in a fresh process
+# with empty caches. ClickHouse is the configured server, in a scratch database, unless
+# --no-clickhouse swaps in a stand-in that accepts and counts rows. --endpoint-latency starts one
+# mock server per value, all configured for the chain, to exercise the multi-endpoint router.
+# Usage: python flows/benchmark_flows.py [--flows ...] [--latency S] [--endpoint-latency S S ...]
+#        [--slow-rate P --slow-latency S] [--failure-rate P] [--no-clickhouse]
+
+FLOWS = ['supervault', 'form_apy', 'write_data', 'event_backfill']
+BENCHMARK_DB = os.getenv('CLICKHOUSE_BENCHMARK_DB', 'super_vault_benchmark')
+DEFAULT_FORMS = 20
+DEFAULT_DAYS = 30
+DEFAULT_ROWS = 100_000
+DEFAULT_BACKFILL_BLOCKS = 200_000
+
+class InsertStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows, seconds):
+        with self.lock:
+            self.rows += rows
+            self.seconds += seconds
+
+class CountingClient:
+    """Wraps a ClickHouse client and records rows inserted and time spent inserting."""
+    def __init__(self, client, stats):
+        self.client = client
+        self.stats = stats
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        result = self.client.execute(query, params, **kwargs)
+        if query.lstrip().upper().startswith('INSERT') and isinstance(result, int):
+            self.stats.add(result, time.perf_counter() - started)
+        return result
+
+    def insert_dataframe(self, query, dataframe, **kwargs):
+        started = time.perf_counter()
+        result = self.client.insert_dataframe(query, dataframe, **kwargs)
+        self.stats.add(result, time.perf_counter() - started)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+class NullClickHouse:
+    """
+    Stand-in client for runs without a ClickHouse server: inserts are counted, reads return nothing.
+
+    Each non-empty insert takes `insert_latency` seconds, standing in for the server's time.
+    """
+    def __init__(self, insert_latency=0.0):
+        self.insert_latency = insert_latency
+
+    def execute(self, query, params=None, columnar=False, **kwargs):
+        if query.lstrip().upper().startswith('INSERT'):
+            if not params:
+                return 0
+            time.sleep(self.insert_latency)
+            return len(params[0]) if columnar else len(params)
+        if 'count()' in query:
+            return [(0,)]
+        return []
+
+    def insert_dataframe(self, query, dataframe, **kwargs):
+        time.sleep(self.insert_latency)
+        return len(dataframe)
+
+    def disconnect(self):
+        pass
+
+def _whitelist_frame(rows, chain_id, vault_address):
+    import pandas as pd
+    from clickhouse import to_uint256
+    from superform_ids import decode_superform_ids
+    superform_ids = [(chain_id << 192) | (1 << 160) | (i + 1) for i in range(rows)]
+    frame = pd.DataFrame({
+        'chain_id': pd.Series([chain_id] * rows, dtype='uint64'),
+        'vault_address': pd.Series([vault_address] * rows, dtype='string'),
+        'block_number': pd.Series(range(rows), dtype='uint64'),
+        'form_id_hex': pd.Series([hex(superform_id) for superform_id in superform_ids], dtype='string'),
+        'timestamp': pd.Timestamp('2024-01-01'),
+        'version': pd.Series([1] * rows, dtype='uint64'),
+    })
+    frame['form_id'] = to_uint256(superform_ids)
+    return pd.concat([frame, decode_superform_ids(superform_ids, checksum=False)], axis=1)
+
+def run_flow(name, params, use_clickhouse, insert_latency=0.0):
+    """Run one flow in this (fresh) process and return its measurements."""
+    from prefect import flow
+    from clickhouse import ClickHousePool, create_clickhouse_connection, set_clickhouse_pool
+
+    stats = InsertStats()
+    connect = create_clickhouse_connection if use_clickhouse else lambda: NullClickHouse(insert_latency)
+    set_clickhouse_pool(ClickHousePool(connect=lambda: CountingClient(connect(), stats)))
+
+    if name == 'supervault':
+        from get_form_ids import supervault_flow
+        run = supervault_flow
+    elif name == 'form_apy':
+        from get_apy import form_apy_flow
+        run = lambda: form_apy_flow(params['form_address'], params['days'])
+    elif name == 'write_data':
+        from get_form_ids import write_data_flow
+        from migrations import apply_migrations
+        from clickhouse import get_clickhouse_pool
+        with get_clickhouse_pool().connection() as client:
+            apply_migrations(client)
+        data = _whitelist_frame(params['rows'], params['chain_id'], params['vault_address'])
+        run = lambda: write_data_flow(data, 'supervault_whitelist')
+    elif name == 'event_backfill':
+        from event_backfill import event_backfill_flow
+        run = lambda: event_backfill_flow(
+            params['contract_address'], params['start_block'], params['end_block'], ['abi/super_positions.json']
+        )
+    else:
+        raise ValueError(f"Unknown flow {name}, expected one of {FLOWS}")
+
+    # Start the Prefect API client (and ephemeral server, if any) outside the timed run
+    flow(lambda: None)()
+    stats.rows, stats.seconds = 0, 0.0
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    run()
+    wall = time.perf_counter() - started
+    return {
+        'wall_seconds': wall,
+        'rows': stats.rows,
+        'insert_seconds': stats.seconds,
+        # ru_maxrss is in KiB on Linux
+        'rss_before_bytes': rss_before * 1024,
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+def _flow_env(servers, chain, vault_address, max_requests_per_second, cache_dir, use_clickhouse):
+    rpcs = [server.url for server in servers]
+    chains_path = os.path.join(cache_dir, 'chains.json')
+    with open(chains_path, 'w') as file:
+        json.dump({str(chain.chain_id): {
+            'name': 'Mock',
+            'rpcs': rpcs,
+            'finality_depth': 64,
+            'max_requests_per_second': max_requests_per_second,
+            'supervaults': [vault_address],
+        }}, file)
+    env = {
+        'CHAINS_PATH': chains_path,
+        'CHAIN_ID': str(chain.chain_id),
+        'RPC_URL': ','.join(rpcs),
+        f'RPC_URL_{chain.chain_id}': ','.join(rpcs),
+        'VAULT_ADDRESS': vault_address,
+        'CALL_CACHE_PATH': os.path.join(cache_dir, 'eth_call_cache.db'),
+        'BLOCK_INDEX_PATH': os.path.join(cache_dir, 'block_index.db'),
+        'METADATA_CACHE_PATH': os.path.join(cache_dir, 'contract_metadata.db'),
+        'RATE_LIMIT_PATH': os.path.join(cache_dir, 'rate_limits.db'),
+    }
+    if use_clickhouse:
+        env['CLICKHOUSE_DB'] = BENCHMARK_DB
+    return env
+
+def _reset_database(drop_only=False):
+    from clickhouse import create_clickhouse_connection
+    client = create_clickhouse_connection()
+    try:
+        client.execute(f"DROP DATABASE IF EXISTS {BENCHMARK_DB}")
+        if not drop_only:
+            client.execute(f"CREATE DATABASE {BENCHMARK_DB}")
+    finally:
+        client.disconnect()
+
+def benchmark(flows, args):
+    chain = MockChain()
+    vault_address, form_addresses = add_supervault(chain, args.forms)
+    super_positions = add_super_positions(chain, args.log_interval)
+    params = {
+        'supervault': {},
+        'form_apy': {'form_address': form_addresses[0], 'days': args.days},
+        'write_data': {'rows': args.rows, 'chain_id': chain.chain_id, 'vault_address': vault_address},
+        'event_backfill': {
+            'contract_address': super_positions,
+            'start_block': chain.head_block - args.blocks + 1,
+            'end_block': chain.head_block,
+        },
+    }
+
+    results = {}
+    with ExitStack() as stack:
+        servers = [
+            stack.enter_context(MockRPCServer(
+                chain, latency, args.jitter, args.failure_rate, seed=i,
+                slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                max_requests_per_second=args.server_rps
+            ))
+            for i, latency in enumerate(args.endpoint_latency or [args.latency])
+        ]
+        for name in flows:
+            if not args.no_clickhouse:
+                _reset_database()
+            for server in servers:
+                server.reset_counters()
+            with tempfile.TemporaryDirectory() as cache_dir:
+                env = _flow_env(servers, chain, vault_address, args.max_rps, cache_dir, not args.no_clickhouse)
+                os.environ.update(env)
+                # A fresh process per flow, so caches, pools and peak RSS start from zero
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    result = executor.submit(run_flow, name, params[name], not args.no_clickhouse, args.insert_latency).result()
+            # Hedged duplicates reach the servers too, so they are counted like any other call
+            result['rpc_calls'] = dict(sum((server.calls for server in servers), Counter()))
+            result['eth_calls'] = dict(sum((server.eth_calls for server in servers), Counter()))
+            result['endpoint_calls'] = {server.url: sum(server.calls.values()) for server in servers}
+            result['injected_failures'] = sum(server.failures for server in servers)
+            result['throttled'] = sum(server.throttled for server in servers)
+            results[name] = result
+            report(name, result, args.no_clickhouse)
+    if not args.no_clickhouse:
+        _reset_database(drop_only=True)
+    return results
+
+def report(name, result, stand_in):
+    rpc_total = sum(result['rpc_calls'].values())
+    insert_rate = result['rows'] / result['insert_seconds'] if result['insert_seconds'] else 0
+    print(f"{name}")
+    print(f"  wall time     {result['wall_seconds']:10.2f}s")
+    print(f"  rpc calls     {rpc_total:10,}  ({result['injected_failures']} injected failures, {result['throttled']} throttled)")
+    for method, count in sorted(result['rpc_calls'].items(), key=lambda item: -item[1]):
+        print(f"    {method:<24}{count:>8,}")
+    for function, count in sorted(result['eth_calls'].items(), key=lambda item: -item[1]):
+        print(f"      eth_call {function:<15}{count:>8,}")
+    if len(result['endpoint_calls']) > 1:
+        for endpoint, count in result['endpoint_calls'].items():
+            print(f"    {endpoint:<32}{count:>8,}")
+    print(f"  rows written  {result['rows']:10,}  {insert_rate:>14,.0f} rows/s{' (stand-in)' if stand_in else ''}")
+    print(f"  peak RSS      {result['peak_rss_bytes'] / 2**20:10.1f} MiB  (before flow {result['rss_before_bytes'] / 2**20:.1f} MiB)")
+
+def compare(results, baseline, tolerance):
+    """Return the measurements that regressed more than `tolerance` against `baseline`."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, current, before in [
+            ('wall_seconds', result['wall_seconds'], previous['wall_seconds']),
+            ('rpc_calls', sum(result['rpc_calls'].values()), sum(previous['rpc_calls'].values())),
+            ('peak_rss_bytes', result['peak_rss_bytes'], previous['peak_rss_bytes']),
+        ]:
+            if before and current > before * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {before:,.2f} -> {current:,.2f}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline flow benchmarks against a mock JSON-RPC server")
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=FLOWS)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every RPC request")
+    parser.add_argument('--jitter', type=float, default=0.01, help="up to this many extra seconds per request")
+    parser.add_argument('--endpoint-latency', type=float, nargs='+', help="one mock endpoint per value, instead of --latency")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="share of requests delayed by --slow-latency")
+    parser.add_argument('--slow-latency', type=float, default=0.0, help="seconds added to slow requests")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument('--max-rps', type=float, default=None, help="client-side rate limit, unlimited by default")
+    parser.add_argument('--server-rps', type=float, default=None, help="answer 429 above this many requests per second per endpoint")
+    parser.add_argument('--forms', type=int, default=DEFAULT_FORMS, help="forms whitelisted by the mock SuperVault")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="days tracked by form_apy")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="whitelist rows written by write_data")
+    parser.add_argument('--blocks', type=int, default=DEFAULT_BACKFILL_BLOCKS, help="blocks scanned by event_backfill")
+    parser.add_argument('--log-interval', type=int, default=20, help="blocks between mock SuperPositions events")
+    parser.add_argument('--no-clickhouse', action='store_true', help="count rows with a stand-in instead of a server")
+    parser.add_argument('--insert-latency', type=float, default=0.0, help="seconds taken by every stand-in insert")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--baseline', help="results file to compare against; exits 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    results = benchmark(args.flows, args)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,60 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from clickhouse import create_clickhouse_connection, insert_dataframe, BATCH_SIZE, INSERT_BLOCK_SIZE
+
+# Compares the old row-by-row insert path with the columnar NumPy path.
+# Usage: python flows/benchmark_insert.py [rows ...]
+
+BENCHMARK_TABLE = 'benchmark_insert'
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+def make_frame(rows):
+    return pd.DataFrame({
+        'id': np.arange(rows, dtype=np.uint32),
+        'name': pd.Series([f'name_{i}' for i in range(rows)], dtype='string'),
+        'value': np.random.default_rng(0).integers(0, 2**32, rows, dtype=np.uint32),
+        'timestamp': pd.date_range('2024-01-01', periods=rows, freq='s')
+    })
+
+def insert_rows(client, data):
+    # The previous write_data_flow implementation
+    data_tuples = [tuple(x) for x in data.to_numpy()]
+    columns = ', '.join(data.columns)
+    query = f'INSERT INTO {BENCHMARK_TABLE} ({columns}) VALUES'
+    for i in range(0, len(data_tuples), BATCH_SIZE):
+        client.execute(query, data_tuples[i:i + BATCH_SIZE])
+
+def insert_columnar(client, data):
+    insert_dataframe(client, data, BENCHMARK_TABLE, INSERT_BLOCK_SIZE)
+
+def run(client, rows):
+    data = make_frame(rows)
+    results = {}
+    for name, insert in [('rows', insert_rows), ('columnar', insert_columnar)]:
+        client.execute(f'TRUNCATE TABLE {BENCHMARK_TABLE}')
+        started = time.perf_counter()
+        insert(client, data)
+        elapsed = time.perf_counter() - started
+        results[name] = rows / elapsed
+        print(f"{rows:>12,} rows  {name:<9} {elapsed:8.2f}s  {rows / elapsed:>14,.0f} rows/s")
+    print(f"{'':>12}       speedup   {results['columnar'] / results['rows']:.1f}x")
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    client = create_clickhouse_connection()
+    client.execute(f'''
+        CREATE TABLE IF NOT EXISTS {BENCHMARK_TABLE} (
+            id UInt32,
+            name String,
+            value UInt32,
+            timestamp DateTime
+        ) ENGINE = MergeTree()
+        ORDER BY id
+    ''')
+    try:
+        for rows in sizes:
+            run(client, rows)
+    finally:
+        client.execute(f'DROP TABLE IF EXISTS {BENCHMARK_TABLE}')
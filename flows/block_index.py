@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import logging
+import threading
+from dotenv import load_dotenv
+from rpc import batch_request
+from chains import get_chain_id
+
+load_dotenv(".env")
+
+logger = logging.getLogger(__name__)
+
+# Global configuration
+BLOCK_INDEX_PATH = os.getenv('BLOCK_INDEX_PATH', '.cache/block_index.db')
+SECONDS_PER_DAY = 24 * 60 * 60
+# Spans holding this many wanted blocks or fewer are fetched exactly instead of checked for interpolation
+EXACT_TIMESTAMP_BLOCKS = 2
+
+def _interpolate(lo, lo_ts, hi, hi_ts, block_number):
+    return lo_ts + (hi_ts - lo_ts) * (block_number - lo) // (hi - lo)
+
+class BlockIndex:
+    """
+    Resolves "last block at or before timestamp T" and remembers every block timestamp it sees.
+
+    Block timestamps and resolved lookups are persisted in SQLite, so a repeated lookup is a
+    dictionary hit and a lookup for a new day only searches between the closest blocks
+    already in the index.
+    """
+    def __init__(self, w3, chain_id=None, path=BLOCK_INDEX_PATH):
+        self.w3 = w3
+        self.chain_id = chain_id or get_chain_id(w3)
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS block_timestamps (
+                chain_id INTEGER,
+                block_number INTEGER,
+                timestamp INTEGER,
+                PRIMARY KEY (chain_id, block_number)
+            )
+        """)
+        self.db.execute("""
+            CREATE INDEX IF NOT EXISTS block_timestamps_by_time
+            ON block_timestamps (chain_id, timestamp)
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS block_lookups (
+                chain_id INTEGER,
+                timestamp INTEGER,
+                block_number INTEGER,
+                PRIMARY KEY (chain_id, timestamp)
+            )
+        """)
+        self.db.commit()
+
+        self.lookups = dict(self.db.execute(
+            "SELECT timestamp, block_number FROM block_lookups WHERE chain_id = ?",
+            (self.chain_id,)
+        ).fetchall())
+
+    def get_block_timestamp(self, block_number):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT timestamp FROM block_timestamps WHERE chain_id = ? AND block_number = ?",
+                (self.chain_id, block_number)
+            ).fetchone()
+        if row:
+            return row[0]
+
+        timestamp = self.w3.eth.get_block(block_number)['timestamp']
+        self._store_block(block_number, timestamp)
+        return timestamp
+
+    def get_block_timestamps(self, block_numbers):
+        """Return {block_number: timestamp}, fetching every block missing from the index in one batch."""
+        block_numbers = sorted(set(block_numbers))
+        timestamps = {}
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(block_numbers), 500):
+                chunk = block_numbers[i:i + 500]
+                timestamps.update(self.db.execute(
+                    f"""
+                    SELECT block_number, timestamp FROM block_timestamps
+                    WHERE chain_id = ? AND block_number IN ({', '.join('?' * len(chunk))})
+                    """,
+                    (self.chain_id, *chunk)
+                ).fetchall())
+
+        missing = [block_number for block_number in block_numbers if block_number not in timestamps]
+        if missing:
+            blocks = batch_request(self.w3, [('eth_getBlockByNumber', [hex(block_number), False]) for block_number in missing])
+            fetched = {block_number: int(block['timestamp'], 16) for block_number, block in zip(missing, blocks)}
+            with self.lock:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO block_timestamps VALUES (?, ?, ?)",
+                    [(self.chain_id, block_number, timestamp) for block_number, timestamp in fetched.items()]
+                )
+                self.db.commit()
+            timestamps.update(fetched)
+        return timestamps
+
+    def interpolate_block_timestamps(self, block_numbers):
+        """
+        Return {block_number: timestamp} like get_block_timestamps, fetching only a few anchor blocks.
+
+        Timestamps between two anchors are interpolated once the block halfway between them
+        lies on the straight line through both, as it does wherever blocks come at a steady
+        rate. Otherwise the span is split at that block and checked again, level by level in
+        one batch each, so irregular stretches end up fetched block by block.
+        """
+        block_numbers = sorted(set(block_numbers))
+        if len(block_numbers) <= EXACT_TIMESTAMP_BLOCKS + 2:
+            return self.get_block_timestamps(block_numbers)
+
+        anchors = self.get_block_timestamps([block_numbers[0], block_numbers[-1]])
+        interpolated = {}
+        spans = [(block_numbers[0], block_numbers[-1], block_numbers[1:-1])]
+        while spans:
+            exact, checks = [], []
+            for lo, hi, inside in spans:
+                if len(inside) <= EXACT_TIMESTAMP_BLOCKS:
+                    exact.extend(inside)
+                else:
+                    checks.append((lo, hi, inside, (lo + hi) // 2))
+            anchors.update(self.get_block_timestamps(exact + [mid for _, _, _, mid in checks]))
+
+            spans = []
+            for lo, hi, inside, mid in checks:
+                if _interpolate(lo, anchors[lo], hi, anchors[hi], mid) == anchors[mid]:
+                    for block_number in inside:
+                        interpolated[block_number] = _interpolate(lo, anchors[lo], hi, anchors[hi], block_number)
+                else:
+                    spans.append((lo, mid, [block_number for block_number in inside if block_number < mid]))
+                    spans.append((mid, hi, [block_number for block_number in inside if block_number > mid]))
+        return {
+            block_number: anchors[block_number] if block_number in anchors else interpolated[block_number]
+            for block_number in block_numbers
+        }
+
+    def block_at(self, timestamp):
+        timestamp = int(timestamp)
+        if timestamp in self.lookups:
+            return self.lookups[timestamp]
+
+        latest = self.w3.eth.get_block('latest')
+        if timestamp >= latest['timestamp']:
+            # Not final yet: a later block may still land at or before this timestamp
+            return latest['number']
+
+        lo, lo_ts, hi, hi_ts = self._bracket(timestamp, latest['number'], latest['timestamp'])
+        if timestamp < lo_ts:
+            raise ValueError(f"Timestamp {timestamp} is before the first block of chain {self.chain_id}")
+
+        # Interpolation search, falling back to bisection when the guess lands next to a bound
+        bisect = False
+        while hi - lo > 1:
+            if bisect:
+                guess = (lo + hi) // 2
+            else:
+                guess = lo + (timestamp - lo_ts) * (hi - lo) // max(hi_ts - lo_ts, 1)
+                guess = min(max(guess, lo + 1), hi - 1)
+
+            guess_ts = self.get_block_timestamp(guess)
+            previous_range = hi - lo
+            if guess_ts <= timestamp:
+                lo, lo_ts = guess, guess_ts
+            else:
+                hi, hi_ts = guess, guess_ts
+            bisect = not bisect and (hi - lo) > previous_range // 2
+
+        self._store_lookup(timestamp, lo)
+        return lo
+
+    def _bracket(self, timestamp, latest_block, latest_timestamp):
+        with self.lock:
+            lower = self.db.execute(
+                """
+                SELECT block_number, timestamp FROM block_timestamps
+                WHERE chain_id = ? AND timestamp <= ?
+                ORDER BY timestamp DESC, block_number DESC LIMIT 1
+                """,
+                (self.chain_id, timestamp)
+            ).fetchone()
+            upper = self.db.execute(
+                """
+                SELECT block_number, timestamp FROM block_timestamps
+                WHERE chain_id = ? AND timestamp > ?
+                ORDER BY timestamp ASC, block_number ASC LIMIT 1
+                """,
+                (self.chain_id, timestamp)
+            ).fetchone()
+
+        if lower is None:
+            lower = (0, self.get_block_timestamp(0))
+        if upper is None:
+            upper = (latest_block, latest_timestamp)
+        return lower[0], lower[1], upper[0], upper[1]
+
+    def _store_block(self, block_number, timestamp):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO block_timestamps VALUES (?, ?, ?)",
+                (self.chain_id, block_number, timestamp)
+            )
+            self.db.commit()
+
+    def _store_lookup(self, timestamp, block_number):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO block_lookups VALUES (?, ?, ?)",
+                (self.chain_id, timestamp, block_number)
+            )
+            self.db.commit()
+            self.lookups[timestamp] = block_number
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from dotenv import load_dotenv
+from web3.middleware import Web3Middleware
+from chains import load_chains, get_chain_id, get_chain_id_async
+
+load_dotenv(".env")
+
+# Global configuration
+CALL_CACHE_PATH = os.getenv('CALL_CACHE_PATH', '.cache/eth_call_cache.db')
+CALL_CACHE_MAX_BYTES = int(os.getenv('CALL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+FINALITY_DEPTH = int(os.getenv('FINALITY_DEPTH', 64))  # for chains missing from chains.json
+HEAD_REFRESH_INTERVAL = 12  # seconds, roughly one Ethereum slot
+
+_cache = None
+_cache_lock = threading.Lock()
+
+class CallCache:
+    """
+    Size-bounded, persistent store for eth_call results.
+
+    Keys are content addresses: the SHA-256 of (chain, block, transaction, state overrides), with
+    every transaction field included, since value or gas can change the result too. When the
+    stored results exceed `max_bytes`, the least recently used entries are evicted.
+    """
+    def __init__(self, path=CALL_CACHE_PATH, max_bytes=CALL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS eth_call_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT,
+                size INTEGER,
+                last_used REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS eth_call_cache_lru ON eth_call_cache (last_used)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM eth_call_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(chain_id, block_number, transaction, state_overrides=None):
+        transaction = dict(transaction)
+        if 'input' in transaction and 'data' not in transaction:
+            transaction['data'] = transaction.pop('input')
+        content = json.dumps(
+            [chain_id, block_number, _canonical(transaction), _canonical(state_overrides or {})],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT result FROM eth_call_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE eth_call_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    def set(self, key, result):
+        size = len(result)
+        with self.lock:
+            previous = self.db.execute("SELECT size FROM eth_call_cache WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO eth_call_cache VALUES (?, ?, ?, ?)",
+                (key, result, size, time.time())
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under 90% of its budget
+        target = int(self.max_bytes * 0.9)
+        for key, size in self.db.execute(
+            "SELECT key, size FROM eth_call_cache ORDER BY last_used ASC"
+        ).fetchall():
+            if self.total_bytes <= target:
+                break
+            self.db.execute("DELETE FROM eth_call_cache WHERE key = ?", (key,))
+            self.total_bytes -= size
+
+def _canonical(value):
+    # Addresses and hex strings compare case-insensitively
+    if isinstance(value, dict):
+        return {str(key).lower(): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, str):
+        return value.lower()
+    return value
+
+def get_call_cache():
+    """Return the process-wide eth_call cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CallCache()
+        return _cache
+
+class EthCallCacheMiddleware(Web3Middleware):
+    """
+    Serves eth_call results at finalized block numbers from the CallCache.
+
+    Calls at tags such as 'latest' or at blocks within the chain's finality depth of the
+    head always go to the provider, since their result can still change.
+    """
+    def __init__(self, w3):
+        super().__init__(w3)
+        self.head = None
+        self.head_checked = 0
+        # Concurrent calls refresh the head once, instead of each asking for it
+        self.head_lock = threading.Lock()
+        self.async_head_lock = asyncio.Lock()
+
+    def _cacheable_block(self, params):
+        block_identifier = params[1] if len(params) > 1 else 'latest'
+        if isinstance(block_identifier, int):
+            return block_identifier
+        if isinstance(block_identifier, str) and block_identifier.startswith('0x'):
+            return int(block_identifier, 16)
+        return None
+
+    def _is_final(self, chain_id, block_number):
+        chain = load_chains().get(chain_id)
+        finality_depth = chain.finality_depth if chain else FINALITY_DEPTH
+        return self.head is not None and block_number <= self.head - finality_depth
+
+    def _head_is_stale(self):
+        return time.monotonic() - self.head_checked > HEAD_REFRESH_INTERVAL
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            block_number = self._cacheable_block(params) if method == 'eth_call' else None
+            if block_number is None:
+                return make_request(method, params)
+
+            chain_id = get_chain_id(self._w3)
+            if not self._is_final(chain_id, block_number) and self._head_is_stale():
+                with self.head_lock:
+                    if self._head_is_stale():
+                        self.head = self._w3.eth.block_number
+                        self.head_checked = time.monotonic()
+            if not self._is_final(chain_id, block_number):
+                return make_request(method, params)
+
+            cache = get_call_cache()
+            key = cache.make_key(chain_id, block_number, params[0], params[2] if len(params) > 2 else None)
+            cached = cache.get(key)
+            if cached is not None:
+                return {'jsonrpc': '2.0', 'id': 0, 'result': cached}
+
+            response = make_request(method, params)
+            if 'result' in response and 'error' not in response:
+                cache.set(key, response['result'])
+            return response
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            block_number = self._cacheable_block(params) if method == 'eth_call' else None
+            if block_number is None:
+                return await make_request(method, params)
+
+            chain_id = await get_chain_id_async(self._w3)
+            if not self._is_final(chain_id, block_number) and self._head_is_stale():
+                async with self.async_head_lock:
+                    if self._head_is_stale():
+                        self.head = await self._w3.eth.block_number
+                        self.head_checked = time.monotonic()
+            if not self._is_final(chain_id, block_number):
+                return await make_request(method, params)
+
+            cache = get_call_cache()
+            key = cache.make_key(chain_id, block_number, params[0], params[2] if len(params) > 2 else None)
+            cached = cache.get(key)
+            if cached is not None:
+                return {'jsonrpc': '2.0', 'id': 0, 'result': cached}
+
+            response = await make_request(method, params)
+            if 'result' in response and 'error' not in response:
+                cache.set(key, response['result'])
+            return response
+        return middleware
@@ -0,0 +1,101 @@
+import os
+import json
+import threading
+from dotenv import load_dotenv
+from eth_utils import to_checksum_address
+
+load_dotenv(".env")
+
+# Global configuration
+CHAINS_PATH = os.getenv('CHAINS_PATH', 'chains.json')
+
+_chains = None
+_chains_lock = threading.Lock()
+_chain_ids = {}
+
+class ChainConfig:
+    """
+    Per-chain settings: RPC endpoints, finality depth, per-endpoint request and
+    compute unit rate limits and the SuperVault addresses to ingest.
+
+    Any chain's RPCs or vaults can be overridden from the environment with
+    RPC_URL_<chain_id> and SUPERVAULTS_<chain_id> (both comma separated). With several RPCs,
+    rpc.get_web3 routes each request to the fastest healthy one.
+    """
+    def __init__(
+        self, chain_id, name, rpcs, finality_depth,
+        max_requests_per_second=None, max_compute_units_per_second=None, supervaults=None
+    ):
+        self.chain_id = chain_id
+        self.name = name
+        self.rpcs = rpcs
+        self.finality_depth = finality_depth
+        self.max_requests_per_second = max_requests_per_second
+        self.max_compute_units_per_second = max_compute_units_per_second
+        self.supervaults = supervaults or []
+
+        rpc_override = os.getenv(f'RPC_URL_{chain_id}')
+        if rpc_override:
+            self.rpcs = [url.strip() for url in rpc_override.split(',') if url.strip()]
+        supervaults_override = os.getenv(f'SUPERVAULTS_{chain_id}')
+        if supervaults_override:
+            self.supervaults = [address.strip() for address in supervaults_override.split(',') if address.strip()]
+        elif not self.supervaults and chain_id == int(os.getenv('CHAIN_ID', 1)) and os.getenv('VAULT_ADDRESS'):
+            # Single-chain setups only configure VAULT_ADDRESS
+            self.supervaults = [os.getenv('VAULT_ADDRESS')]
+        self.supervaults = [to_checksum_address(address) for address in self.supervaults]
+
+    @property
+    def rpc(self):
+        return self.rpcs[0]
+
+def load_chains(path=CHAINS_PATH):
+    """Return {chain_id: ChainConfig} for every chain in the config file, read once per process."""
+    global _chains
+    with _chains_lock:
+        if _chains is None:
+            with open(path) as file:
+                _chains = {
+                    int(chain_id): ChainConfig(int(chain_id), **config)
+                    for chain_id, config in json.load(file).items()
+                }
+        return _chains
+
+def get_chain_config(chain_id):
+    chains = load_chains()
+    if chain_id not in chains:
+        raise ValueError(f"Chain ID {chain_id} is not configured in {CHAINS_PATH}")
+    return chains[chain_id]
+
+def cached_chain_id(w3):
+    """Return the chain ID already resolved for `w3`'s endpoint, or None."""
+    return _chain_ids.get(str(w3.provider.endpoint_uri))
+
+def cache_chain_id(w3, chain_id):
+    _chain_ids[str(w3.provider.endpoint_uri)] = chain_id
+
+def get_chain_id(w3):
+    """
+    Return the chain ID behind `w3`, asking each endpoint only once per process.
+
+    web3's own request cache is per thread, so every task runner worker would ask again.
+    """
+    chain_id = cached_chain_id(w3)
+    if chain_id is None:
+        chain_id = w3.eth.chain_id
+        cache_chain_id(w3, chain_id)
+    return chain_id
+
+async def get_chain_id_async(w3):
+    """get_chain_id for AsyncWeb3 instances."""
+    chain_id = cached_chain_id(w3)
+    if chain_id is None:
+        chain_id = await w3.eth.chain_id
+        cache_chain_id(w3, chain_id)
+    return chain_id
+
+def get_chain_configs(chain_ids=None):
+    """Return the configs for `chain_ids`, or for every configured chain."""
+    if chain_ids is None:
+        return list(load_chains().values())
+    return [get_chain_config(chain_id) for chain_id in chain_ids]
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+# Created by migrations.MIGRATIONS
+CHECKPOINTS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS ingestion_checkpoints (
+        chain_id UInt64,
+        contract_address String,
+        stream LowCardinality(String),
+        last_block UInt64,
+        updated_at DateTime64(3)
+    ) ENGINE = ReplacingMergeTree(updated_at)
+    ORDER BY (chain_id, contract_address, stream)
+"""
+
+def get_checkpoint(client, chain_id, contract_address, stream):
+    """Return the last fully ingested block for (chain, contract, stream), or None if it was never ingested."""
+    rows = client.execute(
+        """
+        SELECT last_block FROM ingestion_checkpoints
+        WHERE chain_id = %(chain_id)s
+          AND contract_address = %(contract_address)s
+          AND stream = %(stream)s
+        ORDER BY updated_at DESC
+        LIMIT 1
+        """,
+        {'chain_id': chain_id, 'contract_address': contract_address, 'stream': stream}
+    )
+    return rows[0][0] if rows else None
+
+def set_checkpoint(client, chain_id, contract_address, stream, last_block):
+    """Record that every block up to and including last_block has been ingested."""
+    client.execute(
+        'INSERT INTO ingestion_checkpoints VALUES',
+        [(chain_id, contract_address, stream, last_block, datetime.now())]
+    )
@@ -1,8 +1,13 @@
-from prefect import flow, task
+from prefect import flow
 from clickhouse_driver import Client
 import pandas as pd
 from dotenv import load_dotenv
+from collections import deque
+from contextlib import contextmanager
 import logging
+import os
+import threading
+import time
 
 load_dotenv()
 
@@ -11,33 +16,216 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Global configuration
-CLICKHOUSE_HOST = '127.0.0.1'
-CLICKHOUSE_PORT = 9000
-CLICKHOUSE_USER = 'default'
-CLICKHOUSE_DB = 'default'
+CLICKHOUSE_HOST = os.getenv('CLICKHOUSE_HOST', '127.0.0.1')
+CLICKHOUSE_PORT = int(os.getenv('CLICKHOUSE_PORT', 9000))
+CLICKHOUSE_USER = os.getenv('CLICKHOUSE_USER', 'default')
+CLICKHOUSE_PASSWORD = os.getenv('CLICKHOUSE_PASSWORD', '')
+CLICKHOUSE_DB = os.getenv('CLICKHOUSE_DB', 'default')
+CLICKHOUSE_POOL_MIN_SIZE = int(os.getenv('CLICKHOUSE_POOL_MIN_SIZE', 1))
+CLICKHOUSE_POOL_MAX_SIZE = int(os.getenv('CLICKHOUSE_POOL_MAX_SIZE', 10))
+CLICKHOUSE_POOL_IDLE_TIMEOUT = int(os.getenv('CLICKHOUSE_POOL_IDLE_TIMEOUT', 300))
+CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv('CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL', 30))
 BATCH_SIZE = 10000
+INSERT_BLOCK_SIZE = 100000
+UINT256_MAX = 2**256 - 1
+
+_pool = None
+_pool_lock = threading.Lock()
 
-@task(retries=3)
 def create_clickhouse_connection():
     try:
         client = Client(
             host=CLICKHOUSE_HOST,
             port=CLICKHOUSE_PORT,
             user=CLICKHOUSE_USER,
+            password=CLICKHOUSE_PASSWORD,
+            database=CLICKHOUSE_DB,
             settings={
                 'max_block_size': 100000,
                 'max_insert_block_size': 100000,
             }
         )
+        client.connection.force_connect()
         logger.info("Successfully connected to ClickHouse")
         return client
     except Exception as e:
         logger.error(f"Failed to connect to ClickHouse: {str(e)}")
         raise
 
+class ClickHousePool:
+    """
+    Thread-safe pool of connected ClickHouse clients.
+
+    Borrow a client with `with pool.connection() as client:`. Clients idle for longer than
+    `health_check_interval` are pinged before being handed out, and clients idle for longer
+    than `idle_timeout` are closed as long as the pool stays above `min_size`.
+    """
+    def __init__(
+        self,
+        min_size=CLICKHOUSE_POOL_MIN_SIZE,
+        max_size=CLICKHOUSE_POOL_MAX_SIZE,
+        idle_timeout=CLICKHOUSE_POOL_IDLE_TIMEOUT,
+        health_check_interval=CLICKHOUSE_POOL_HEALTH_CHECK_INTERVAL,
+        connect=None
+    ):
+        self.connect = connect or create_clickhouse_connection
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+
+        for _ in range(min_size):
+            self.idle.append((self.connect(), time.monotonic()))
+            self.size += 1
+
+    @contextmanager
+    def connection(self, timeout=None):
+        client = self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                self._evict_idle()
+                if self.idle:
+                    # Most recently used first, so the warmest connection is reused
+                    client, last_used = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    client, last_used = None, None
+                    self.size += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No ClickHouse connection available after {timeout}s")
+                self.condition.wait(remaining)
+
+        try:
+            if client is None:
+                return self.connect()
+            if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(client):
+                logger.warning("Replacing unhealthy ClickHouse connection")
+                client.disconnect()
+                return self.connect()
+            return client
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, client):
+        with self.condition:
+            self.idle.append((client, time.monotonic()))
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            while self.idle:
+                client, _ = self.idle.popleft()
+                client.disconnect()
+                self.size -= 1
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while self.idle and self.size > self.min_size and now - self.idle[0][1] > self.idle_timeout:
+            client, _ = self.idle.popleft()
+            client.disconnect()
+            self.size -= 1
+
+    def _is_healthy(self, client):
+        try:
+            client.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+def get_clickhouse_pool():
+    """Return the process-wide ClickHouse connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClickHousePool()
+        return _pool
+
+def set_clickhouse_pool(pool):
+    """Replace the process-wide pool, e.g. with one whose clients are instrumented."""
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+def _parse_uint256(value):
+    if isinstance(value, str):
+        return int(value, 16) if value[:2].lower() == '0x' else int(value)
+    if isinstance(value, (bytes, bytearray)):
+        return int.from_bytes(value, 'big')
+    return int(value)
+
+def to_uint256(values):
+    """
+    Convert uint256 values (ints, NumPy ints, decimal or 0x-hex strings, big-endian bytes)
+    to an object Series of Python ints for a native UInt256 column.
+
+    Raises ValueError for missing, negative or out-of-range values instead of letting
+    ClickHouse wrap them.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    if values.dtype.kind in 'iu':
+        ints = values.astype(object)
+    else:
+        if values.isna().any():
+            raise ValueError("uint256 column contains missing values")
+        ints = values.map(_parse_uint256).astype(object)
+    if len(ints) and (min(ints) < 0 or max(ints) > UINT256_MAX):
+        raise ValueError("uint256 column contains values outside [0, 2**256)")
+    return ints
+
+def _is_wide(column):
+    # Integers only land in an object column when NumPy can't hold them: values past
+    # 64 bits, or the (U)Int128/256 columns built by `to_uint256`
+    if column.dtype != object:
+        return False
+    valid = column.notna().to_numpy()
+    if not valid.any():
+        return False
+    value = column.iloc[valid.argmax()]
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def insert_dataframe(client, data, table_name, block_size=INSERT_BLOCK_SIZE):
+    """
+    Insert a DataFrame column by column instead of row by row.
+
+    Each block of `block_size` rows is sent as NumPy column arrays, so no Python
+    object is created per cell for numeric and datetime columns. NumPy stops at 64 bits,
+    so frames with integer object columns (UInt128/UInt256 values from `to_uint256`) are sent
+    as plain column lists instead, which the driver packs into wide integers in compiled code.
+    String columns alone keep the NumPy path.
+    """
+    columns = ', '.join(data.columns)
+    query = f'INSERT INTO {table_name} ({columns}) VALUES'
+    wide = any(_is_wide(data[column]) for column in data.columns)
+    
+    total_rows = 0
+    for start in range(0, len(data), block_size):
+        block = data.iloc[start:start + block_size]
+        if wide:
+            total_rows += client.execute(query, [block[column].tolist() for column in block.columns], columnar=True)
+        else:
+            total_rows += client.insert_dataframe(query, block, settings={'use_numpy': True})
+        logger.info(f"Inserted block of {len(block)} rows. Total rows inserted: {total_rows}")
+    return total_rows
+
 @flow(name="Create ClickHouse Table")
 def create_table_flow():
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
         # Create a sample table
         client.execute('''
@@ -57,33 +245,29 @@ def create_table_flow():
     except Exception as e:
         logger.error(f"Failed to create table: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 @flow(name="Write Data to ClickHouse")
-def write_data_flow(data: pd.DataFrame):
-    client = create_clickhouse_connection()
+def write_data_flow(data: pd.DataFrame, block_size: int = INSERT_BLOCK_SIZE):
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
-        # Convert DataFrame to list of tuples
-        data_tuples = [tuple(x) for x in data.to_numpy()]
-        columns = ', '.join(data.columns)
-        query = f'INSERT INTO your_table ({columns}) VALUES'
-        
-        # Execute in batches
-        total_rows = 0
-        for i in range(0, len(data_tuples), BATCH_SIZE):
-            batch = data_tuples[i:i + BATCH_SIZE]
-            client.execute(query, batch)
-            total_rows += len(batch)
-            logger.info(f"Inserted batch of {len(batch)} rows. Total rows inserted: {total_rows}")
+        # Stream column arrays in blocks
+        total_rows = insert_dataframe(client, data, 'your_table', block_size)
             
         logger.info(f"Successfully wrote {total_rows} rows to ClickHouse")
         
     except Exception as e:
         logger.error(f"Failed to write data: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 @flow(name="Read Data from ClickHouse")
 def read_data_flow():
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
         # Read and log row count
         count = client.execute('SELECT COUNT(*) FROM your_table')[0][0]
@@ -98,6 +282,8 @@ def read_data_flow():
     except Exception as e:
         logger.error(f"Failed to read data: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 if __name__ == "__main__":
     # Create table
@@ -1,15 +1,56 @@
-
 from prefect_dbt.cli.commands import DbtCoreOperation
-from prefect import flow
+from prefect import flow, get_run_logger
+from dotenv import load_dotenv
 import os
+import shutil
+
+load_dotenv(".env")
+
+# Global configuration
+DBT_PROJECT_DIR = os.getenv('DBT_PROJECT_DIR')
+DBT_PROFILES_DIR = os.getenv('DBT_PROFILES_DIR')
+# Artifacts of the last successful build, compared against to find changed models
+DBT_STATE_DIR = os.getenv('DBT_STATE_DIR', '.cache/dbt_state')
+STATE_ARTIFACTS = ['manifest.json', 'sources.json']
+
+def _target_dir():
+    return os.path.join(DBT_PROJECT_DIR or '.', 'target')
+
+def _has_state():
+    return all(os.path.exists(os.path.join(DBT_STATE_DIR, name)) for name in STATE_ARTIFACTS)
+
+def _save_state():
+    os.makedirs(DBT_STATE_DIR, exist_ok=True)
+    for name in STATE_ARTIFACTS:
+        artifact = os.path.join(_target_dir(), name)
+        if os.path.exists(artifact):
+            shutil.copy2(artifact, os.path.join(DBT_STATE_DIR, name))
+
 @flow
-def trigger_dbt_flow() -> str:
+def trigger_dbt_flow(changed_only: bool = True) -> str:
+    """
+    Build the dbt project.
+
+    With `changed_only`, and once a previous build's state is saved, only models whose
+    code changed or whose sources received new rows since that build are run, together
+    with everything downstream of them.
+    """
+    logger = get_run_logger()
+    state_dir = os.path.abspath(DBT_STATE_DIR)
+    commands = ["dbt source freshness -t prod"]
+    if changed_only and _has_state():
+        commands.append(f"dbt build -t prod --select state:modified+ source_status:fresher+ --state {state_dir}")
+    else:
+        logger.info("No previous dbt state, building every model")
+        commands.append("dbt build -t prod")
+
     result = DbtCoreOperation(
-        commands=["dbt build -t prod"],
-        project_dir=os.getenv('DBT_PROJECT_DIR'),
-        profiles_dir=os.getenv('DBT_PROFILES_DIR')
+        commands=commands,
+        project_dir=DBT_PROJECT_DIR,
+        profiles_dir=DBT_PROFILES_DIR
     ).run()
+    _save_state()
     return result
 
 if __name__ == "__main__":
-    trigger_dbt_flow()
\ No newline at end of file
+    trigger_dbt_flow()
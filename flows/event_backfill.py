@@ -0,0 +1,301 @@
+import json
+import os
+import time
+import requests
+from datetime import datetime, timezone
+from functools import lru_cache
+from eth_abi import decode
+from eth_utils import event_abi_to_log_topic, to_checksum_address
+from web3.exceptions import Web3RPCError
+from prefect import task, flow, get_run_logger
+from prefect.tasks import NO_CACHE
+from prefect.utilities.annotations import quote
+from clickhouse import get_clickhouse_pool
+from rpc import get_web3
+from rate_limit import throttled_for
+from chains import get_chain_config, get_chain_id
+from checkpoints import get_checkpoint, set_checkpoint
+from abi_registry import get_abi
+from block_index import BlockIndex
+from rollups import EVENTS_COLUMNS
+from migrations import apply_migrations
+from rpc_metrics import publish_rpc_metrics
+from pipeline import Stage, batched
+
+# Block range sizing for eth_getLogs
+INITIAL_CHUNK_SIZE = 2000
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 100000
+TARGET_LOGS_PER_CHUNK = 5000
+INSERT_BATCH_SIZE = 50000
+CHECKPOINT_INTERVAL = 30  # seconds between checkpoints while logs are sparse
+# Retries of a chunk after transient provider errors, on top of the RPC layer's own retries
+TRANSIENT_RETRIES = 3
+TRANSIENT_BACKOFF = 1.0  # seconds, doubled per retry
+# Items buffered between the fetch, decode, batch and insert stages, bounding memory for any block range
+FETCH_QUEUE_SIZE = 1  # raw eth_getLogs chunks
+DECODE_QUEUE_SIZE = 2  # decoded chunks
+INSERT_QUEUE_SIZE = 1  # full insert batches
+EVENTS_STREAM = 'events'
+DEFAULT_ABI_FILES = ["abi/erc4626.json", "abi/super_vault.json"]
+
+# Provider error phrases that mean "ask for a smaller block range", matched against JSON-RPC
+# error messages and HTTP error bodies. Only range-specific phrases: throttling answers such as
+# "Too Many Requests" or Infura's -32005 "limit exceeded" say nothing about the range.
+RANGE_TOO_LARGE_ERRORS = (
+    'block range',
+    'blocks range',
+    'range is too',
+    'range too',
+    'range limit',
+    'returned more than',
+    'logs matched by query',
+    'too many results',
+    'response size',
+    'query timeout',
+)
+
+class EventDecoder:
+    """
+    Decodes raw eth_getLogs results for every event in a set of ABIs.
+
+    topic0 -> event lookups and the indexed/non-indexed type lists are computed once, so
+    decoding a log is a dictionary hit plus one eth_abi decode of its data.
+    """
+    def __init__(self, abis):
+        self.events = {}
+        for abi in abis:
+            for item in abi:
+                if item['type'] != 'event' or item.get('anonymous'):
+                    continue
+                topic = '0x' + event_abi_to_log_topic(item).hex()
+                indexed = [i for i in item['inputs'] if i['indexed']]
+                non_indexed = [i for i in item['inputs'] if not i['indexed']]
+                self.events[topic] = (
+                    item['name'],
+                    [(i['name'], i['type']) for i in indexed],
+                    [i['name'] for i in non_indexed],
+                    [i['type'] for i in non_indexed],
+                )
+
+    @property
+    def topics(self):
+        return list(self.events)
+
+    def decode_logs(self, logs, chain_id, block_timestamps):
+        rows = []
+        for log in logs:
+            topics = log['topics']
+            if not topics or topics[0] not in self.events:
+                continue
+            name, indexed, data_names, data_types = self.events[topics[0]]
+
+            args = {}
+            for (arg_name, arg_type), topic in zip(indexed, topics[1:]):
+                args[arg_name] = _decode_topic(arg_type, topic)
+            values = decode(data_types, bytes.fromhex(log['data'][2:]))
+            for arg_name, arg_type, value in zip(data_names, data_types, values):
+                args[arg_name] = _normalize(arg_type, value)
+
+            rows.append((
+                chain_id,
+                _checksum(log['address']),
+                name,
+                int(log['blockNumber'], 16),
+                block_timestamps[int(log['blockNumber'], 16)],
+                log['transactionHash'],
+                int(log['logIndex'], 16),
+                json.dumps(args)
+            ))
+        return rows
+
+@lru_cache(maxsize=65536)
+def _checksum(address):
+    return to_checksum_address(address)
+
+def _decode_topic(arg_type, topic):
+    # Dynamic indexed values are stored as their keccak hash
+    if arg_type in ('string', 'bytes') or arg_type.endswith(']') or arg_type.startswith('('):
+        return topic
+    if arg_type == 'address':
+        return _checksum('0x' + topic[-40:])
+    return _normalize(arg_type, decode([arg_type], bytes.fromhex(topic[2:]))[0])
+
+def _normalize(arg_type, value):
+    if isinstance(value, (list, tuple)):
+        item_type = arg_type[:arg_type.rfind('[')] if arg_type.endswith(']') else arg_type
+        return [_normalize(item_type, v) for v in value]
+    if arg_type == 'address':
+        return _checksum(value)
+    if isinstance(value, bytes):
+        return '0x' + value.hex()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        # Keep uint256 values exact for JSON consumers
+        return str(value)
+    return value
+
+def _is_range_too_large(error):
+    if throttled_for(error) is not None:
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        # Some providers reject oversized ranges with an HTTP error; only the body says why
+        response = error.response
+        if response is None:
+            return False
+        if response.status_code == 413:
+            return True
+        message = response.text.lower()
+    elif isinstance(error, Web3RPCError):
+        message = str(error).lower()
+    else:
+        return False
+    return any(fragment in message for fragment in RANGE_TOO_LARGE_ERRORS)
+
+def iter_log_chunks(w3, address, topics, start_block, end_block, chunk_size=INITIAL_CHUNK_SIZE):
+    """
+    Yield (from_block, to_block, raw_logs) for consecutive block ranges from start_block to end_block.
+
+    The range is halved whenever the provider rejects it as too large and doubled while chunks
+    come back sparse, so dense and quiet periods both stay close to TARGET_LOGS_PER_CHUNK.
+    Timeouts and other transient HTTP errors retry the same range with backoff instead.
+    """
+    from_block = start_block
+    max_chunk_size = MAX_CHUNK_SIZE
+    failures = 0
+    while from_block <= end_block:
+        to_block = min(from_block + chunk_size - 1, end_block)
+        try:
+            logs = w3.manager.request_blocking('eth_getLogs', [{
+                'address': [to_checksum_address(address)],
+                'topics': [topics],
+                'fromBlock': hex(from_block),
+                'toBlock': hex(to_block),
+            }])
+        except (Web3RPCError, requests.exceptions.RequestException) as e:
+            if _is_range_too_large(e) and chunk_size > MIN_CHUNK_SIZE:
+                # Never grow back into a range size the provider has already rejected
+                chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+                max_chunk_size = chunk_size
+                continue
+            if isinstance(e, requests.exceptions.RequestException) and failures < TRANSIENT_RETRIES:
+                # Outages and throttling say nothing about the range, so it is retried unchanged
+                time.sleep(TRANSIENT_BACKOFF * 2 ** failures)
+                failures += 1
+                continue
+            raise
+        failures = 0
+
+        yield from_block, to_block, logs
+
+        from_block = to_block + 1
+        if len(logs) < TARGET_LOGS_PER_CHUNK // 2:
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+        elif len(logs) > TARGET_LOGS_PER_CHUNK * 2:
+            chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+
+def log_block_timestamps(logs, block_index):
+    """
+    Return {block_number: datetime} for the blocks of `logs`.
+
+    Providers that include blockTimestamp in logs answer it for free; the rest are
+    interpolated from a few anchor blocks rather than fetched one block per log.
+    """
+    timestamps = {}
+    missing = []
+    for log in logs:
+        block_number = int(log['blockNumber'], 16)
+        if log.get('blockTimestamp') is not None:
+            timestamps[block_number] = int(log['blockTimestamp'], 16)
+        else:
+            missing.append(block_number)
+    if missing:
+        timestamps.update(block_index.interpolate_block_timestamps(missing))
+    return {
+        block_number: datetime.fromtimestamp(timestamp, timezone.utc)
+        for block_number, timestamp in timestamps.items()
+    }
+
+def decode_log_chunks(chunks, decoder, block_index, chain_id):
+    """Yield (from_block, to_block, rows) for each raw chunk, with block timestamps resolved."""
+    logger = get_run_logger()
+    total_logs = 0
+    for from_block, to_block, logs in chunks:
+        block_timestamps = log_block_timestamps(logs, block_index)
+        total_logs += len(logs)
+        logger.info(f"Blocks {from_block}-{to_block}: {len(logs)} logs (total {total_logs})")
+        yield from_block, to_block, decoder.decode_logs(logs, chain_id, block_timestamps)
+
+@task(cache_policy=NO_CACHE)
+def write_events(rows, chain_id, contract_address, last_block):
+    # Rows first, then the checkpoint, so a crash in between only repeats work
+    with get_clickhouse_pool().connection() as client:
+        if rows:
+            client.execute(f'INSERT INTO contract_events ({EVENTS_COLUMNS}) VALUES', rows)
+        set_checkpoint(client, chain_id, contract_address, EVENTS_STREAM, last_block)
+    return len(rows)
+
+@flow(name="Event Backfill Flow", on_completion=[publish_rpc_metrics], on_failure=[publish_rpc_metrics])
+def event_backfill_flow(
+    contract_address: str,
+    start_block: int,
+    end_block: int | None = None,
+    abi_files: list[str] | None = None,
+    chunk_size: int = INITIAL_CHUNK_SIZE,
+    chain_id: int | None = None
+):
+    logger = get_run_logger()
+    # The chain's endpoints and rate budgets come from chains.json
+    chain = get_chain_config(chain_id or int(os.getenv('CHAIN_ID', 1)))
+    w3 = get_web3(
+        chain.rpcs,
+        max_requests_per_second=chain.max_requests_per_second,
+        max_compute_units_per_second=chain.max_compute_units_per_second
+    )
+    chain_id = get_chain_id(w3)
+    contract_address = to_checksum_address(contract_address)
+    end_block = end_block if end_block is not None else w3.eth.block_number
+
+    decoder = EventDecoder([get_abi(abi_file) for abi_file in abi_files or DEFAULT_ABI_FILES])
+    block_index = BlockIndex(w3, chain_id)
+
+    with get_clickhouse_pool().connection() as client:
+        apply_migrations(client)
+
+        # Resume after the last block a previous run fully ingested
+        checkpoint = get_checkpoint(client, chain_id, contract_address, EVENTS_STREAM)
+    if checkpoint is not None and checkpoint >= start_block:
+        logger.info(f"Resuming from checkpoint at block {checkpoint}")
+        start_block = checkpoint + 1
+    if start_block > end_block:
+        logger.info(f"Already ingested up to block {checkpoint}, nothing to do")
+        return 0
+
+    logger.info(f"Backfilling {contract_address} events from block {start_block} to {end_block}")
+    started = time.monotonic()
+    total_logs = 0
+    # Fetch, decode and batching run in their own threads while this one inserts, each handing
+    # over through a bounded queue, so a slow insert holds back fetching instead of piling up logs
+    with Stage(
+        iter_log_chunks(w3, contract_address, decoder.topics, start_block, end_block, chunk_size),
+        FETCH_QUEUE_SIZE, name='fetch-logs'
+    ) as chunks, Stage(
+        decode_log_chunks(chunks, decoder, block_index, chain_id), DECODE_QUEUE_SIZE, name='decode-logs'
+    ) as decoded, Stage(
+        batched(decoded, INSERT_BATCH_SIZE, CHECKPOINT_INTERVAL, size=lambda chunk: len(chunk[2])),
+        INSERT_QUEUE_SIZE, name='batch-logs'
+    ) as batches:
+        for batch in batches:
+            rows = [row for _, _, chunk_rows in batch for row in chunk_rows]
+            # Only advance the checkpoint once every log up to the batch's last block is in ClickHouse
+            # quote() keeps Prefect from walking every row while resolving task inputs
+            write_events(quote(rows), chain_id, contract_address, batch[-1][1])
+            total_logs += len(rows)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Backfilled {total_logs} logs in {elapsed:.1f}s ({total_logs / max(elapsed, 1e-9) * 60:.0f} logs/min)")
+    return total_logs
+
+if __name__ == "__main__":
+    event_backfill_flow(os.getenv('VAULT_ADDRESS'), int(os.getenv('START_BLOCK', 0)))
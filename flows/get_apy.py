@@ -1,34 +1,43 @@
-import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
-from prefect import task, flow, get_run_logger
+import os
+from prefect import task, flow, get_run_logger, unmapped
 from prefect.exceptions import PrefectException
 import time
 from prefect.tasks import NO_CACHE
+from multicall import Multicall
+from rpc import get_web3
+from chains import get_chain_config, get_chain_id
+from block_index import BlockIndex, SECONDS_PER_DAY
+from metadata_cache import get_metadata_cache
+from abi_registry import get_abi, get_contract
+from apy_engine import period_apy, rolling_apy, APY_WINDOWS
+from clickhouse import get_clickhouse_pool
+from rpc_metrics import publish_rpc_metrics
+from rollups import insert_form_snapshots, get_form_metrics_rollup
+from migrations import apply_migrations
 
 load_dotenv(".env")
 
 class FormConfig:
-    def __init__(self):
-        self.rpc = 'https://eth.llamarpc.com'
-        self.w3 = Web3(Web3.HTTPProvider(self.rpc))
-        self.w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    def __init__(self, chain_id=None):
+        chain = get_chain_config(chain_id or int(os.getenv('CHAIN_ID', 1)))
+        self.rpcs = chain.rpcs
+        self.w3 = get_web3(
+            self.rpcs,
+            max_requests_per_second=chain.max_requests_per_second,
+            max_compute_units_per_second=chain.max_compute_units_per_second
+        )
         
         # Load contract ABI
-        with open("abi/erc4626_form.json") as file:
-            self.form_abi = json.load(file)
+        self.form_abi = get_abi('erc4626_form')
 
 @task(cache_policy=NO_CACHE)
 def initialize_form(form_address):
     logger = get_run_logger()
     try:
         config = FormConfig()
-        form = config.w3.eth.contract(
-            address=form_address,
-            abi=config.form_abi
-        )
+        form = get_contract(config.w3, 'erc4626_form', form_address)
         
         logger.info(f"Successfully initialized form at {form_address}")
         return form
@@ -36,37 +45,83 @@ def initialize_form(form_address):
         logger.error(f"Error initializing form: {str(e)}")
         raise PrefectException(f"Failed to initialize form: {str(e)}") from e
 
+# Form fields that are fixed at deployment and served from the metadata cache
+FORM_METADATA_FUNCTIONS = {
+    'vault_name': 'getVaultName',
+    'vault_symbol': 'getVaultSymbol',
+    'vault_decimals': 'getVaultDecimals',
+    'vault_address': 'getVaultAddress',
+    'asset_address': 'getVaultAsset',
+}
+
+# Form fields that change every block and always hit the RPC
+FORM_METRIC_FUNCTIONS = {
+    'total_assets': 'getTotalAssets',
+    'total_supply': 'getTotalSupply',
+    'price_per_share': 'getPricePerVaultShare',
+}
+
+def get_cached_form_metadata(chain_id, form_address):
+    cached = get_metadata_cache().get_many(chain_id, form_address, FORM_METADATA_FUNCTIONS.values())
+    return {
+        key: cached[function]
+        for key, function in FORM_METADATA_FUNCTIONS.items()
+        if function in cached
+    }
+
+def store_form_metadata(chain_id, form_address, results):
+    get_metadata_cache().set_many(chain_id, form_address, {
+        function: results[key]
+        for key, function in FORM_METADATA_FUNCTIONS.items()
+        if key in results
+    })
+
+def form_metric_calls(form, metadata=None):
+    # Batch all view calls into a single Multicall3 round-trip
+    calls = Multicall(form.w3, allow_failure=False)
+    
+    # Get basic form information, unless it is already known
+    metadata = metadata or {}
+    for key, function in FORM_METADATA_FUNCTIONS.items():
+        if key not in metadata:
+            calls.add(key, form.functions[function]())
+    
+    # Get current metrics
+    for key, function in FORM_METRIC_FUNCTIONS.items():
+        calls.add(key, form.functions[function]())
+    calls.add_block_timestamp()
+    return calls
+
+def build_form_metrics(results, block_identifier):
+    return {
+        'vault_name': results['vault_name'],
+        'vault_symbol': results['vault_symbol'],
+        'vault_decimals': results['vault_decimals'],
+        'vault_address': results['vault_address'],
+        'asset_address': results['asset_address'],
+        'total_assets': results['total_assets'],
+        'total_supply': results['total_supply'],
+        'price_per_share': results['price_per_share'],
+        'block_number': block_identifier,
+        'block_timestamp': results['block_timestamp'],
+        'timestamp': datetime.now()
+    }
+
 @task(cache_policy=NO_CACHE)
-def get_form_metrics(form):
+def get_form_metrics(form, block_identifier='latest'):
     logger = get_run_logger()
     try:
-        # Get basic form information
-        vault_name = form.functions.getVaultName().call()
-        vault_symbol = form.functions.getVaultSymbol().call()
-        vault_decimals = form.functions.getVaultDecimals().call()
-        vault_address = form.functions.getVaultAddress().call()
-        asset_address = form.functions.getVaultAsset().call()
+        logger.info(f"Getting metrics for block {block_identifier}")
         
-        # Get current metrics
-        total_assets = form.functions.getTotalAssets().call()
-        total_supply = form.functions.getTotalSupply().call()
-        price_per_share = form.functions.getPricePerVaultShare().call()
-        
-        metrics = {
-            'vault_name': vault_name,
-            'vault_symbol': vault_symbol,
-            'vault_decimals': vault_decimals,
-            'vault_address': vault_address,
-            'asset_address': asset_address,
-            'total_assets': total_assets,
-            'total_supply': total_supply,
-            'price_per_share': price_per_share,
-            'timestamp': datetime.now()
-        }
+        chain_id = get_chain_id(form.w3)
+        metadata = get_cached_form_metadata(chain_id, form.address)
+        results = form_metric_calls(form, metadata).call(block_identifier=block_identifier)
+        store_form_metadata(chain_id, form.address, results)
+        metrics = build_form_metrics({**metadata, **results}, block_identifier)
         
         logger.info("Form metrics retrieved successfully")
-        logger.info(f"Vault Name: {vault_name}")
-        logger.info(f"Price per share: {price_per_share / 10**vault_decimals}")
+        logger.info(f"Vault Name: {metrics['vault_name']}")
+        logger.info(f"Price per share: {metrics['price_per_share'] / 10**metrics['vault_decimals']}")
         
         return metrics
     except Exception as e:
@@ -74,26 +129,38 @@ def get_form_metrics(form):
         raise PrefectException(f"Failed to get form metrics: {str(e)}") from e
 
 @task(cache_policy=NO_CACHE)
-def calculate_apy(initial_metrics, final_metrics, blocks_elapsed):
+def get_block_checkpoints(w3, days_to_track):
     logger = get_run_logger()
     try:
-        # Get price points
-        initial_price = initial_metrics['price_per_share']
-        final_price = final_metrics['price_per_share']
-        decimals = initial_metrics['vault_decimals']
-        
-        # Convert to float with proper decimals
-        initial_price_float = initial_price / 10**decimals
-        final_price_float = final_price / 10**decimals
+        index = BlockIndex(w3)
         
-        # Calculate return for the period
-        period_return = (final_price_float / initial_price_float) - 1
+        # Daily checkpoints at UTC midnight, so lookups repeat across runs and hit the index
+        latest_timestamp = w3.eth.get_block('latest')['timestamp']
+        today = latest_timestamp - latest_timestamp % SECONDS_PER_DAY
+        block_checkpoints = [
+            index.block_at(today - SECONDS_PER_DAY * i)
+            for i in range(days_to_track + 1)
+        ]
         
-        # Estimate blocks per year (Ethereum averages ~7200 blocks per day)
-        blocks_per_year = 7200 * 365
+        logger.info(f"Resolved block checkpoints: {block_checkpoints}")
+        return block_checkpoints
+    except Exception as e:
+        logger.error(f"Error resolving block checkpoints: {str(e)}")
+        raise PrefectException(f"Failed to resolve block checkpoints: {str(e)}") from e
+
+@task(cache_policy=NO_CACHE)
+def calculate_apy(initial_metrics, final_metrics):
+    logger = get_run_logger()
+    try:
+        # Annualize over the real time elapsed between the two blocks
+        seconds_elapsed = final_metrics['block_timestamp'] - initial_metrics['block_timestamp']
         
-        # Calculate APY
-        apy = ((1 + period_return) ** (blocks_per_year / blocks_elapsed) - 1) * 100
+        # Decimals cancel out of the return, so the raw share prices are compared directly
+        apy = float(period_apy(
+            [initial_metrics['price_per_share']],
+            [final_metrics['price_per_share']],
+            [seconds_elapsed]
+        )[0])
         
         logger.info(f"Calculated APY: {apy:.2f}%")
         return apy
@@ -101,60 +168,106 @@ def calculate_apy(initial_metrics, final_metrics, blocks_elapsed):
         logger.error(f"Error calculating APY: {str(e)}")
         raise PrefectException(f"Failed to calculate APY: {str(e)}") from e
 
-@flow(name="Calculate Form APY Flow")
-def form_apy_flow():
-    form_address = "0x473b1CE36Dec21Fc1275c4032731C8469BFf371a"
-    blocks_per_day = 7200  # Approximate blocks per day
-    days_to_track = 2
-    
+@task(cache_policy=NO_CACHE)
+def write_form_snapshots(form, metrics):
+    logger = get_run_logger()
+    try:
+        # Raw snapshots feed the hourly/daily rollups through materialized views
+        chain_id = get_chain_id(form.w3)
+        with get_clickhouse_pool().connection() as client:
+            apply_migrations(client)
+            rows = insert_form_snapshots(client, chain_id, form.address, metrics)
+        
+        logger.info(f"Wrote {rows} snapshots for form {form.address}")
+        return rows
+    except Exception as e:
+        logger.error(f"Error writing form snapshots: {str(e)}")
+        raise PrefectException(f"Failed to write form snapshots: {str(e)}") from e
+
+@flow(name="Calculate Form APY Flow", on_completion=[publish_rpc_metrics], on_failure=[publish_rpc_metrics])
+def form_apy_flow(
+    form_address: str = "0x473b1CE36Dec21Fc1275c4032731C8469BFf371a",
+    days_to_track: int = 2,
+    write_snapshots: bool = True
+):
     logger = get_run_logger()
     logger.info(f"Starting Form APY flow for address {form_address} for last {days_to_track} days")
     
     # Initialize form
     form = initialize_form(form_address)
     
-    # Get current block number
-    current_block = form.w3.eth.block_number
+    # Resolve the block at the start of each tracked day
+    block_checkpoints = get_block_checkpoints(form.w3, days_to_track)
+    
+    # Get metrics for all checkpoints concurrently, each pinned to its block
+    metrics_futures = get_form_metrics.map(unmapped(form), block_checkpoints)
+    metrics_by_block = {
+        block_number: future.result()
+        for block_number, future in zip(block_checkpoints, metrics_futures)
+    }
     
-    # Calculate block numbers for the last 2 days
-    block_checkpoints = [
-        current_block - (blocks_per_day * i) 
-        for i in range(days_to_track + 1)
+    # Snapshots only feed the rollups; the APY doesn't depend on ClickHouse being reachable
+    if write_snapshots:
+        snapshot_state = write_form_snapshots(form, list(metrics_by_block.values()), return_state=True)
+        if snapshot_state.is_failed():
+            logger.warning(f"Form snapshots not written, APY computed from on-chain metrics only: {snapshot_state.message}")
+    
+    # Calculate APY for every day in one vectorized pass
+    start_blocks = block_checkpoints[1:]
+    end_blocks = block_checkpoints[:-1]
+    seconds_elapsed = [
+        metrics_by_block[end_block]['block_timestamp'] - metrics_by_block[start_block]['block_timestamp']
+        for start_block, end_block in zip(start_blocks, end_blocks)
     ]
+    daily_apys = period_apy(
+        [metrics_by_block[start_block]['price_per_share'] for start_block in start_blocks],
+        [metrics_by_block[end_block]['price_per_share'] for end_block in end_blocks],
+        seconds_elapsed
+    )
     
-    # Get metrics for each checkpoint
-    metrics_by_block = {}
-    for block_number in block_checkpoints:
-        logger.info(f"Getting metrics for block {block_number}")
-        metrics = get_form_metrics(form)
-        metrics_by_block[block_number] = metrics
-        
-    # Calculate APY for each day
     results = []
     for i in range(days_to_track):
-        start_block = block_checkpoints[i + 1]
-        end_block = block_checkpoints[i]
-        blocks_elapsed = end_block - start_block
-        
-        daily_apy = calculate_apy(
-            metrics_by_block[start_block],
-            metrics_by_block[end_block],
-            blocks_elapsed
-        )
-        
         results.append({
             'day': i + 1,
-            'start_block': start_block,
-            'end_block': end_block,
-            'blocks_elapsed': blocks_elapsed,
-            'apy': daily_apy
+            'start_block': start_blocks[i],
+            'end_block': end_blocks[i],
+            'blocks_elapsed': end_blocks[i] - start_blocks[i],
+            'seconds_elapsed': seconds_elapsed[i],
+            'apy': float(daily_apys[i])
         })
-        logger.info(f"Day {i + 1} APY: {daily_apy:.2f}%")
+        logger.info(f"Day {i + 1} APY: {daily_apys[i]:.2f}%")
     
     return {
         'metrics_by_block': metrics_by_block,
         'daily_results': results
     }
 
+@flow(name="Rollup APY Flow")
+def rollup_apy_flow(chain_id: int = 1, form_addresses: list[str] | None = None, days_to_track: int = 30):
+    logger = get_run_logger()
+    
+    # Read daily closing share prices from the rollups instead of scanning raw snapshots,
+    # with enough history before the first tracked day for the longest window
+    history_days = days_to_track + max(APY_WINDOWS.values()) // SECONDS_PER_DAY
+    start = datetime.now(timezone.utc) - timedelta(days=history_days)
+    with get_clickhouse_pool().connection() as client:
+        daily = get_form_metrics_rollup(client, 'daily', chain_id, form_addresses, start=start)
+    if daily.empty:
+        logger.info(f"No daily rollups for chain {chain_id} since {start}")
+        return []
+    
+    prices = daily.pivot(index='period_start', columns='form_address', values='close_price_per_share')
+    apys = rolling_apy(prices)
+    
+    results = []
+    for form_address in prices.columns:
+        result = {'form_address': form_address, 'period_start': prices.index[-1]}
+        for window, apy in apys.items():
+            result[f'apy_{window}'] = float(apy[form_address].iloc[-1])
+        results.append(result)
+        logger.info(f"Form {form_address} APY: " + ", ".join(f"{window} {result[f'apy_{window}']:.2f}%" for window in apys))
+    
+    return results
+
 if __name__ == "__main__":
     form_apy_flow()
\ No newline at end of file
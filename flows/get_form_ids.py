@@ -1,71 +1,49 @@
-import json
 import os
-import requests
+import time
 from dotenv import load_dotenv
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
 from prefect import task, flow, get_run_logger
 from prefect.exceptions import PrefectException
 from prefect.tasks import NO_CACHE
+from prefect.task_runners import ThreadPoolTaskRunner
 import pandas as pd
-from clickhouse import create_clickhouse_connection
+from clickhouse import get_clickhouse_pool, insert_dataframe, to_uint256, INSERT_BLOCK_SIZE
+from multicall import Multicall
+from rpc import get_web3
+from checkpoints import get_checkpoint, set_checkpoint
+from superform_ids import decode_superform_ids
+from abi_registry import get_abi_registry
+from chains import get_chain_config, get_chain_configs
+from migrations import apply_migrations
+from rpc_metrics import publish_rpc_metrics
 
 load_dotenv(".env")
 
 BATCH_SIZE = 10000 
+SNAPSHOT_STREAM = 'supervault_snapshot'
+MAX_CHAIN_WORKERS = int(os.getenv('MAX_CHAIN_WORKERS', 16))
 
 class SuperformConfig:
     def __init__(self, chain_id):
-        if chain_id != 1:
-            raise Exception("Only Ethereum chain_id is supported")
+        # Raises for chains missing from chains.json
+        chain = get_chain_config(chain_id)
         
         self.chain_id = chain_id
-        self.chain_name = 'Ethereum'
-        self.rpc = 'https://eth.llamarpc.com'
-        self.w3 = Web3(Web3.HTTPProvider(self.rpc))
-        self.w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+        self.chain_name = chain.name
+        self.rpcs = chain.rpcs
+        self.finality_depth = chain.finality_depth
+        self.w3 = get_web3(
+            self.rpcs,
+            max_requests_per_second=chain.max_requests_per_second,
+            max_compute_units_per_second=chain.max_compute_units_per_second
+        )
         self.timeout = 30
 
-        # Load contract addresses and ABI's
-        with open("abi/erc20.json") as file:
-            self.erc20_abi = json.load(file)
-        with open("abi/erc4626.json") as file:
-            self.erc4626_abi = json.load(file)
-        with open("abi/erc4626_form.json") as file:
-            self.erc4626_form_abi = json.load(file)
-        with open("abi/super_vault.json") as file:
-            self.supervault_abi = json.load(file)
-
-class SuperformAPI:
-    def __init__(self):
-        self.url = 'https://api.superform.xyz/'
-        self.api_key = os.getenv('SUPERFORM_API_KEY')
-
-    def _request(self, action):
-        url = self.url + action
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'SF-API-KEY': self.api_key
-        }
-        response = requests.get(url, headers=headers)
-        result = json.loads(response.text)
-        return result
-
-    def get_vaults(self):
-        action = 'vaults'
-        response = self._request(action)
-        return response
-
-    def get_supervaults(self):
-        action = 'stats/vault/supervaults'
-        response = self._request(action)
-        return response
-    
-    def get_vault_data(self, superform_id):
-        action = f'vault/{superform_id}'
-        response = self._request(action)
-        return response
+        # ABI's are parsed once per process by the shared registry
+        self.abis = get_abi_registry()
+        self.erc20_abi = self.abis.abi('erc20')
+        self.erc4626_abi = self.abis.abi('erc4626')
+        self.erc4626_form_abi = self.abis.abi('erc4626_form')
+        self.supervault_abi = self.abis.abi('super_vault')
 
 @task(cache_policy=NO_CACHE)
 def initialize_supervault(chain_id, vault_address):
@@ -78,23 +56,9 @@ def initialize_supervault(chain_id, vault_address):
         logger.info(f"Chain ID: {chain_id}")
         logger.info(f"Vault Address: {vault_address}")
         
-        # Check if files exist before loading
-        required_files = [
-            "abi/erc20.json",
-            "abi/erc4626.json",
-            "abi/erc4626_form.json",
-            "abi/super_vault.json"
-        ]
-        
-        for file_path in required_files:
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"Required file not found: {file_path}")
-        
+        # Missing ABI files raise FileNotFoundError from the registry
         config = SuperformConfig(chain_id)
-        supervault = config.w3.eth.contract(
-            address=vault_address,
-            abi=config.supervault_abi
-        )
+        supervault = config.abis.contract(config.w3, 'super_vault', vault_address)
         
         # Verify connection to the blockchain
         try:
@@ -110,18 +74,33 @@ def initialize_supervault(chain_id, vault_address):
         raise PrefectException(f"Failed to initialize SuperVault: {str(e)}") from e
 
 @task(cache_policy=NO_CACHE)
-def print_supervault_info(supervault, vault_address):
+def print_supervault_info(supervault, vault_address, block_identifier='latest'):
     logger = get_run_logger()
     try:
-        # Basic contract data
-        whitelist = supervault.functions.getWhitelist().call()
+        # Batch all view calls into a single Multicall3 round-trip
+        calls = Multicall(supervault.w3)
+        calls.add('whitelist', supervault.functions.getWhitelist())
+        calls.add('vault_data', supervault.functions.getSuperVaultData())
+        calls.add('deposit_limit', supervault.functions.depositLimit())
+        calls.add('available_deposit_limit', supervault.functions.availableDepositLimit(vault_address))
+        calls.add('available_withdraw_limit', supervault.functions.availableWithdrawLimit(vault_address))
+        calls.add('number_of_superforms', supervault.functions.numberOfSuperforms())
+        calls.add('strategist', supervault.functions.strategist())
+        calls.add('vault_manager', supervault.functions.vaultManager())
+        calls.add('tokenized_strategy', supervault.functions.tokenizedStrategyAddress())
+        calls.add_chain_id()
+        results = calls.call(block_identifier=block_identifier)
+
+        whitelist = results['whitelist']
+        if whitelist is None:
+            raise Exception("getWhitelist() call failed")
         
         # Create DataFrame from whitelist
         data = [
             {
                 'form_id': form_id,
                 'form_id_hex': hex(form_id),
-                'chain_id': supervault.w3.eth.chain_id,
+                'chain_id': results['chain_id'],
                 'vault_address': vault_address
             }
             for form_id in whitelist
@@ -136,15 +115,14 @@ def print_supervault_info(supervault, vault_address):
         print("\nWhitelist Data:")
         print(df_supervault.to_string())
         
-        # Get additional data
-        vault_data = supervault.functions.getSuperVaultData().call()
-        deposit_limit = supervault.functions.depositLimit().call()
-        available_deposit = supervault.functions.availableDepositLimit(vault_address).call()
-        available_withdraw = supervault.functions.availableWithdrawLimit(vault_address).call()
-        num_superforms = supervault.functions.numberOfSuperforms().call()
-        strategist = supervault.functions.strategist().call()
-        vault_manager = supervault.functions.vaultManager().call()
-        tokenized_strategy = supervault.functions.tokenizedStrategyAddress().call()
+        vault_data = results['vault_data']
+        deposit_limit = results['deposit_limit']
+        available_deposit = results['available_deposit_limit']
+        available_withdraw = results['available_withdraw_limit']
+        num_superforms = results['number_of_superforms']
+        strategist = results['strategist']
+        vault_manager = results['vault_manager']
+        tokenized_strategy = results['tokenized_strategy']
         
         print("\nVault Metrics:")
         print(f"Deposit Limit: {deposit_limit}")
@@ -173,50 +151,66 @@ def print_supervault_info(supervault, vault_address):
         raise PrefectException("Failed to fetch supervault info") from e
 
 @task(cache_policy=NO_CACHE)
-def format_supervault_data(contract_info, vault_address):
+def format_supervault_data(contract_info, vault_address, chain_id, block_number):
     logger = get_run_logger()
     try:
+        # Rows of a later ingest of the same block replace earlier ones
+        timestamp = pd.Timestamp.now()
+        version = time.time_ns() // 1_000_000
+
         # Create DataFrame for whitelist data
         whitelist_data = pd.DataFrame([{
-            'form_id': str(form_id),  # Convert to string to handle large numbers
-            'form_id_hex': hex(form_id),
+            'chain_id': chain_id,
             'vault_address': vault_address,
-            'timestamp': pd.Timestamp.now()
+            'block_number': block_number,
+            'form_id_hex': hex(form_id),
+            'timestamp': timestamp,
+            'version': version
         } for form_id in contract_info['whitelist']])
 
         # Explicitly set data types for whitelist DataFrame
         whitelist_data = whitelist_data.astype({
-            'form_id': 'string',  # Changed from uint64 to string
-            'form_id_hex': 'string',
+            'chain_id': 'uint64',
             'vault_address': 'string',
-            'timestamp': 'datetime64[ns]'
+            'block_number': 'uint64',
+            'form_id_hex': 'string',
+            'timestamp': 'datetime64[ns]',
+            'version': 'uint64'
         })
+        # IDs are full uint256 values, kept as Python ints for the UInt256 column
+        whitelist_data['form_id'] = to_uint256(contract_info['whitelist'])
+        
+        # Unpack superform address, form implementation and chain from the IDs
+        superform_fields = decode_superform_ids(contract_info['whitelist'])
+        whitelist_data = pd.concat([whitelist_data, superform_fields], axis=1)
 
         # Create DataFrame for vault metrics
         vault_metrics = pd.DataFrame([{
+            'chain_id': chain_id,
             'vault_address': vault_address,
-            'deposit_limit': str(contract_info['deposit_limit']),  # Convert to string
-            'available_deposit_limit': str(contract_info['available_deposit_limit']),
-            'available_withdraw_limit': str(contract_info['available_withdraw_limit']),
+            'block_number': block_number,
             'number_of_superforms': int(contract_info['number_of_superforms']),
             'strategist': contract_info['strategist'],
             'vault_manager': contract_info['vault_manager'],
             'tokenized_strategy': contract_info['tokenized_strategy'],
-            'timestamp': pd.Timestamp.now()
+            'timestamp': timestamp,
+            'version': version
         }])
 
         # Explicitly set data types for metrics DataFrame
         vault_metrics = vault_metrics.astype({
+            'chain_id': 'uint64',
             'vault_address': 'string',
-            'deposit_limit': 'string',  # Changed from uint64 to string
-            'available_deposit_limit': 'string',  # Changed from uint64 to string
-            'available_withdraw_limit': 'string',  # Changed from uint64 to string
+            'block_number': 'uint64',
             'number_of_superforms': 'uint64',  # This one should be small enough to keep as uint64
             'strategist': 'string',
             'vault_manager': 'string',
             'tokenized_strategy': 'string',
-            'timestamp': 'datetime64[ns]'
+            'timestamp': 'datetime64[ns]',
+            'version': 'uint64'
         })
+        for column in ['deposit_limit', 'available_deposit_limit', 'available_withdraw_limit']:
+            vault_metrics[column] = to_uint256([contract_info[column]])
 
         return {
             'whitelist': whitelist_data,
@@ -226,44 +220,72 @@ def format_supervault_data(contract_info, vault_address):
         logger.error("Error formatting supervault data: %s", str(e))
         raise PrefectException("Failed to format supervault data") from e
 
-@flow(name="Create Table Flow")
-def create_table_flow(query: str):
+@flow(name="Migrate Schema Flow")
+def migrate_schema_flow():
     logger = get_run_logger()
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
-        # Extract table name from the query
-        table_name = query.split('CREATE TABLE IF NOT EXISTS ')[1].split(' ')[0]
-        
-        # Drop existing table
-        drop_query = f"DROP TABLE IF EXISTS {table_name}"
-        client.execute(drop_query)
-        logger.info(f"Dropped table {table_name} if it existed")
-        
-        # Create new table
-        client.execute(query)
-        logger.info(f"Table {table_name} created successfully")
+        # Tables are only ever created or altered by pending migrations, never dropped,
+        # so every run appends to the history kept so far
+        applied = apply_migrations(client)
+        if applied:
+            logger.info(f"Applied schema migrations {applied}")
+        else:
+            logger.info("Schema is up to date")
     except Exception as e:
-        logger.error(f"Failed to create table: {str(e)}")
+        logger.error(f"Failed to migrate schema: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 @flow(name="Write Data Flow")
-def write_data_flow(data: pd.DataFrame, table_name: str):
+def write_data_flow(data: pd.DataFrame, table_name: str, block_size: int = INSERT_BLOCK_SIZE):
     logger = get_run_logger()
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
-        # Convert DataFrame to list of dictionaries for better control over data types
-        records = data.to_dict('records')
-        
-        # Insert data using named parameters
-        query = f'INSERT INTO {table_name} VALUES'
-        client.execute(query, records)
+        # Insert column arrays in blocks instead of converting row by row
+        total_rows = insert_dataframe(client, data, table_name, block_size)
             
-        logger.info(f"Successfully wrote {len(records)} rows to ClickHouse")
+        logger.info(f"Successfully wrote {total_rows} rows to ClickHouse")
     except Exception as e:
         logger.error(f"Failed to write data: {str(e)}")
         raise
+    finally:
+        pool.release(client)
+
+@task(cache_policy=NO_CACHE)
+def snapshot_supervault(chain_id, vault_address):
+    logger = get_run_logger()
+    
+    # Initialize and get supervault data
+    supervault = initialize_supervault(chain_id, vault_address)
+    
+    # Only take a snapshot once the chain has moved past the last ingested block
+    pool = get_clickhouse_pool()
+    snapshot_block = supervault.w3.eth.block_number
+    with pool.connection() as client:
+        last_block = get_checkpoint(client, chain_id, vault_address, SNAPSHOT_STREAM)
+    if last_block is not None and snapshot_block <= last_block:
+        logger.info(f"No new blocks on chain {chain_id} since last snapshot at block {last_block}, skipping")
+        return None
+    
+    contract_info = print_supervault_info(supervault, vault_address, snapshot_block)
+    
+    # Format data for ClickHouse
+    formatted_data = format_supervault_data(contract_info, vault_address, chain_id, snapshot_block)
+    
+    # Write data to ClickHouse
+    with pool.connection() as client:
+        insert_dataframe(client, formatted_data['whitelist'], 'supervault_whitelist')
+        insert_dataframe(client, formatted_data['metrics'], 'supervault_metrics')
+        set_checkpoint(client, chain_id, vault_address, SNAPSHOT_STREAM, snapshot_block)
+    logger.info(f"Snapshot of chain {chain_id} ingested up to block {snapshot_block}")
+    
+    return contract_info
 
-@flow(name="Get form ids from SuperVault Flow")
+@flow(name="Get form ids from SuperVault Flow", on_completion=[publish_rpc_metrics], on_failure=[publish_rpc_metrics])
 def supervault_flow():
     chain_id = int(os.getenv('CHAIN_ID', 1))
     vault_address = os.getenv('VAULT_ADDRESS')
@@ -271,46 +293,45 @@ def supervault_flow():
     logger = get_run_logger()
     logger.info(f"Starting SuperVault flow with chain_id={chain_id}, vault_address={vault_address}")
     
-    # Initialize and get supervault data
-    supervault = initialize_supervault(chain_id, vault_address)
-    contract_info = print_supervault_info(supervault, vault_address)
+    # Bring the ClickHouse schema up to date
+    migrate_schema_flow()
     
-    # Format data for ClickHouse
-    formatted_data = format_supervault_data(contract_info, vault_address)
+    return snapshot_supervault(chain_id, vault_address)
+
+@flow(name="Multi-chain SuperVault Flow", task_runner=ThreadPoolTaskRunner(max_workers=MAX_CHAIN_WORKERS), on_completion=[publish_rpc_metrics], on_failure=[publish_rpc_metrics])
+def multichain_supervault_flow(chain_ids: list[int] | None = None):
+    logger = get_run_logger()
+    configs = get_chain_configs(chain_ids)
+    chains = [chain for chain in configs if chain.supervaults]
+    idle = [chain.chain_id for chain in configs if not chain.supervaults]
+    if idle:
+        logger.warning(f"No SuperVaults configured on chains {idle}, skipping them")
+    logger.info(f"Starting SuperVault flow for chains {[chain.chain_id for chain in chains]}")
     
-    # Create ClickHouse tables if they don't exist
-    whitelist_query = """
-        CREATE TABLE IF NOT EXISTS supervault_whitelist (
-            form_id UInt64,
-            form_id_hex String,
-            vault_address String,
-            timestamp DateTime
-        ) ENGINE = MergeTree()
-        ORDER BY (timestamp, form_id)
-    """
-    create_table_flow(whitelist_query)
+    migrate_schema_flow()
     
-    # metrics_query = """
-    #     CREATE TABLE IF NOT EXISTS supervault_metrics (
-    #         vault_address String,
-    #         deposit_limit UInt256,
-    #         available_deposit_limit UInt256,
-    #         available_withdraw_limit UInt256,
-    #         number_of_superforms UInt64,
-    #         strategist String,
-    #         vault_manager String,
-    #         tokenized_strategy String,
-    #         timestamp DateTime
-    #     ) ENGINE = MergeTree()
-    #     ORDER BY (timestamp, vault_address)
-    # """
-    # create_table_flow(metrics_query)
+    # Every vault on every chain runs in its own worker, each chain behind its own RPC
+    # rate limit and checkpoints, so a slow chain does not hold up the rest
+    futures = {
+        (chain.chain_id, vault_address): snapshot_supervault.submit(chain.chain_id, vault_address)
+        for chain in chains
+        for vault_address in chain.supervaults
+    }
     
-    # Write data to ClickHouse
-    # write_data_flow(formatted_data['whitelist'], 'supervault_whitelist')
-    # write_data_flow(formatted_data['metrics'], 'supervault_metrics')
+    # Wait for every vault before failing, so one chain's outage doesn't cut the others short
+    results = {}
+    failed = []
+    for (chain_id, vault_address), future in futures.items():
+        try:
+            results[(chain_id, vault_address)] = future.result()
+        except Exception as e:
+            logger.error(f"Failed to snapshot vault {vault_address} on chain {chain_id}: {str(e)}")
+            failed.append(f"{vault_address} on chain {chain_id}")
     
-    return contract_info
+    logger.info(f"Snapshotted {len(results)} of {len(futures)} vaults")
+    if failed:
+        raise PrefectException(f"Failed to snapshot {len(failed)} of {len(futures)} vaults: {', '.join(failed)}")
+    return results
 
 if __name__ == "__main__":
     supervault_flow()
\ No newline at end of file
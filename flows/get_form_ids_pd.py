@@ -8,7 +8,7 @@ from prefect import task, flow, get_run_logger
 from prefect.exceptions import PrefectException
 from prefect.tasks import NO_CACHE
 import pandas as pd
-from clickhouse import create_clickhouse_connection
+from clickhouse import get_clickhouse_pool
 
 load_dotenv(".env")
 
@@ -204,7 +204,8 @@ def format_supervault_data(contract_info, vault_address):
 @flow(name="Create Table Flow")
 def create_table_flow(query: str):
     logger = get_run_logger()
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
         # Extract table name from the query
         table_name = query.split('CREATE TABLE IF NOT EXISTS ')[1].split(' ')[0]
@@ -220,11 +221,14 @@ def create_table_flow(query: str):
     except Exception as e:
         logger.error(f"Failed to create table: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 @flow(name="Write Data Flow")
 def write_data_flow(data: pd.DataFrame, table_name: str):
     logger = get_run_logger()
-    client = create_clickhouse_connection()
+    pool = get_clickhouse_pool()
+    client = pool.acquire()
     try:
         # Convert DataFrame to list of dictionaries for better control over data types
         records = data.to_dict('records')
@@ -237,6 +241,8 @@ def write_data_flow(data: pd.DataFrame, table_name: str):
     except Exception as e:
         logger.error(f"Failed to write data: {str(e)}")
         raise
+    finally:
+        pool.release(client)
 
 @flow(name="Get form ids from SuperVault Flow")
 def supervault_flow():
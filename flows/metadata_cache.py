@@ -0,0 +1,80 @@
+import os
+import json
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+# Global configuration
+METADATA_CACHE_PATH = os.getenv('METADATA_CACHE_PATH', '.cache/contract_metadata.db')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+class MetadataCache:
+    """
+    Cache for contract view results that never change once a contract is deployed
+    (names, symbols, decimals, underlying addresses).
+
+    Entries are keyed by (chain_id, contract address, function name), served from memory
+    and persisted to SQLite so later flow runs start warm.
+    """
+    def __init__(self, path=METADATA_CACHE_PATH):
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS contract_metadata (
+                chain_id INTEGER,
+                contract_address TEXT,
+                function TEXT,
+                value TEXT,
+                PRIMARY KEY (chain_id, contract_address, function)
+            )
+        """)
+        self.db.commit()
+
+        self.entries = {
+            (chain_id, contract_address, function): json.loads(value)
+            for chain_id, contract_address, function, value in self.db.execute(
+                "SELECT chain_id, contract_address, function, value FROM contract_metadata"
+            )
+        }
+
+    def get_many(self, chain_id, contract_address, functions):
+        """Return {function: value} for the functions that are already cached."""
+        contract_address = contract_address.lower()
+        return {
+            function: self.entries[(chain_id, contract_address, function)]
+            for function in functions
+            if (chain_id, contract_address, function) in self.entries
+        }
+
+    def set_many(self, chain_id, contract_address, values):
+        contract_address = contract_address.lower()
+        new_entries = {
+            (chain_id, contract_address, function): value
+            for function, value in values.items()
+            if value is not None and (chain_id, contract_address, function) not in self.entries
+        }
+        if not new_entries:
+            return
+
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO contract_metadata VALUES (?, ?, ?, ?)",
+                [(*key, json.dumps(value)) for key, value in new_entries.items()]
+            )
+            self.db.commit()
+            self.entries.update(new_entries)
+
+def get_metadata_cache():
+    """Return the process-wide metadata cache, loading it from disk on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
@@ -0,0 +1,203 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime
+from checkpoints import CHECKPOINTS_TABLE_QUERY
+from rollups import rollup_schema_queries
+
+logger = logging.getLogger(__name__)
+
+# Global configuration
+# Seconds a claim on a migration holds; a process that died mid-migration stops blocking others after it
+MIGRATION_CLAIM_TIMEOUT = int(os.getenv('MIGRATION_CLAIM_TIMEOUT', 600))
+MIGRATION_POLL_INTERVAL = 1.0
+
+MIGRATIONS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version UInt32,
+        name String,
+        applied_at DateTime64(3)
+    ) ENGINE = ReplacingMergeTree(applied_at)
+    ORDER BY version
+"""
+
+# Processes sharing a database claim a migration before applying it; the earliest live
+# claim wins and the others wait for it to be recorded in schema_migrations
+MIGRATION_CLAIMS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS schema_migration_claims (
+        version UInt32,
+        owner String,
+        claimed_at DateTime64(6) DEFAULT now64(6)
+    ) ENGINE = MergeTree()
+    ORDER BY (version, claimed_at)
+    TTL toDateTime(claimed_at) + INTERVAL 30 DAY
+"""
+
+# Snapshot tables are append-only: a re-ingested (vault, form, block) replaces the earlier
+# row with the same key once ClickHouse merges it, keeping the highest version
+WHITELIST_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS supervault_whitelist (
+        chain_id UInt64,
+        vault_address String,
+        form_id UInt256,
+        block_number UInt64,
+        form_id_hex String,
+        timestamp DateTime,
+        superform_address String,
+        form_implementation_id UInt32,
+        superform_chain_id UInt64,
+        version UInt64
+    ) ENGINE = ReplacingMergeTree(version)
+    PARTITION BY toYYYYMM(timestamp)
+    ORDER BY (chain_id, vault_address, form_id, block_number)
+"""
+
+# Limits are kept as native UInt256; an unlimited vault reports type(uint256).max
+METRICS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS supervault_metrics (
+        chain_id UInt64,
+        vault_address String,
+        block_number UInt64,
+        deposit_limit UInt256,
+        available_deposit_limit UInt256,
+        available_withdraw_limit UInt256,
+        number_of_superforms UInt64,
+        strategist String,
+        vault_manager String,
+        tokenized_strategy String,
+        timestamp DateTime,
+        version UInt64
+    ) ENGINE = ReplacingMergeTree(version)
+    PARTITION BY toYYYYMM(timestamp)
+    ORDER BY (chain_id, vault_address, block_number)
+"""
+
+# One row per (flow run, endpoint, method, function). latency_buckets holds the call count
+# per rpc_metrics.LATENCY_BUCKETS_MS bucket, so percentiles over any period can be taken
+# from sumForEach(latency_buckets)
+RPC_METRICS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS rpc_metrics (
+        flow_run_id String,
+        flow_name LowCardinality(String),
+        recorded_at DateTime64(3),
+        endpoint LowCardinality(String),
+        method LowCardinality(String),
+        function String,
+        calls UInt64,
+        errors UInt64,
+        request_bytes UInt64,
+        response_bytes UInt64,
+        latency_sum_ms Float64,
+        latency_max_ms Float64,
+        p50_ms Float64,
+        p99_ms Float64,
+        latency_buckets Array(UInt64)
+    ) ENGINE = MergeTree()
+    PARTITION BY toYYYYMM(recorded_at)
+    ORDER BY (method, function, recorded_at)
+"""
+
+_migrate_lock = threading.Lock()
+
+def _keep_unversioned_tables(client):
+    # Earlier releases dropped and recreated these tables on every run without a version
+    # column. Move any such table aside, rows untouched, so the versioned one can be created.
+    for table in ('supervault_whitelist', 'supervault_metrics'):
+        exists = client.execute(
+            "SELECT count() FROM system.tables WHERE database = currentDatabase() AND name = %(table)s",
+            {'table': table}
+        )[0][0]
+        versioned = client.execute(
+            """
+            SELECT count() FROM system.columns
+            WHERE database = currentDatabase() AND table = %(table)s AND name = 'version'
+            """,
+            {'table': table}
+        )[0][0]
+        if exists and not versioned:
+            suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+            client.execute(f"RENAME TABLE {table} TO {table}_unversioned_{suffix}")
+            logger.warning(f"Renamed unversioned {table} to {table}_unversioned_{suffix}")
+
+# (version, name, steps). A step is a SQL statement or a callable taking the client, and
+# must be safe to run twice: a migration whose process died half way is applied again.
+# Never edit an applied migration; append a new one instead.
+MIGRATIONS = [
+    (1, 'versioned_supervault_snapshots', [
+        _keep_unversioned_tables,
+        WHITELIST_TABLE_QUERY,
+        METRICS_TABLE_QUERY,
+    ]),
+    (2, 'rpc_metrics', [
+        RPC_METRICS_TABLE_QUERY,
+    ]),
+    (3, 'ingestion_checkpoints', [
+        CHECKPOINTS_TABLE_QUERY,
+    ]),
+    # New rollup intervals need a migration of their own
+    (4, 'raw_tables_and_rollups', rollup_schema_queries()),
+]
+
+def get_applied_migrations(client):
+    client.execute(MIGRATIONS_TABLE_QUERY)
+    return {version for (version,) in client.execute("SELECT DISTINCT version FROM schema_migrations")}
+
+def _claim(client, version, owner):
+    client.execute('INSERT INTO schema_migration_claims (version, owner) VALUES', [(version, owner)])
+    rows = client.execute(
+        """
+        SELECT owner FROM schema_migration_claims
+        WHERE version = %(version)s AND claimed_at > now64(6) - toIntervalSecond(%(timeout)s)
+        ORDER BY claimed_at, owner
+        LIMIT 1
+        """,
+        {'version': version, 'timeout': MIGRATION_CLAIM_TIMEOUT}
+    )
+    return not rows or rows[0][0] == owner
+
+def _apply_migration(client, version, name, steps, owner):
+    """Apply one migration unless another process claims it first; True if this call applied it."""
+    while True:
+        if _claim(client, version, owner):
+            for step in steps:
+                if callable(step):
+                    step(client)
+                else:
+                    client.execute(step)
+            client.execute(
+                'INSERT INTO schema_migrations VALUES',
+                [(version, name, datetime.now())]
+            )
+            logger.info(f"Applied migration {version} {name}")
+            return True
+        logger.info(f"Waiting for another process to apply migration {version} {name}")
+        deadline = time.monotonic() + MIGRATION_CLAIM_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(MIGRATION_POLL_INTERVAL)
+            if version in get_applied_migrations(client):
+                return False
+        # The other claim lapsed without the migration being recorded: claim it again
+
+def apply_migrations(client, migrations=MIGRATIONS):
+    """
+    Apply every migration not yet recorded in schema_migrations, in version order.
+
+    Returns the names of the migrations applied by this call. A run with nothing pending
+    costs a single lookup, however much history the tables hold. Each pending migration is
+    claimed in schema_migration_claims first, so processes migrating the same database
+    concurrently apply it once.
+    """
+    with _migrate_lock:
+        applied = get_applied_migrations(client)
+        pending = [
+            migration for migration in sorted(migrations, key=lambda migration: migration[0])
+            if migration[0] not in applied
+        ]
+        if not pending:
+            return []
+        client.execute(MIGRATION_CLAIMS_TABLE_QUERY)
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        return [name for version, name, steps in pending if _apply_migration(client, version, name, steps, owner)]
@@ -0,0 +1,419 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import encode, decode
+from eth_abi.grammar import parse, TupleType
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector, to_checksum_address
+from abi_registry import get_abi
+from multicall import MULTICALL3_ADDRESS
+
+# Deterministic chain served by MockRPCServer, for benchmarks that must not touch a live RPC
+MOCK_CHAIN_ID = 1
+MOCK_HEAD_BLOCK = 20_000_000
+MOCK_HEAD_TIMESTAMP = 1_700_000_000
+MOCK_BLOCK_TIME = 12
+MOCK_MAX_LOGS = 10_000  # eth_getLogs ranges returning more are rejected, like public providers
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+def _digest(*parts):
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).digest()
+
+def _address(*parts):
+    return to_checksum_address(_digest('address', *parts)[:20])
+
+def default_value(type_str, *seed):
+    """A deterministic value of ABI type `type_str`, derived from `seed`."""
+    node = parse(type_str)
+    if node.is_array:
+        return []
+    if isinstance(node, TupleType):
+        return tuple(default_value(component.to_type_str(), *seed, i) for i, component in enumerate(node.components))
+    digest = _digest(type_str, *seed)
+    if node.base == 'address':
+        return to_checksum_address(digest[:20])
+    if node.base == 'bool':
+        return True
+    if node.base == 'string':
+        return f"mock-{digest[:4].hex()}"
+    if node.base == 'bytes':
+        return digest[:node.sub] if node.sub else b''
+    bits = min(node.sub or 256, 64)
+    return int.from_bytes(digest[:8], 'big') % (2 ** (bits - 1))
+
+class MockContract:
+    """
+    Answers eth_call for one address from an ABI.
+
+    `values` maps function names to `fn(block_number, *args)`; every other view function
+    returns a deterministic default for its output types. `events` names the events the
+    contract emits once every `log_interval` blocks.
+    """
+    def __init__(self, address, abi_name, values=None, events=(), log_interval=100):
+        self.address = to_checksum_address(address)
+        self.abi_name = abi_name
+        self.values = values or {}
+        self.log_interval = log_interval
+
+        abi = get_abi(abi_name)
+        self.functions = {
+            function_abi_to_4byte_selector(item): item
+            for item in abi if item['type'] == 'function'
+        }
+        self.events = {
+            '0x' + event_abi_to_log_topic(item).hex(): item
+            for item in abi if item['type'] == 'event' and item['name'] in events
+        }
+
+    def call(self, data, block_number):
+        fn = self.functions.get(data[:4])
+        if fn is None:
+            raise ValueError(f"execution reverted: unknown selector 0x{data[:4].hex()}")
+        input_types = [_abi_type(i) for i in fn['inputs']]
+        output_types = [_abi_type(o) for o in fn['outputs']]
+        args = decode(input_types, data[4:]) if input_types else ()
+
+        if fn['name'] in self.values:
+            value = self.values[fn['name']](block_number, *args)
+            outputs = value if len(output_types) > 1 else (value,)
+        else:
+            outputs = tuple(
+                default_value(output_type, self.address, fn['name'], i)
+                for i, output_type in enumerate(output_types)
+            )
+        return encode(output_types, outputs)
+
+    def logs(self, topics, from_block, to_block):
+        wanted = [topic for topic in self.events if not topics or topic in topics]
+        first = from_block + (-from_block % self.log_interval)
+        for block_number in range(first, to_block + 1, self.log_interval):
+            for log_index, topic in enumerate(wanted):
+                yield self._log(self.events[topic], topic, block_number, log_index)
+
+    def _log(self, event, topic, block_number, log_index):
+        indexed = [i for i in event['inputs'] if i['indexed']]
+        non_indexed = [i for i in event['inputs'] if not i['indexed']]
+        log_topics = [topic] + [
+            '0x' + encode([i['type']], [default_value(i['type'], self.address, block_number, i['name'])]).hex()
+            for i in indexed
+        ]
+        data = encode(
+            [i['type'] for i in non_indexed],
+            [default_value(i['type'], self.address, block_number, i['name']) for i in non_indexed]
+        )
+        return {
+            'address': self.address,
+            'topics': log_topics,
+            'data': '0x' + data.hex(),
+            'blockNumber': hex(block_number),
+            'blockHash': '0x' + _digest('block', block_number).hex(),
+            'transactionHash': '0x' + _digest('tx', block_number, log_index).hex(),
+            'transactionIndex': hex(log_index),
+            'logIndex': hex(log_index),
+            'removed': False,
+        }
+
+def _abi_type(item):
+    # 'tuple[]' with components (address,bool,bytes) -> '(address,bool,bytes)[]'
+    if not item['type'].startswith('tuple'):
+        return item['type']
+    inner = ','.join(_abi_type(component) for component in item['components'])
+    return f"({inner}){item['type'][len('tuple'):]}"
+
+class MockChain:
+    """
+    Deterministic chain state: blocks every `block_time` seconds up to `head_block`, a
+    Multicall3 deployment and whatever contracts are added.
+    """
+    def __init__(self, chain_id=MOCK_CHAIN_ID, head_block=MOCK_HEAD_BLOCK, head_timestamp=MOCK_HEAD_TIMESTAMP, block_time=MOCK_BLOCK_TIME):
+        self.chain_id = chain_id
+        self.head_block = head_block
+        self.head_timestamp = head_timestamp
+        self.block_time = block_time
+        self.contracts = {}
+        self.add(MockContract(MULTICALL3_ADDRESS, 'multicall3', {
+            'aggregate3': self._aggregate3,
+            'getCurrentBlockTimestamp': self.block_timestamp,
+            'getBlockNumber': lambda block_number: block_number,
+            'getChainId': lambda block_number: self.chain_id,
+        }))
+
+    def add(self, contract):
+        self.contracts[contract.address.lower()] = contract
+        return contract
+
+    def block_timestamp(self, block_number):
+        return self.head_timestamp - (self.head_block - block_number) * self.block_time
+
+    def block_number(self, block_identifier):
+        if block_identifier in (None, 'latest', 'safe', 'finalized', 'pending'):
+            return self.head_block
+        if block_identifier == 'earliest':
+            return 0
+        return int(block_identifier, 16)
+
+    def get_block(self, block_identifier):
+        block_number = self.block_number(block_identifier)
+        if block_number > self.head_block:
+            return None
+        return {
+            'number': hex(block_number),
+            'hash': '0x' + _digest('block', block_number).hex(),
+            'parentHash': '0x' + _digest('block', block_number - 1).hex(),
+            'timestamp': hex(self.block_timestamp(block_number)),
+            'gasLimit': hex(30_000_000),
+            'gasUsed': hex(15_000_000),
+            'baseFeePerGas': hex(10**9),
+            'transactions': [],
+        }
+
+    def call(self, transaction, block_identifier):
+        contract = self.contracts.get(transaction['to'].lower())
+        if contract is None:
+            return b''
+        data = bytes.fromhex(transaction.get('data', transaction.get('input', '0x'))[2:])
+        return contract.call(data, self.block_number(block_identifier))
+
+    def get_logs(self, log_filter):
+        from_block = self.block_number(log_filter.get('fromBlock'))
+        to_block = self.block_number(log_filter.get('toBlock'))
+        addresses = log_filter.get('address') or list(self.contracts)
+        addresses = [addresses] if isinstance(addresses, str) else addresses
+        topics = (log_filter.get('topics') or [None])[0]
+        topics = [topics] if isinstance(topics, str) else topics
+
+        logs = []
+        for address in addresses:
+            contract = self.contracts.get(address.lower())
+            if contract is None or not contract.events:
+                continue
+            for log in contract.logs(topics, from_block, to_block):
+                logs.append(log)
+                if len(logs) > MOCK_MAX_LOGS:
+                    raise ValueError(f"query returned more than {MOCK_MAX_LOGS} results")
+        return logs
+
+    def _aggregate3(self, block_number, calls):
+        results = []
+        for target, allow_failure, call_data in calls:
+            contract = self.contracts.get(target.lower())
+            try:
+                if contract is None:
+                    raise ValueError(f"no contract at {target}")
+                results.append((True, contract.call(call_data, block_number)))
+            except Exception:
+                if not allow_failure:
+                    raise
+                results.append((False, b''))
+        return results
+
+def add_supervault(chain, forms=10, seed=0):
+    """
+    Add a SuperVault whitelisting `forms` ERC4626 forms, each accruing a fixed yield.
+
+    Returns (vault_address, [form_address, ...]).
+    """
+    form_addresses = []
+    for i in range(forms):
+        address = _address('form', seed, i)
+        decimals = 6 if i % 2 else 18
+        apr = 0.02 + 0.1 * i / max(forms, 1)
+        supply = (i + 1) * 10**6 * 10**decimals
+
+        def price(block_number, decimals=decimals, apr=apr):
+            # Share price grows linearly with the chain's clock from 1.0
+            elapsed = chain.block_timestamp(block_number) - chain.block_timestamp(0)
+            return 10**decimals + 10**decimals * int(apr * 10**9) * elapsed // (SECONDS_PER_YEAR * 10**9)
+
+        chain.add(MockContract(address, 'erc4626_form', {
+            'getVaultName': lambda block_number, i=i: f"Mock Vault {i}",
+            'getVaultSymbol': lambda block_number, i=i: f"MV{i}",
+            'getVaultDecimals': lambda block_number, decimals=decimals: decimals,
+            'getVaultAddress': lambda block_number, i=i: _address('vault', seed, i),
+            'getVaultAsset': lambda block_number, i=i: _address('asset', seed, i),
+            'getPricePerVaultShare': price,
+            'getPreviewPricePerVaultShare': price,
+            'getTotalSupply': lambda block_number, supply=supply: supply,
+            'getTotalAssets': lambda block_number, supply=supply, price=price, decimals=decimals: supply * price(block_number) // 10**decimals,
+        }))
+        form_addresses.append(address)
+
+    superform_ids = [
+        (chain.chain_id << 192) | (1 << 160) | int(address, 16)
+        for address in form_addresses
+    ]
+    vault_address = _address('supervault', seed)
+    chain.add(MockContract(vault_address, 'super_vault', {
+        'getWhitelist': lambda block_number: superform_ids,
+        'superformIds': lambda block_number, index: superform_ids[index],
+        'numberOfSuperforms': lambda block_number: len(superform_ids),
+        'getIsWhitelisted': lambda block_number, ids: [True] * len(ids),
+        'depositLimit': lambda block_number: 2**256 - 1,
+        'availableDepositLimit': lambda block_number, receiver: 10**30,
+        'availableWithdrawLimit': lambda block_number, owner: 10**24,
+        'getSuperVaultData': lambda block_number: (superform_ids, [10_000 // len(superform_ids)] * len(superform_ids)),
+    }))
+    return vault_address, form_addresses
+
+def add_super_positions(chain, log_interval=100, seed=0):
+    """Add a SuperPositions contract emitting a TransferSingle every `log_interval` blocks."""
+    address = _address('super_positions', seed)
+    chain.add(MockContract(address, 'super_positions', events=('TransferSingle',), log_interval=log_interval))
+    return address
+
+class MockRPCServer:
+    """
+    Local JSON-RPC endpoint serving a MockChain, with injected latency and failures.
+
+    Every HTTP request waits `latency` seconds plus up to `jitter` more, a share `slow_rate`
+    of them `slow_latency` seconds longer still, then fails with HTTP 503 with probability
+    `failure_rate`. Like a metered provider, it answers HTTP 429 with Retry-After once more
+    than `max_requests_per_second` JSON-RPC requests, batch entries included, arrive within
+    one second. Requests are counted per method in `calls`, and eth_call also per called
+    function in `eth_calls`. Use as a context manager, or call start()/stop().
+    """
+    def __init__(self, chain, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0, host='127.0.0.1', port=0, slow_rate=0.0, slow_latency=0.0, max_requests_per_second=None):
+        self.chain = chain
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.max_requests_per_second = max_requests_per_second
+        self.window = None
+        self.window_requests = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.eth_calls = Counter()
+        self.failures = 0
+        self.throttled = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.eth_calls.clear()
+            self.failures = 0
+            self.throttled = 0
+
+    def _throttle(self, requests):
+        if not self.max_requests_per_second:
+            return False
+        with self.lock:
+            window = int(time.monotonic())
+            if window != self.window:
+                self.window, self.window_requests = window, 0
+            self.window_requests += requests
+            throttled = self.window_requests > self.max_requests_per_second
+            if throttled:
+                self.throttled += requests
+            return throttled
+
+    def _delay_and_fail(self):
+        with self.lock:
+            delay = self.latency + self.random.random() * self.jitter
+            if self.random.random() < self.slow_rate:
+                delay += self.slow_latency
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        time.sleep(delay)
+        return failed
+
+    def _count(self, request):
+        method = request.get('method')
+        with self.lock:
+            self.calls[method] += 1
+            if method == 'eth_call':
+                transaction = request['params'][0]
+                contract = self.chain.contracts.get(transaction.get('to', '').lower())
+                data = bytes.fromhex(transaction.get('data', transaction.get('input', '0x'))[2:])
+                fn = contract.functions.get(data[:4]) if contract else None
+                self.eth_calls[fn['name'] if fn else data[:4].hex()] += 1
+
+    def dispatch(self, request):
+        self._count(request)
+        method, params = request.get('method'), request.get('params') or []
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            if method == 'eth_chainId':
+                response['result'] = hex(self.chain.chain_id)
+            elif method == 'net_version':
+                response['result'] = str(self.chain.chain_id)
+            elif method == 'eth_blockNumber':
+                response['result'] = hex(self.chain.head_block)
+            elif method == 'eth_getBlockByNumber':
+                response['result'] = self.chain.get_block(params[0])
+            elif method == 'eth_call':
+                response['result'] = '0x' + self.chain.call(params[0], params[1] if len(params) > 1 else 'latest').hex()
+            elif method == 'eth_getLogs':
+                response['result'] = self.chain.get_logs(params[0])
+            else:
+                response['error'] = {'code': -32601, 'message': f"Method {method} not supported by the mock"}
+        except Exception as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+        return response
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms to each
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                requests = body if isinstance(body, list) else [body]
+                if server._throttle(len(requests)):
+                    self._send(429, b'{"error": "rate limited"}', {'Retry-After': '1'})
+                    return
+                if server._delay_and_fail():
+                    self._send(503, b'{"error": "mock failure"}')
+                    return
+                responses = [server.dispatch(request) for request in requests]
+                self._send(200, json.dumps(responses if isinstance(body, list) else responses[0]).encode())
+
+            def _send(self, status, payload, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. a hedged request another endpoint answered first
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
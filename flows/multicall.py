@@ -0,0 +1,93 @@
+import logging
+from eth_abi.exceptions import DecodingError
+from eth_utils.abi import get_abi_output_types
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from abi_registry import get_contract
+
+logger = logging.getLogger(__name__)
+
+# Multicall3 is deployed at the same address on every major EVM chain
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MAX_CALLS_PER_BATCH = 500
+
+
+class Multicall:
+    """
+    Collects contract view calls and executes them in a single Multicall3 aggregate3 eth_call.
+
+    Each call is registered under a key and the decoded results are returned as a dict
+    with the same keys and the same value shapes as ContractFunction.call().
+    """
+    def __init__(self, w3, allow_failure=True, max_calls_per_batch=MAX_CALLS_PER_BATCH):
+        self.w3 = w3
+        self.allow_failure = allow_failure
+        self.max_calls_per_batch = max_calls_per_batch
+        self.contract = get_contract(w3, 'multicall3', MULTICALL3_ADDRESS)
+        self.calls = []
+
+    def add(self, key, contract_function):
+        self.calls.append((key, contract_function))
+        return self
+
+    def add_block_timestamp(self, key='block_timestamp'):
+        return self.add(key, self.contract.functions.getCurrentBlockTimestamp())
+
+    def add_chain_id(self, key='chain_id'):
+        return self.add(key, self.contract.functions.getChainId())
+
+    def call(self, block_identifier='latest'):
+        results = {}
+        for batch, encoded in self._batches():
+            responses = self.contract.functions.aggregate3(encoded).call(
+                block_identifier=block_identifier
+            )
+            self._decode_batch(batch, responses, results)
+        return results
+
+    async def call_async(self, block_identifier='latest'):
+        # Same as call() for an AsyncWeb3 instance
+        results = {}
+        for batch, encoded in self._batches():
+            responses = await self.contract.functions.aggregate3(encoded).call(
+                block_identifier=block_identifier
+            )
+            self._decode_batch(batch, responses, results)
+        return results
+
+    def _batches(self):
+        for i in range(0, len(self.calls), self.max_calls_per_batch):
+            batch = self.calls[i:i + self.max_calls_per_batch]
+            encoded = [
+                (fn.address, self.allow_failure, fn._encode_transaction_data())
+                for _, fn in batch
+            ]
+            yield batch, encoded
+
+    def _decode_batch(self, batch, responses, results):
+        for (key, fn), (success, return_data) in zip(batch, responses):
+            results[key] = self._decode(key, fn, success, return_data)
+
+    def _decode(self, key, fn, success, return_data):
+        if not success:
+            logger.warning(f"Multicall: call '{key}' ({fn.fn_name}) reverted")
+            return None
+
+        output_types = get_abi_output_types(fn.abi)
+        try:
+            decoded = self.w3.codec.decode(output_types, return_data)
+        except DecodingError:
+            logger.warning(f"Multicall: could not decode '{key}' ({fn.fn_name}) return data")
+            return None
+
+        normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)
+        if len(normalized) == 1:
+            return normalized[0]
+        return normalized
+
+def multicall(w3, calls, block_identifier='latest', allow_failure=True):
+    """Execute a {key: ContractFunction} mapping in one aggregate3 call and return {key: result}."""
+    batch = Multicall(w3, allow_failure=allow_failure)
+    for key, contract_function in calls.items():
+        batch.add(key, contract_function)
+    return batch.call(block_identifier=block_identifier)
@@ -0,0 +1,126 @@
+import time
+import queue
+import threading
+import contextvars
+
+class _End:
+    """Marks the end of a stage's output, carrying the error that ended it, if any."""
+    def __init__(self, error=None):
+        self.error = error
+
+class Stage:
+    """
+    Iterates `source` in a background thread and hands its items downstream through a queue
+    holding at most `maxsize` of them.
+
+    A full queue blocks the thread, so a slow consumer holds back every stage before it and
+    memory stays bounded by the queue sizes rather than by the input. Errors raised by `source`
+    are re-raised in the consumer. The thread runs in a copy of the caller's context, so Prefect
+    loggers and tasks used by `source` belong to the calling flow run.
+
+    Use as a context manager: leaving the block early stops this stage and every stage feeding it.
+    """
+    # Seconds between checks for a closed stage while the queue is full
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, source, maxsize=1, name=None):
+        self.source = source
+        self.queue = queue.Queue(maxsize)
+        self.closed = threading.Event()
+        self.done = False
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self._run,), name=name, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _end(self, error=None):
+        end = _End(error)
+        if self._put(end):
+            return
+        # Closed: drop undelivered items so a consumer still blocked on this stage wakes up.
+        # This thread is the only producer, so the emptied queue has room.
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put_nowait(end)
+
+    def _run(self):
+        try:
+            for item in self.source:
+                if not self._put(item):
+                    break
+            self._end()
+        except BaseException as e:
+            self._end(e)
+        finally:
+            # Generators are closed by the thread running them; upstream stages stop producing
+            close = getattr(self.source, 'close', None)
+            if close is not None:
+                close()
+
+    def get(self, timeout=None):
+        """Next item; raises queue.Empty after `timeout` seconds and StopIteration once the source is exhausted."""
+        if self.done:
+            raise StopIteration
+        item = self.queue.get(timeout=timeout)
+        if isinstance(item, _End):
+            self.done = True
+            if item.error is not None:
+                raise item.error
+            raise StopIteration
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.get()
+
+    def close(self):
+        self.closed.set()
+        if isinstance(self.source, Stage):
+            self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def batched(stage, max_size, max_interval, size=len):
+    """
+    Group the items of `stage` into lists, flushing once their `size` adds up to `max_size`
+    or `max_interval` seconds after the previous flush, whichever comes first.
+
+    The time threshold also applies while `stage` is idle, so a slow source still flushes regularly.
+    """
+    batch = []
+    batch_size = 0
+    last_flush = time.monotonic()
+    while True:
+        timeout = max(last_flush + max_interval - time.monotonic(), 0) if batch else None
+        try:
+            item = stage.get(timeout=timeout)
+            batch.append(item)
+            batch_size += size(item)
+        except queue.Empty:
+            pass
+        except StopIteration:
+            break
+        if batch and (batch_size >= max_size or time.monotonic() - last_flush >= max_interval):
+            yield batch
+            batch = []
+            batch_size = 0
+            last_flush = time.monotonic()
+    if batch:
+        yield batch
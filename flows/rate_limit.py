@@ -0,0 +1,244 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+# Global configuration
+RATE_LIMIT_PATH = os.getenv('RATE_LIMIT_PATH', '.cache/rate_limits.db')
+# Share budgets with every process on this host using the same RATE_LIMIT_PATH, e.g. Prefect workers
+RATE_LIMIT_SHARED = os.getenv('RATE_LIMIT_SHARED', 'true').lower() in ('1', 'true', 'yes')
+# Pause after a 429 without Retry-After, and the longest pause honoured
+RATE_LIMIT_PAUSE = float(os.getenv('RATE_LIMIT_PAUSE', 1.0))
+RATE_LIMIT_MAX_PAUSE = 60
+
+# Compute units per JSON-RPC method, as metered by CU-based providers (Alchemy's published costs)
+COMPUTE_UNITS = {
+    'eth_chainId': 0,
+    'net_version': 0,
+    'web3_clientVersion': 0,
+    'eth_blockNumber': 10,
+    'eth_getBlockByNumber': 16,
+    'eth_getBlockByHash': 16,
+    'eth_getTransactionReceipt': 15,
+    'eth_getTransactionByHash': 17,
+    'eth_getStorageAt': 17,
+    'eth_getBalance': 19,
+    'eth_getCode': 19,
+    'eth_gasPrice': 19,
+    'eth_call': 26,
+    'eth_getLogs': 75,
+    'eth_estimateGas': 87,
+}
+DEFAULT_COMPUTE_UNITS = 26
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+_db = None
+_db_lock = threading.Lock()
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second on average, with bursts of up to `burst`.
+
+    Safe to share between threads; `acquire_async` waits without blocking the event loop.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _reserve(self, tokens):
+        # Take the tokens now, possibly going into debt, and return how long to wait for them
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds`, e.g. after the endpoint answered 429."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def acquire(self, tokens=1):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens=1):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class RateLimitStore:
+    """SQLite file holding token buckets shared by every process that opens it."""
+    def __init__(self, path=RATE_LIMIT_PATH):
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit: each reservation is one atomic statement, serialized by SQLite's file lock
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # Buckets are cheap to rebuild, so a crash may lose the last writes
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tokens REAL,
+                updated REAL
+            )
+        """)
+
+    def reserve(self, key, rate, burst, tokens, floor=None):
+        """Refill and debit the bucket in one statement; `floor` caps it below, for pauses. Returns the tokens left."""
+        now = time.time()
+        with self.lock:
+            return self.db.execute(
+                """
+                INSERT INTO rate_limits (key, tokens, updated) VALUES (:key, MIN(:burst - :tokens, :floor), :now)
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = MIN(MIN(:burst, tokens + MAX(0, :now - updated) * :rate) - :tokens, :floor),
+                    updated = MAX(updated, :now)
+                RETURNING tokens
+                """,
+                {'key': key, 'rate': rate, 'burst': burst, 'tokens': tokens, 'now': now, 'floor': floor if floor is not None else burst}
+            ).fetchone()[0]
+
+def get_rate_limit_store():
+    """Return the process-wide shared bucket store, opening it on first use."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = RateLimitStore()
+        return _db
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose bucket lives in the RateLimitStore, so threads, asyncio tasks and
+    processes on this host all draw from the same budget for `key`.
+    """
+    def __init__(self, key, rate, burst=None):
+        super().__init__(rate, burst)
+        # Endpoint URLs often carry API keys, so only their hash is stored
+        self.key = hashlib.sha256(key.encode()).hexdigest()
+        self.store = get_rate_limit_store()
+
+    def _reserve(self, tokens):
+        left = self.store.reserve(self.key, self.rate, self.burst, tokens)
+        return max(0.0, -left / self.rate)
+
+    def pause(self, seconds):
+        self.store.reserve(self.key, self.rate, self.burst, 0, floor=-seconds * self.rate)
+
+class RateBudget:
+    """
+    Requests per second and compute units per second allowed on one endpoint.
+
+    Either limit may be None. A call waits until both buckets can pay for it, so a batch
+    of expensive methods is held back even when the request rate has room.
+    """
+    def __init__(self, key, requests_per_second=None, compute_units_per_second=None, shared=RATE_LIMIT_SHARED):
+        limiter = (lambda name, rate: SharedRateLimiter(f"{key}|{name}", rate)) if shared else (lambda name, rate: RateLimiter(rate))
+        self.requests = limiter('requests', requests_per_second) if requests_per_second else None
+        self.compute_units = limiter('compute_units', compute_units_per_second) if compute_units_per_second else None
+
+    @staticmethod
+    def cost(methods):
+        return sum(COMPUTE_UNITS.get(method, DEFAULT_COMPUTE_UNITS) for method in methods)
+
+    def _reserve(self, methods):
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests._reserve(len(methods)))
+        if self.compute_units is not None:
+            delay = max(delay, self.compute_units._reserve(self.cost(methods)))
+        return delay
+
+    def acquire(self, methods=('',)):
+        """Wait until the calls to `methods`, one entry per request, fit in the budget."""
+        delay = self._reserve(methods)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, methods=('',)):
+        delay = self._reserve(methods)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        for limiter in (self.requests, self.compute_units):
+            if limiter is not None:
+                limiter.pause(seconds)
+
+def set_rate_budget(key, requests_per_second=None, compute_units_per_second=None):
+    """
+    Limit calls to `key` (an endpoint URL) to the given rates and return its budget, if any.
+
+    Limits left as None keep whatever is configured; a limit that differs from the configured
+    one raises ValueError instead of being silently ignored.
+    """
+    with _budgets_lock:
+        budget = _budgets.get(key)
+        if budget is None:
+            if requests_per_second or compute_units_per_second:
+                budget = _budgets[key] = RateBudget(key, requests_per_second, compute_units_per_second)
+            return budget
+        for name, limiter, rate in (
+            ('requests', budget.requests, requests_per_second),
+            ('compute units', budget.compute_units, compute_units_per_second),
+        ):
+            configured = limiter.rate if limiter is not None else None
+            if rate and configured != float(rate):
+                raise ValueError(f"Endpoint's {name} per second limit is already {configured or 'unset'}, not {rate}")
+        return budget
+
+def get_rate_budget(key):
+    return _budgets.get(key)
+
+def _response(error):
+    # requests' Response is falsy for error statuses, so test for None explicitly
+    response = getattr(error, 'response', None)
+    return error if response is None else response
+
+def http_status(error):
+    """HTTP status of `error` (requests' HTTPError, aiohttp/httpx errors or responses), or None."""
+    response = _response(error)
+    return getattr(response, 'status_code', None) or getattr(response, 'status', None)
+
+def is_retryable(error):
+    """Whether an HTTP error is worth retrying: a 429 or a 5xx. Other 4xx fail the same way again."""
+    status = http_status(error)
+    return status == 429 or (status is not None and status >= 500)
+
+def throttled_for(error):
+    """
+    Seconds to pause all traffic to an endpoint after `error`, or None if it was not a 429.
+
+    Understands requests' HTTPError and aiohttp/httpx errors and responses, honouring Retry-After.
+    """
+    if http_status(error) != 429:
+        return None
+    response = _response(error)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            return min(float(retry_after), RATE_LIMIT_MAX_PAUSE)
+        except ValueError:
+            try:
+                return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), RATE_LIMIT_MAX_PAUSE)
+            except (TypeError, ValueError):
+                pass
+    return RATE_LIMIT_PAUSE
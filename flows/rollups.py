@@ -0,0 +1,346 @@
+from datetime import datetime, timezone
+import pandas as pd
+from apy_engine import SECONDS_PER_YEAR
+
+# Raw decoded events, one row per log, written by the event backfill
+EVENTS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS contract_events (
+        chain_id UInt64,
+        contract_address String,
+        event_name LowCardinality(String),
+        block_number UInt64,
+        block_timestamp DateTime,
+        transaction_hash String,
+        log_index UInt32,
+        args String,
+        inserted_at DateTime64(3) DEFAULT now64(3)
+    ) ENGINE = ReplacingMergeTree()
+    ORDER BY (chain_id, contract_address, block_number, log_index)
+"""
+
+# Tables created before block timestamps were recorded
+EVENTS_TIMESTAMP_COLUMN_QUERY = """
+    ALTER TABLE contract_events ADD COLUMN IF NOT EXISTS block_timestamp DateTime AFTER block_number
+"""
+
+EVENTS_COLUMNS = 'chain_id, contract_address, event_name, block_number, block_timestamp, transaction_hash, log_index, args'
+
+# Raw form snapshots, one row per (form, block) read by the APY flows
+FORM_SNAPSHOTS_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS form_snapshots (
+        chain_id UInt64,
+        form_address String,
+        vault_address String,
+        asset_address String,
+        vault_decimals UInt8,
+        block_number UInt64,
+        block_timestamp DateTime,
+        price_per_share UInt256,
+        total_assets UInt256,
+        total_supply UInt256,
+        inserted_at DateTime64(3) DEFAULT now64(3)
+    ) ENGINE = ReplacingMergeTree()
+    ORDER BY (chain_id, form_address, block_number)
+"""
+
+# Ingestion time of each raw row, filled in by ClickHouse; dbt models pick up new rows by it,
+# whatever their block time. Rows inserted before the column existed read as just inserted
+# until a merge writes the value, so the (idempotent) models re-read them until then.
+INSERTED_AT_COLUMN_QUERIES = [
+    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS inserted_at DateTime64(3) DEFAULT now64(3)"
+    for table in ('contract_events', 'form_snapshots')
+]
+
+# Rollup intervals: table suffix -> ClickHouse function that truncates a timestamp to its bucket
+ROLLUP_INTERVALS = {
+    'hourly': 'toStartOfHour',
+    'daily': 'toStartOfDay',
+}
+
+# Share price and TVL per bucket. argMin/argMax/min/max are idempotent, so a snapshot
+# inserted twice leaves the rollup unchanged.
+FORM_METRICS_ROLLUP_QUERY = """
+    CREATE TABLE IF NOT EXISTS form_metrics_{interval} (
+        chain_id UInt64,
+        form_address String,
+        period_start DateTime,
+        vault_decimals SimpleAggregateFunction(max, UInt8),
+        first_block SimpleAggregateFunction(min, UInt64),
+        last_block SimpleAggregateFunction(max, UInt64),
+        last_timestamp SimpleAggregateFunction(max, DateTime),
+        open_price_per_share AggregateFunction(argMin, UInt256, UInt64),
+        close_price_per_share AggregateFunction(argMax, UInt256, UInt64),
+        min_price_per_share SimpleAggregateFunction(min, UInt256),
+        max_price_per_share SimpleAggregateFunction(max, UInt256),
+        close_total_assets AggregateFunction(argMax, UInt256, UInt64),
+        close_total_supply AggregateFunction(argMax, UInt256, UInt64)
+    ) ENGINE = AggregatingMergeTree()
+    ORDER BY (chain_id, form_address, period_start)
+"""
+
+FORM_METRICS_ROLLUP_SELECT = """
+    SELECT
+        chain_id,
+        form_address,
+        {bucket}(block_timestamp) AS period_start,
+        max(vault_decimals) AS vault_decimals,
+        min(block_number) AS first_block,
+        max(block_number) AS last_block,
+        max(block_timestamp) AS last_timestamp,
+        argMinState(price_per_share, block_number) AS open_price_per_share,
+        argMaxState(price_per_share, block_number) AS close_price_per_share,
+        min(price_per_share) AS min_price_per_share,
+        max(price_per_share) AS max_price_per_share,
+        argMaxState(total_assets, block_number) AS close_total_assets,
+        argMaxState(total_supply, block_number) AS close_total_supply
+    FROM form_snapshots{final}
+    GROUP BY chain_id, form_address, period_start
+"""
+
+# Deposit/Withdraw volume per bucket from the ERC4626 events in contract_events
+VAULT_FLOWS_ROLLUP_QUERY = """
+    CREATE TABLE IF NOT EXISTS vault_flows_{interval} (
+        chain_id UInt64,
+        contract_address String,
+        period_start DateTime,
+        deposited_assets SimpleAggregateFunction(sum, UInt256),
+        withdrawn_assets SimpleAggregateFunction(sum, UInt256),
+        minted_shares SimpleAggregateFunction(sum, UInt256),
+        burned_shares SimpleAggregateFunction(sum, UInt256),
+        deposits SimpleAggregateFunction(sum, UInt64),
+        withdrawals SimpleAggregateFunction(sum, UInt64)
+    ) ENGINE = AggregatingMergeTree()
+    ORDER BY (chain_id, contract_address, period_start)
+"""
+
+VAULT_FLOWS_ROLLUP_SELECT = """
+    SELECT
+        chain_id,
+        contract_address,
+        {bucket}(block_timestamp) AS period_start,
+        sumIf(toUInt256(JSONExtractString(args, 'assets')), event_name = 'Deposit') AS deposited_assets,
+        sumIf(toUInt256(JSONExtractString(args, 'assets')), event_name = 'Withdraw') AS withdrawn_assets,
+        sumIf(toUInt256(JSONExtractString(args, 'shares')), event_name = 'Deposit') AS minted_shares,
+        sumIf(toUInt256(JSONExtractString(args, 'shares')), event_name = 'Withdraw') AS burned_shares,
+        countIf(event_name = 'Deposit') AS deposits,
+        countIf(event_name = 'Withdraw') AS withdrawals
+    FROM contract_events{final}
+    WHERE event_name IN ('Deposit', 'Withdraw')
+    GROUP BY chain_id, contract_address, period_start
+"""
+
+def _rollups(final=''):
+    # (target table, CREATE TABLE, SELECT feeding it)
+    for interval, bucket in ROLLUP_INTERVALS.items():
+        yield (
+            f'form_metrics_{interval}',
+            FORM_METRICS_ROLLUP_QUERY.format(interval=interval),
+            FORM_METRICS_ROLLUP_SELECT.format(bucket=bucket, final=final)
+        )
+        yield (
+            f'vault_flows_{interval}',
+            VAULT_FLOWS_ROLLUP_QUERY.format(interval=interval),
+            VAULT_FLOWS_ROLLUP_SELECT.format(bucket=bucket, final=final)
+        )
+
+def rollup_schema_queries():
+    """
+    Statements creating the raw contract_events and form_snapshots tables, every rollup table
+    and the materialized views that keep the rollups up to date as raw rows are inserted.
+
+    Applied as a schema migration (see migrations.MIGRATIONS).
+    """
+    queries = [EVENTS_TABLE_QUERY, EVENTS_TIMESTAMP_COLUMN_QUERY, FORM_SNAPSHOTS_TABLE_QUERY, *INSERTED_AT_COLUMN_QUERIES]
+    for table, create_query, select_query in _rollups():
+        queries.append(create_query)
+        queries.append(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {table}_mv TO {table} AS {select_query}")
+    return queries
+
+def rebuild_rollups(client):
+    """
+    Recompute every rollup from the raw tables.
+
+    Needed once for raw rows that predate the views, and to drop double-counted flows
+    after event chunks were re-ingested (raw tables deduplicate on merge, sums do not).
+    """
+    for table, _, select_query in _rollups(final=' FINAL'):
+        client.execute(f"TRUNCATE TABLE {table}")
+        client.execute(f"INSERT INTO {table} {select_query}")
+
+def insert_form_snapshots(client, chain_id, form_address, metrics):
+    """Insert get_form_metrics results, one per block, into form_snapshots."""
+    rows = [
+        (
+            chain_id,
+            form_address,
+            m['vault_address'],
+            m['asset_address'],
+            m['vault_decimals'],
+            m['block_number'],
+            datetime.fromtimestamp(m['block_timestamp'], timezone.utc),
+            m['price_per_share'],
+            m['total_assets'],
+            m['total_supply']
+        )
+        for m in metrics
+    ]
+    if rows:
+        client.execute(
+            """
+            INSERT INTO form_snapshots (
+                chain_id, form_address, vault_address, asset_address, vault_decimals,
+                block_number, block_timestamp, price_per_share, total_assets, total_supply
+            ) VALUES
+            """,
+            rows
+        )
+    return len(rows)
+
+def _query_dataframe(client, query, params):
+    rows, columns = client.execute(query, params, with_column_types=True)
+    return pd.DataFrame(rows, columns=[name for name, _ in columns])
+
+def get_form_metrics_rollup(client, interval, chain_id, form_addresses=None, start=None, end=None):
+    """
+    Return the finalized share price and TVL buckets for a chain's forms, oldest first.
+
+    `interval` is a ROLLUP_INTERVALS key; `start`/`end` bound period_start.
+    """
+    if interval not in ROLLUP_INTERVALS:
+        raise ValueError(f"Unknown rollup interval {interval}, expected one of {list(ROLLUP_INTERVALS)}")
+    return _query_dataframe(
+        client,
+        f"""
+        SELECT
+            chain_id,
+            form_address,
+            period_start,
+            max(vault_decimals) AS vault_decimals,
+            min(first_block) AS first_block,
+            max(last_block) AS last_block,
+            max(last_timestamp) AS last_timestamp,
+            argMinMerge(open_price_per_share) AS open_price_per_share,
+            argMaxMerge(close_price_per_share) AS close_price_per_share,
+            min(min_price_per_share) AS min_price_per_share,
+            max(max_price_per_share) AS max_price_per_share,
+            argMaxMerge(close_total_assets) AS tvl,
+            argMaxMerge(close_total_supply) AS total_supply
+        FROM form_metrics_{interval}
+        WHERE chain_id = %(chain_id)s
+          AND (empty(%(form_addresses)s) OR has(%(form_addresses)s, form_address))
+          AND period_start >= %(start)s
+          AND period_start <= %(end)s
+        GROUP BY chain_id, form_address, period_start
+        ORDER BY form_address, period_start
+        """,
+        {
+            'chain_id': chain_id,
+            'form_addresses': list(form_addresses or []),
+            'start': start or datetime(1970, 1, 1, tzinfo=timezone.utc),
+            'end': end or datetime(2106, 1, 1, tzinfo=timezone.utc),
+        }
+    )
+
+def get_vault_flows(client, interval, chain_id, contract_addresses=None, start=None, end=None):
+    """Return deposit, withdrawal and net asset flows per bucket for a chain's vaults, oldest first."""
+    if interval not in ROLLUP_INTERVALS:
+        raise ValueError(f"Unknown rollup interval {interval}, expected one of {list(ROLLUP_INTERVALS)}")
+    return _query_dataframe(
+        client,
+        f"""
+        SELECT
+            chain_id,
+            contract_address,
+            period_start,
+            sum(deposited_assets) AS deposited_assets,
+            sum(withdrawn_assets) AS withdrawn_assets,
+            toInt256(deposited_assets) - toInt256(withdrawn_assets) AS net_assets,
+            sum(minted_shares) AS minted_shares,
+            sum(burned_shares) AS burned_shares,
+            sum(deposits) AS deposits,
+            sum(withdrawals) AS withdrawals
+        FROM vault_flows_{interval}
+        WHERE chain_id = %(chain_id)s
+          AND (empty(%(contract_addresses)s) OR has(%(contract_addresses)s, contract_address))
+          AND period_start >= %(start)s
+          AND period_start <= %(end)s
+        GROUP BY chain_id, contract_address, period_start
+        ORDER BY contract_address, period_start
+        """,
+        {
+            'chain_id': chain_id,
+            'contract_addresses': list(contract_addresses or []),
+            'start': start or datetime(1970, 1, 1, tzinfo=timezone.utc),
+            'end': end or datetime(2106, 1, 1, tzinfo=timezone.utc),
+        }
+    )
+
+def get_form_apy(client, interval, chain_id, form_addresses=None, start=None, end=None, compound=True):
+    """
+    Return the APY between consecutive buckets for a chain's forms, computed in ClickHouse.
+
+    The period return is taken from the native UInt256 close prices as an exact Int256
+    difference divided into a Decimal256 ratio, so only the annualization runs in float,
+    through expm1/log1p as in `apy_engine` so tiny returns don't cancel out.
+    """
+    if interval not in ROLLUP_INTERVALS:
+        raise ValueError(f"Unknown rollup interval {interval}, expected one of {list(ROLLUP_INTERVALS)}")
+    annualize = (
+        "expm1(log1p(period_return) * %(seconds_per_year)s / seconds_elapsed) * 100"
+        if compound else
+        "period_return * %(seconds_per_year)s / seconds_elapsed * 100"
+    )
+    return _query_dataframe(
+        client,
+        f"""
+        SELECT
+            chain_id,
+            form_address,
+            period_start,
+            close_price_per_share,
+            previous_price_per_share,
+            tvl,
+            toFloat64(
+                toDecimal256(toInt256(close_price_per_share) - toInt256(previous_price_per_share), 18)
+                / toDecimal256(previous_price_per_share, 0)
+            ) AS period_return,
+            toUnixTimestamp(last_timestamp) - toUnixTimestamp(previous_timestamp) AS seconds_elapsed,
+            {annualize} AS apy
+        FROM (
+            SELECT
+                chain_id,
+                form_address,
+                period_start,
+                close_price_per_share,
+                tvl,
+                last_timestamp,
+                lagInFrame(close_price_per_share) OVER form_buckets AS previous_price_per_share,
+                lagInFrame(last_timestamp) OVER form_buckets AS previous_timestamp
+            FROM (
+                SELECT
+                    chain_id,
+                    form_address,
+                    period_start,
+                    max(last_timestamp) AS last_timestamp,
+                    argMaxMerge(close_price_per_share) AS close_price_per_share,
+                    argMaxMerge(close_total_assets) AS tvl
+                FROM form_metrics_{interval}
+                WHERE chain_id = %(chain_id)s
+                  AND (empty(%(form_addresses)s) OR has(%(form_addresses)s, form_address))
+                  AND period_start <= %(end)s
+                GROUP BY chain_id, form_address, period_start
+            )
+            WINDOW form_buckets AS (PARTITION BY form_address ORDER BY period_start)
+        )
+        WHERE previous_price_per_share > 0
+          AND period_start >= %(start)s
+        ORDER BY form_address, period_start
+        """,
+        {
+            'chain_id': chain_id,
+            'form_addresses': list(form_addresses or []),
+            'start': start or datetime(1970, 1, 1, tzinfo=timezone.utc),
+            'end': end or datetime(2106, 1, 1, tzinfo=timezone.utc),
+            'seconds_per_year': SECONDS_PER_YEAR,
+        }
+    )
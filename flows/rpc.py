@@ -0,0 +1,288 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from web3 import Web3, AsyncWeb3
+from web3.middleware import ExtraDataToPOAMiddleware, Web3Middleware
+from web3.providers.rpc.utils import ExceptionRetryConfiguration, check_if_retry_on_failure
+from call_cache import EthCallCacheMiddleware
+from chains import cached_chain_id, cache_chain_id
+from rate_limit import set_rate_budget, get_rate_budget, throttled_for, is_retryable
+from rpc_metrics import RpcMetricsMiddleware, record_batch, endpoint_label
+from rpc_router import RPCRouter, AsyncRPCRouter
+
+load_dotenv(".env")
+
+logger = logging.getLogger(__name__)
+
+# Global configuration; RPC_URL may list several endpoints, comma separated
+DEFAULT_RPC = os.getenv('RPC_URL', 'https://eth.llamarpc.com')
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', 20))
+RPC_MAX_BATCH_SIZE = int(os.getenv('RPC_MAX_BATCH_SIZE', 100))
+RPC_TIMEOUT = int(os.getenv('RPC_TIMEOUT', 30))
+RPC_MAX_RETRIES = int(os.getenv('RPC_MAX_RETRIES', 5))
+RPC_RETRY_BACKOFF = 0.125  # seconds, doubled per retry, as web3 does
+
+_lock = threading.Lock()
+_web3_instances = {}
+_async_web3_instances = {}
+_max_batch_sizes = {}
+_pool_sizes = {}
+
+# web3 retries only transport errors itself; HTTP errors come back here, so that retries of
+# 429s and 5xx responses go through the rate budget instead of around it. Other 4xx responses
+# (bad request, unauthorized, payload too large) are raised at once.
+SYNC_RETRY_CONFIGURATION = ExceptionRetryConfiguration(errors=(requests.ConnectionError, requests.Timeout))
+ASYNC_RETRY_CONFIGURATION = ExceptionRetryConfiguration(errors=(aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+def _retry_delay(budget, error, attempt):
+    pause = throttled_for(error)
+    if pause is None:
+        return RPC_RETRY_BACKOFF * 2 ** attempt
+    logger.warning(f"Rate limited by the RPC endpoint, pausing requests for {pause:.1f}s")
+    if budget is None:
+        return pause
+    # One 429 holds back every thread and process sharing the budget, instead of each retrying into it;
+    # the next acquire waits the pause out
+    budget.pause(pause)
+    return 0.0
+
+class ChainIdMiddleware(Web3Middleware):
+    """
+    Answers eth_chainId from the chain ID resolved once per endpoint (chains.get_chain_id).
+
+    web3 validates every eth_call against the chain ID, and its provider request cache is per
+    thread, so without this each task runner worker would ask the endpoint again.
+    """
+    def __init__(self, w3):
+        super().__init__(w3)
+        # Concurrent first calls resolve the chain ID once, instead of each asking for it
+        self.lock = threading.Lock()
+        self.async_lock = asyncio.Lock()
+
+    def _cached(self):
+        chain_id = cached_chain_id(self._w3)
+        return {'jsonrpc': '2.0', 'id': 0, 'result': hex(chain_id)} if chain_id is not None else None
+
+    def _remember(self, response):
+        if 'result' in response:
+            cache_chain_id(self._w3, int(response['result'], 16))
+        return response
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method != 'eth_chainId':
+                return make_request(method, params)
+            with self.lock:
+                return self._cached() or self._remember(make_request(method, params))
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            if method != 'eth_chainId':
+                return await make_request(method, params)
+            async with self.async_lock:
+                return self._cached() or self._remember(await make_request(method, params))
+        return middleware
+
+class RateLimitMiddleware(Web3Middleware):
+    """
+    Holds every request to the endpoint's rate budget, if one was configured for it, and
+    retries idempotent requests answered with an HTTP error, after a 429 pausing the budget.
+
+    Routers retry and fail over per endpoint themselves, so their requests pass straight through.
+    """
+    def _budget(self):
+        return get_rate_budget(str(self._w3.provider.endpoint_uri))
+
+    def _retries(self, method):
+        if isinstance(self._w3.provider, (RPCRouter, AsyncRPCRouter)) or not check_if_retry_on_failure(method):
+            return 0
+        return RPC_MAX_RETRIES
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            budget = self._budget()
+            retries = self._retries(method)
+            for attempt in range(retries + 1):
+                if budget is not None:
+                    budget.acquire([method])
+                try:
+                    return make_request(method, params)
+                except requests.HTTPError as e:
+                    if attempt == retries or not is_retryable(e):
+                        raise
+                    time.sleep(_retry_delay(budget, e, attempt))
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            budget = self._budget()
+            retries = self._retries(method)
+            for attempt in range(retries + 1):
+                if budget is not None:
+                    await budget.acquire_async([method])
+                try:
+                    return await make_request(method, params)
+                except aiohttp.ClientResponseError as e:
+                    if attempt == retries or not is_retryable(e):
+                        raise
+                    await asyncio.sleep(_retry_delay(budget, e, attempt))
+        return middleware
+
+def create_session(pool_size=RPC_POOL_SIZE):
+    """Create a requests session whose keep-alive pool can serve `pool_size` concurrent requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def set_rate_limit(rpc, max_requests_per_second=None, max_compute_units_per_second=None):
+    """
+    Limit every Web3 instance and batch sent to `rpc`, in this and every other process
+    sharing the rate limit store, to the given requests and compute units per second.
+    """
+    set_rate_budget(rpc, max_requests_per_second, max_compute_units_per_second)
+
+def _check_setting(rpc, name, configured, requested):
+    # Instances are shared per endpoint, so a caller asking for other settings would silently not get them
+    if requested is not None and requested != configured:
+        endpoints = ','.join(endpoint_label(endpoint) for endpoint in rpc_endpoints(rpc))
+        raise ValueError(f"Web3 for {endpoints} was already created with {name}={configured}, not {requested}")
+
+def rpc_endpoints(rpc):
+    """Return the endpoint URLs in `rpc`: a list, or a comma-separated string such as RPC_URL."""
+    if isinstance(rpc, str):
+        return [url.strip() for url in rpc.split(',') if url.strip()]
+    return list(rpc)
+
+def get_web3(rpc=DEFAULT_RPC, pool_size=None, max_batch_size=None, max_requests_per_second=None, max_compute_units_per_second=None):
+    """
+    Return the process-wide Web3 instance for `rpc`, one endpoint or several.
+
+    The first call for an endpoint builds it on a pooled keep-alive session; every later call,
+    from any thread or task, reuses the same connections. Later calls may leave the settings
+    as None, but raise ValueError if they ask for different ones. Each endpoint has its own
+    rate budget, so a slow or strict provider never throttles the others. Several endpoints
+    are served by an RPCRouter, which routes, hedges and fails over between them.
+    """
+    endpoints = rpc_endpoints(rpc)
+    rpc = ','.join(endpoints)
+    with _lock:
+        w3 = _web3_instances.get(rpc)
+        if w3 is None:
+            session = create_session(pool_size or RPC_POOL_SIZE)
+            if len(endpoints) > 1:
+                provider = RPCRouter(
+                    endpoints,
+                    session=session,
+                    timeout=RPC_TIMEOUT,
+                    pool_size=pool_size or RPC_POOL_SIZE
+                )
+            else:
+                provider = Web3.HTTPProvider(
+                    rpc,
+                    request_kwargs={'timeout': RPC_TIMEOUT},
+                    session=session,
+                    exception_retry_configuration=SYNC_RETRY_CONFIGURATION
+                )
+            w3 = Web3(provider)
+            w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+            # Inside the cache and rate limit, so only time spent on the wire is measured
+            w3.middleware_onion.inject(RpcMetricsMiddleware, name='rpc_metrics', layer=0)
+            w3.middleware_onion.inject(RateLimitMiddleware, name='rate_limit', layer=0)
+            # Outermost, so cache hits skip the rest of the middleware stack
+            w3.middleware_onion.inject(EthCallCacheMiddleware, name='eth_call_cache', layer=0)
+            w3.middleware_onion.inject(ChainIdMiddleware, name='chain_id', layer=0)
+            _web3_instances[rpc] = w3
+            _max_batch_sizes[rpc] = max_batch_size or RPC_MAX_BATCH_SIZE
+            _pool_sizes[rpc] = pool_size or RPC_POOL_SIZE
+            logger.info(f"Created pooled Web3 provider for {rpc}")
+        _check_setting(rpc, 'pool_size', _pool_sizes[rpc], pool_size)
+        _check_setting(rpc, 'max_batch_size', _max_batch_sizes[rpc], max_batch_size)
+        for endpoint in endpoints:
+            set_rate_limit(endpoint, max_requests_per_second, max_compute_units_per_second)
+        return w3
+
+def get_async_web3(rpc=DEFAULT_RPC, max_requests_per_second=None, max_compute_units_per_second=None):
+    """Return the process-wide AsyncWeb3 instance for `rpc`, so concurrent coroutines share its aiohttp connections."""
+    endpoints = rpc_endpoints(rpc)
+    rpc = ','.join(endpoints)
+    with _lock:
+        w3 = _async_web3_instances.get(rpc)
+        if w3 is None:
+            if len(endpoints) > 1:
+                provider = AsyncRPCRouter(
+                    endpoints,
+                    timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT)
+                )
+            else:
+                provider = AsyncWeb3.AsyncHTTPProvider(
+                    rpc,
+                    request_kwargs={'timeout': aiohttp.ClientTimeout(total=RPC_TIMEOUT)},
+                    exception_retry_configuration=ASYNC_RETRY_CONFIGURATION
+                )
+            w3 = AsyncWeb3(provider)
+            w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+            w3.middleware_onion.inject(RpcMetricsMiddleware, name='rpc_metrics', layer=0)
+            w3.middleware_onion.inject(RateLimitMiddleware, name='rate_limit', layer=0)
+            w3.middleware_onion.inject(EthCallCacheMiddleware, name='eth_call_cache', layer=0)
+            w3.middleware_onion.inject(ChainIdMiddleware, name='chain_id', layer=0)
+            _async_web3_instances[rpc] = w3
+            logger.info(f"Created async Web3 provider for {rpc}")
+        for endpoint in endpoints:
+            set_rate_limit(endpoint, max_requests_per_second, max_compute_units_per_second)
+        return w3
+
+def batch_request(w3, rpc_requests, max_batch_size=None, allow_failure=False):
+    """
+    Send (method, params) pairs as JSON-RPC batch arrays, `max_batch_size` requests per HTTP POST.
+
+    Returns the raw `result` of every request in order. Failed requests raise unless
+    `allow_failure` is set, in which case their result is None.
+    """
+    endpoint = str(w3.provider.endpoint_uri)
+    max_batch_size = max_batch_size or _max_batch_sizes.get(endpoint, RPC_MAX_BATCH_SIZE)
+
+    budget = get_rate_budget(endpoint)
+    # Routers hold each endpoint to its own budget, retry per endpoint and record metrics per endpoint
+    records_metrics = getattr(w3.provider, 'records_metrics', False)
+    retries = 0 if isinstance(w3.provider, RPCRouter) else RPC_MAX_RETRIES
+
+    results = []
+    for i in range(0, len(rpc_requests), max_batch_size):
+        batch = rpc_requests[i:i + max_batch_size]
+        for attempt in range(retries + 1):
+            # Providers meter every entry of a batch as a request, with its own compute units
+            if budget is not None:
+                budget.acquire([method for method, _ in batch])
+            started = time.perf_counter()
+            try:
+                responses = w3.provider.make_batch_request(batch)
+                break
+            except requests.HTTPError as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                time.sleep(_retry_delay(budget, e, attempt))
+        if not records_metrics:
+            record_batch(endpoint, batch, responses, time.perf_counter() - started)
+
+        # The whole batch was rejected, e.g. the endpoint does not support batching
+        if not isinstance(responses, list):
+            raise ValueError(f"Batch request failed: {responses.get('error')}")
+
+        for (method, _), response in zip(batch, responses):
+            if 'error' in response:
+                if not allow_failure:
+                    raise ValueError(f"{method} failed: {response['error']}")
+                logger.warning(f"Batch request {method} failed: {response['error']}")
+                results.append(None)
+            else:
+                results.append(response['result'])
+    return results
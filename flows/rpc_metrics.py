@@ -0,0 +1,234 @@
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from urllib.parse import urlsplit
+from web3.middleware import Web3Middleware
+from prefect.artifacts import create_table_artifact
+from abi_registry import get_abi_registry
+from clickhouse import get_clickhouse_pool
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets in milliseconds, plus one unbounded bucket
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+# Methods whose first parameter is a transaction whose selector names the contract function
+CALL_METHODS = {'eth_call', 'eth_estimateGas'}
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def endpoint_label(endpoint_uri):
+    # Scheme and host only: provider URLs often carry API keys in the path or query
+    parts = urlsplit(str(endpoint_uri))
+    return f"{parts.scheme}://{parts.netloc.rsplit('@', 1)[-1]}"
+
+def _payload_bytes(payload):
+    return len(json.dumps(payload, separators=(',', ':'), default=str))
+
+class MethodStats:
+    __slots__ = ('calls', 'errors', 'request_bytes', 'response_bytes', 'latency_sum_ms', 'latency_max_ms', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def percentile(self, q):
+        """Upper bound of the histogram bucket holding the q-th quantile, in milliseconds."""
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.latency_max_ms)
+        return self.latency_max_ms
+
+class RpcMetrics:
+    """
+    Thread-safe count, latency histogram, payload bytes and errors per
+    (endpoint, JSON-RPC method, contract function).
+
+    The function is the ABI signature behind an eth_call selector, or the raw selector
+    when no ABI in `abi/` defines it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.signatures = None
+
+    def function_name(self, method, params):
+        if method not in CALL_METHODS or not params or not isinstance(params[0], dict):
+            return ''
+        data = params[0].get('data') or params[0].get('input') or ''
+        selector = data[:10] if isinstance(data, str) else '0x' + bytes(data[:4]).hex()
+        if self.signatures is None:
+            self.signatures = get_abi_registry().function_signatures()
+        return self.signatures.get(selector, selector)
+
+    def record(self, endpoint, method, params, response, latency_seconds):
+        """Record one request; `response` is the raw JSON-RPC response, or None if the request raised."""
+        key = (endpoint_label(endpoint), method, self.function_name(method, params))
+        latency_ms = latency_seconds * 1000
+        request_bytes = _payload_bytes(params)
+        response_bytes = _payload_bytes(response) if response is not None else 0
+        failed = response is None or 'error' in response
+
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = MethodStats()
+            stats.calls += 1
+            stats.errors += failed
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.latency_sum_ms += latency_ms
+            stats.latency_max_ms = max(stats.latency_max_ms, latency_ms)
+            stats.buckets[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def rows(self, reset=False):
+        """Return one dict per (endpoint, method, function), busiest first."""
+        with self.lock:
+            stats = self.stats
+            if reset:
+                self.stats = {}
+        rows = [
+            {
+                'endpoint': endpoint,
+                'method': method,
+                'function': function,
+                'calls': s.calls,
+                'errors': s.errors,
+                'request_bytes': s.request_bytes,
+                'response_bytes': s.response_bytes,
+                'latency_sum_ms': s.latency_sum_ms,
+                'latency_max_ms': s.latency_max_ms,
+                'p50_ms': s.percentile(0.5),
+                'p99_ms': s.percentile(0.99),
+                'latency_buckets': list(s.buckets),
+            }
+            for (endpoint, method, function), s in stats.items()
+        ]
+        return sorted(rows, key=lambda row: -row['calls'])
+
+def get_rpc_metrics():
+    """Return the process-wide RPC metrics, shared by every Web3 instance and batch request."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = RpcMetrics()
+        return _metrics
+
+def record_batch(endpoint, batch, responses, latency_seconds):
+    """Record every entry of a batch; `responses` is the raw batch response, or None if it raised."""
+    metrics = get_rpc_metrics()
+    if not isinstance(responses, list):
+        # The whole batch was rejected, e.g. the endpoint does not support batching
+        responses = [None] * len(batch)
+    # Every entry waited for the whole batch
+    for (method, params), response in zip(batch, responses):
+        metrics.record(endpoint, method, params, response, latency_seconds)
+
+class RpcMetricsMiddleware(Web3Middleware):
+    """
+    Records every request that reaches the provider, so cache hits and rate-limit waits are excluded.
+
+    Providers spreading requests over several endpoints (rpc_router) record per endpoint themselves.
+    """
+    def _metered(self):
+        return not getattr(self._w3.provider, 'records_metrics', False)
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if not self._metered():
+                return make_request(method, params)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = make_request(method, params)
+                return response
+            finally:
+                get_rpc_metrics().record(self._w3.provider.endpoint_uri, method, params, response, time.perf_counter() - started)
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            if not self._metered():
+                return await make_request(method, params)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await make_request(method, params)
+                return response
+            finally:
+                get_rpc_metrics().record(self._w3.provider.endpoint_uri, method, params, response, time.perf_counter() - started)
+        return middleware
+
+def insert_rpc_metrics(client, rows, flow_run_id='', flow_name=''):
+    recorded_at = datetime.now()
+    client.execute(
+        """
+        INSERT INTO rpc_metrics (
+            flow_run_id, flow_name, recorded_at, endpoint, method, function, calls, errors,
+            request_bytes, response_bytes, latency_sum_ms, latency_max_ms, p50_ms, p99_ms, latency_buckets
+        ) VALUES
+        """,
+        [
+            (
+                flow_run_id, flow_name, recorded_at, row['endpoint'], row['method'], row['function'],
+                row['calls'], row['errors'], row['request_bytes'], row['response_bytes'],
+                row['latency_sum_ms'], row['latency_max_ms'], row['p50_ms'], row['p99_ms'], row['latency_buckets']
+            )
+            for row in rows
+        ]
+    )
+    return len(rows)
+
+def publish_rpc_metrics(flow, flow_run, state):
+    """
+    Flow hook: publish the RPC metrics recorded since the last publish as a table artifact
+    on the flow run and append them to rpc_metrics.
+
+    Attach with on_completion/on_failure, so slow or failing runs are recorded too.
+    """
+    rows = get_rpc_metrics().rows(reset=True)
+    if not rows:
+        return
+
+    try:
+        create_table_artifact(
+            key='rpc-metrics',
+            table=[
+                {
+                    'endpoint': row['endpoint'],
+                    'method': row['method'],
+                    'function': row['function'],
+                    'calls': row['calls'],
+                    'error_rate': round(row['errors'] / row['calls'], 4),
+                    'mean_ms': round(row['latency_sum_ms'] / row['calls'], 1),
+                    'p50_ms': round(row['p50_ms'], 1),
+                    'p99_ms': round(row['p99_ms'], 1),
+                    'request_kb': round(row['request_bytes'] / 1024, 1),
+                    'response_kb': round(row['response_bytes'] / 1024, 1),
+                }
+                for row in rows
+            ],
+            description=f"RPC calls of flow run {flow_run.name} ({state.name})"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish RPC metrics artifact: {str(e)}")
+
+    try:
+        # Imported here: the migrations carry the rollup schema, whose modules import rpc, which imports this one
+        from migrations import apply_migrations
+        with get_clickhouse_pool().connection() as client:
+            apply_migrations(client)
+            insert_rpc_metrics(client, rows, str(flow_run.id), flow.name)
+    except Exception as e:
+        logger.warning(f"Failed to write RPC metrics to ClickHouse: {str(e)}")
@@ -0,0 +1,386 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from web3 import Web3, AsyncWeb3
+from web3._utils.caching import handle_request_caching, async_handle_request_caching
+from web3.providers import JSONBaseProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
+from rpc_metrics import get_rpc_metrics, record_batch
+from rate_limit import get_rate_budget, throttled_for
+
+load_dotenv(".env")
+
+logger = logging.getLogger(__name__)
+
+# Global configuration
+RPC_HEDGE_QUANTILE = float(os.getenv('RPC_HEDGE_QUANTILE', 0.95))
+# Hedge delay until an endpoint has enough samples for a quantile, and the floor after that
+RPC_HEDGE_DEFAULT_DELAY = float(os.getenv('RPC_HEDGE_DEFAULT_DELAY', 1.0))
+RPC_HEDGE_MIN_DELAY = float(os.getenv('RPC_HEDGE_MIN_DELAY', 0.05))
+# Most hedged duplicates per routed read, so a slow spell cannot double the load on the endpoints
+RPC_HEDGE_BUDGET = float(os.getenv('RPC_HEDGE_BUDGET', 0.1))
+RPC_ROUTER_RETRIES = int(os.getenv('RPC_ROUTER_RETRIES', 2))
+RPC_MAX_COOLDOWN = float(os.getenv('RPC_MAX_COOLDOWN', 30))
+# Endpoints idle this long get a request again, so one that recovered can win back traffic
+RPC_PROBE_INTERVAL = float(os.getenv('RPC_PROBE_INTERVAL', 30))
+
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+EWMA_WEIGHT = 0.2
+# An endpoint failing every request ranks as if it were this many times slower
+ERROR_PENALTY = 10
+# Limit exceeded and internal error: the endpoint, not the request, is at fault
+RETRYABLE_ERROR_CODES = {-32005, -32603}
+# Stateless reads that any endpoint answers the same way, so they can be duplicated or moved.
+# Filters live on one node and transactions must not be sent twice, so they stay on the best endpoint.
+IDEMPOTENT_METHODS = {
+    'web3_clientVersion', 'net_version', 'eth_chainId', 'eth_blockNumber', 'eth_gasPrice',
+    'eth_maxPriorityFeePerGas', 'eth_feeHistory', 'eth_getBalance', 'eth_getCode', 'eth_getStorageAt',
+    'eth_getTransactionCount', 'eth_getBlockByNumber', 'eth_getBlockByHash', 'eth_getTransactionByHash',
+    'eth_getTransactionReceipt', 'eth_getLogs', 'eth_call', 'eth_estimateGas', 'eth_createAccessList',
+}
+
+def _failed(response, batch=False):
+    # None means the request raised; a batch answered with a single object was rejected whole
+    if response is None:
+        return True
+    if batch:
+        return not isinstance(response, list)
+    error = response.get('error')
+    return isinstance(error, dict) and error.get('code') in RETRYABLE_ERROR_CODES
+
+def _methods(method, batch):
+    return [entry_method for entry_method, _ in batch] if batch is not None else [method]
+
+def _pause_if_throttled(budget, error):
+    pause = throttled_for(error)
+    if budget is not None and pause is not None:
+        budget.pause(pause)
+
+def _record_metrics(endpoint, method, params, batch, response, elapsed):
+    if batch is not None:
+        record_batch(endpoint, batch, response, elapsed)
+    else:
+        get_rpc_metrics().record(endpoint, method, params, response, elapsed)
+
+class EndpointHealth:
+    """Recent latency and error record of one endpoint."""
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.median = None
+        self.tail = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.probe_claimed_at = None
+
+    def record(self, latency, failed, batch=False):
+        now = time.monotonic()
+        self.last_used = now
+        self.probe_claimed_at = None
+        if failed:
+            self.error_ewma += EWMA_WEIGHT * (1 - self.error_ewma)
+            self.consecutive_failures += 1
+            # Back off 1s, 2s, 4s... so a dead endpoint is only probed now and then
+            self.cooldown_until = now + min(RPC_MAX_COOLDOWN, 2 ** (self.consecutive_failures - 1))
+            return
+        self.error_ewma -= EWMA_WEIGHT * self.error_ewma
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        # A batch takes as long as its slowest entry, so it says little about single requests
+        if not batch:
+            self.latencies.append(latency)
+            latencies = sorted(self.latencies)
+            self.median = latencies[len(latencies) // 2]
+            self.tail = latencies[min(len(latencies) - 1, int(RPC_HEDGE_QUANTILE * len(latencies)))]
+
+    def needs_probe(self, now):
+        return self.median is None or now - self.last_used > RPC_PROBE_INTERVAL
+
+    def probing(self, now):
+        # A claim outlives its request only if that never got recorded, so let it lapse
+        return self.probe_claimed_at is not None and now - self.probe_claimed_at < RPC_PROBE_INTERVAL
+
+    def score(self, now):
+        # Unmeasured endpoints, and those unused for a while, score 0 so they are (re)measured,
+        # but by one request at a time: while a probe is in flight they rank on their record,
+        # behind every measured endpoint if they have none. The median ignores the slow tail,
+        # which hedging covers.
+        if self.needs_probe(now) and not self.probing(now):
+            return 0.0
+        if self.median is None:
+            return math.inf
+        return self.median * (1 + ERROR_PENALTY * self.error_ewma)
+
+    def hedge_delay(self):
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return RPC_HEDGE_DEFAULT_DELAY
+        return max(RPC_HEDGE_MIN_DELAY, self.tail)
+
+class EndpointScoreboard:
+    """Thread-safe health of a set of endpoints, ranked best first."""
+    def __init__(self, endpoints):
+        self.lock = threading.Lock()
+        self.health = {endpoint: EndpointHealth(endpoint) for endpoint in endpoints}
+        self.reads = 0
+        self.hedges = 0
+
+    def count_read(self):
+        with self.lock:
+            self.reads += 1
+            # Decay, so the budget follows recent traffic rather than the whole run
+            if self.reads >= 1000:
+                self.reads //= 2
+                self.hedges //= 2
+
+    def take_hedge(self):
+        with self.lock:
+            if self.hedges + 1 > RPC_HEDGE_BUDGET * self.reads + 1:
+                return False
+            self.hedges += 1
+            return True
+
+    def ranked(self):
+        now = time.monotonic()
+        with self.lock:
+            # Endpoints cooling down after failures go last, but stay available as a last resort
+            ranked = sorted(self.health.values(), key=lambda health: (health.cooldown_until > now, health.score(now)))
+            # The caller sends its request to the first endpoint, so that is the probe
+            if ranked[0].needs_probe(now) and not ranked[0].probing(now):
+                ranked[0].probe_claimed_at = now
+            return [health.endpoint for health in ranked]
+
+    def hedge_delay(self, endpoint):
+        with self.lock:
+            return self.health[endpoint].hedge_delay()
+
+    def record(self, endpoint, latency, failed, batch=False):
+        with self.lock:
+            self.health[endpoint].record(latency, failed, batch)
+
+    def summary(self):
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    'endpoint': health.endpoint,
+                    'median_ms': round((health.median or 0.0) * 1000, 1),
+                    'hedge_delay_ms': round(health.hedge_delay() * 1000, 1),
+                    'error_ewma': round(health.error_ewma, 3),
+                    'cooling_down': health.cooldown_until > now,
+                }
+                for health in self.health.values()
+            ]
+
+class RPCRouter(JSONBaseProvider):
+    """
+    Provider spreading requests over several endpoints of the same chain.
+
+    Each request goes to the endpoint with the best recent latency and error record. A read
+    still unanswered after that endpoint's p95 latency is duplicated to the next best endpoint,
+    and whichever answers first wins, within a budget of RPC_HEDGE_BUDGET duplicates per read.
+    Reads failing on one endpoint (connection errors, HTTP errors, rate limiting) move on to the
+    next; when all of them fail, the round is retried up to RPC_ROUTER_RETRIES times. Requests
+    and batches are held to each endpoint's own rate budget, and a 429 pauses only that endpoint.
+
+    The router records RPC metrics per endpoint itself, so rpc_metrics sees the real endpoints.
+    """
+    records_metrics = True
+
+    def __init__(self, endpoints, session=None, timeout=30, pool_size=20, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoints = list(endpoints)
+        self.endpoint_uri = ','.join(self.endpoints)
+        self.scoreboard = EndpointScoreboard(self.endpoints)
+        self.providers = {
+            endpoint: Web3.HTTPProvider(
+                endpoint,
+                request_kwargs={'timeout': timeout},
+                session=session,
+                # The router fails over instead of retrying the same endpoint
+                exception_retry_configuration=None
+            )
+            for endpoint in self.endpoints
+        }
+        # Room for a primary and a hedge per pooled connection
+        self.executor = ThreadPoolExecutor(max_workers=2 * pool_size, thread_name_prefix='rpc-router')
+
+    def __str__(self):
+        return f"RPC router over {len(self.endpoints)} endpoints"
+
+    def _attempt(self, endpoint, method, params, batch=None):
+        budget = get_rate_budget(endpoint)
+        if budget is not None:
+            budget.acquire(_methods(method, batch))
+        provider = self.providers[endpoint]
+        started = time.perf_counter()
+        response = None
+        try:
+            if batch is not None:
+                response = provider.make_batch_request(batch)
+            else:
+                response = provider.make_request(method, params)
+            return response
+        except Exception as e:
+            _pause_if_throttled(budget, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.scoreboard.record(endpoint, elapsed, _failed(response, batch is not None), batch is not None)
+            _record_metrics(endpoint, method, params, batch, response, elapsed)
+
+    def _route(self, method, params, batch=None):
+        if batch is None and method not in IDEMPOTENT_METHODS:
+            return self._attempt(self.scoreboard.ranked()[0], method, params)
+
+        last_response, last_error = None, None
+        for round_ in range(RPC_ROUTER_RETRIES + 1):
+            if round_:
+                time.sleep(0.25 * 2 ** (round_ - 1))
+            ranked = self.scoreboard.ranked()
+            # Batches are metered per entry, so they fail over but are never duplicated
+            hedge_at = None
+            if batch is None:
+                self.scoreboard.count_read()
+                hedge_at = time.monotonic() + self.scoreboard.hedge_delay(ranked[0])
+            pending = {self.executor.submit(self._attempt, ranked[0], method, params, batch)}
+            untried = ranked[1:]
+            while pending:
+                timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None and untried else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    if self.scoreboard.take_hedge():
+                        pending.add(self.executor.submit(self._attempt, untried.pop(0), method, params, batch))
+                    continue
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if not _failed(response, batch is not None):
+                        return response
+                    last_response = response
+                # Everything in flight failed: fail over to the next endpoint
+                if not pending and untried:
+                    pending.add(self.executor.submit(self._attempt, untried.pop(0), method, params, batch))
+            logger.warning(f"{method or 'Batch request'} failed on every endpoint (round {round_ + 1})")
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    @handle_request_caching
+    def make_request(self, method, params):
+        return self._route(method, params)
+
+    def make_batch_request(self, batch_requests):
+        return self._route(None, None, list(batch_requests))
+
+class AsyncRPCRouter(AsyncJSONBaseProvider):
+    """Asyncio counterpart of RPCRouter, hedging and failing over with tasks instead of threads."""
+    records_metrics = True
+
+    def __init__(self, endpoints, timeout=30, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoints = list(endpoints)
+        self.endpoint_uri = ','.join(self.endpoints)
+        self.scoreboard = EndpointScoreboard(self.endpoints)
+        self.providers = {
+            endpoint: AsyncWeb3.AsyncHTTPProvider(
+                endpoint,
+                request_kwargs={'timeout': timeout},
+                exception_retry_configuration=None
+            )
+            for endpoint in self.endpoints
+        }
+
+    def __str__(self):
+        return f"Async RPC router over {len(self.endpoints)} endpoints"
+
+    async def _attempt(self, endpoint, method, params, batch=None):
+        budget = get_rate_budget(endpoint)
+        if budget is not None:
+            await budget.acquire_async(_methods(method, batch))
+        provider = self.providers[endpoint]
+        started = time.perf_counter()
+        response = None
+        cancelled = False
+        try:
+            if batch is not None:
+                response = await provider.make_batch_request(batch)
+            else:
+                response = await provider.make_request(method, params)
+            return response
+        except asyncio.CancelledError:
+            # Lost to a hedge: it was at least this slow, but did not fail
+            cancelled = True
+            raise
+        except Exception as e:
+            _pause_if_throttled(budget, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.scoreboard.record(endpoint, elapsed, not cancelled and _failed(response, batch is not None), batch is not None)
+            if not cancelled:
+                _record_metrics(endpoint, method, params, batch, response, elapsed)
+
+    async def _route(self, method, params, batch=None):
+        if batch is None and method not in IDEMPOTENT_METHODS:
+            return await self._attempt(self.scoreboard.ranked()[0], method, params)
+
+        last_response, last_error = None, None
+        for round_ in range(RPC_ROUTER_RETRIES + 1):
+            if round_:
+                await asyncio.sleep(0.25 * 2 ** (round_ - 1))
+            ranked = self.scoreboard.ranked()
+            loop = asyncio.get_running_loop()
+            hedge_at = None
+            if batch is None:
+                self.scoreboard.count_read()
+                hedge_at = loop.time() + self.scoreboard.hedge_delay(ranked[0])
+            pending = {asyncio.ensure_future(self._attempt(ranked[0], method, params, batch))}
+            untried = ranked[1:]
+            try:
+                while pending:
+                    timeout = max(0.0, hedge_at - loop.time()) if hedge_at is not None and untried else None
+                    done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        hedge_at = None
+                        if self.scoreboard.take_hedge():
+                            pending.add(asyncio.ensure_future(self._attempt(untried.pop(0), method, params, batch)))
+                        continue
+                    for task in done:
+                        try:
+                            response = task.result()
+                        except Exception as e:
+                            last_error = e
+                            continue
+                        if not _failed(response, batch is not None):
+                            return response
+                        last_response = response
+                    if not pending and untried:
+                        pending.add(asyncio.ensure_future(self._attempt(untried.pop(0), method, params, batch)))
+            finally:
+                # The losing duplicate is not needed any more
+                for task in pending:
+                    task.cancel()
+            logger.warning(f"{method or 'Batch request'} failed on every endpoint (round {round_ + 1})")
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    @async_handle_request_caching
+    async def make_request(self, method, params):
+        return await self._route(method, params)
+
+    async def make_batch_request(self, batch_requests):
+        return await self._route(None, None, list(batch_requests))
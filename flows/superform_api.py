@@ -0,0 +1,157 @@
+import os
+import random
+import asyncio
+import logging
+import httpx
+from dotenv import load_dotenv
+from rate_limit import set_rate_budget, throttled_for
+
+load_dotenv(".env")
+
+logger = logging.getLogger(__name__)
+
+# Global configuration
+SUPERFORM_API_URL = os.getenv('SUPERFORM_API_URL', 'https://api.superform.xyz/')
+SUPERFORM_API_TIMEOUT = int(os.getenv('SUPERFORM_API_TIMEOUT', 30))
+SUPERFORM_API_MAX_CONNECTIONS = int(os.getenv('SUPERFORM_API_MAX_CONNECTIONS', 20))
+SUPERFORM_API_MAX_CONCURRENCY = int(os.getenv('SUPERFORM_API_MAX_CONCURRENCY', 10))
+SUPERFORM_API_MAX_REQUESTS_PER_SECOND = float(os.getenv('SUPERFORM_API_MAX_REQUESTS_PER_SECOND', 10))
+SUPERFORM_API_MAX_RETRIES = int(os.getenv('SUPERFORM_API_MAX_RETRIES', 5))
+SUPERFORM_API_BACKOFF = float(os.getenv('SUPERFORM_API_BACKOFF', 1.0))  # seconds, doubled per retry
+SUPERFORM_API_MAX_BACKOFF = 60
+
+# Statuses worth retrying: rate limited, or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class SuperformAPI:
+    """
+    Async client for the Superform REST API.
+
+    All requests share one pooled httpx connection pool and at most `max_concurrency` are
+    in flight at once. Requests draw from a rate budget of `max_requests_per_second`, shared
+    with every client and process on this host; a 429 pauses all of them at once. Responses
+    are revalidated with ETag / Last-Modified, so unchanged resources come back as a body-less
+    304. 429 and 5xx responses are retried with exponential backoff, except that a 429 waits
+    out its Retry-After.
+    """
+    def __init__(
+        self,
+        url=SUPERFORM_API_URL,
+        api_key=None,
+        max_concurrency=SUPERFORM_API_MAX_CONCURRENCY,
+        max_connections=SUPERFORM_API_MAX_CONNECTIONS,
+        max_retries=SUPERFORM_API_MAX_RETRIES,
+        backoff=SUPERFORM_API_BACKOFF,
+        max_requests_per_second=SUPERFORM_API_MAX_REQUESTS_PER_SECOND,
+        transport=None
+    ):
+        self.url = url
+        self.api_key = api_key or os.getenv('SUPERFORM_API_KEY')
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.budget = set_rate_budget(url, max_requests_per_second)
+        self.cache = {}
+        self.client = httpx.AsyncClient(
+            base_url=url,
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'SF-API-KEY': self.api_key or ''
+            },
+            timeout=SUPERFORM_API_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            # Tests swap in a local stand-in server
+            transport=transport
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    def _retry_delay(self, pause, attempt):
+        # A 429's pause from throttled_for(): its Retry-After, in seconds or as an HTTP date
+        if pause is not None:
+            return min(pause, SUPERFORM_API_MAX_BACKOFF)
+        delay = min(self.backoff * 2 ** attempt, SUPERFORM_API_MAX_BACKOFF)
+        return delay * random.uniform(0.5, 1)
+
+    async def _request(self, action):
+        cached = self.cache.get(action)
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            pause = None
+            if self.budget is not None:
+                await self.budget.acquire_async()
+            try:
+                async with self.semaphore:
+                    response = await self.client.get(action, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Request to {action} failed: {str(e)}, retrying")
+            else:
+                if response.status_code == 304 and cached is not None:
+                    return cached['result']
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                if attempt == self.max_retries:
+                    break
+                logger.warning(f"Request to {action} returned {response.status_code}, retrying")
+                pause = throttled_for(response)
+                if pause is not None and self.budget is not None:
+                    # Stop every other request too, rather than each one hitting the limit in turn
+                    self.budget.pause(pause)
+
+            # Back off outside the semaphore so other requests keep flowing
+            await asyncio.sleep(self._retry_delay(pause, attempt))
+
+        response.raise_for_status()
+        result = response.json()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.cache[action] = {'etag': etag, 'last_modified': last_modified, 'result': result}
+        return result
+
+    async def get_vaults(self):
+        return await self._request('vaults')
+
+    async def get_supervaults(self):
+        return await self._request('stats/vault/supervaults')
+
+    async def get_vault_data(self, superform_id):
+        return await self._request(f'vault/{superform_id}')
+
+    async def get_vaults_data(self, superform_ids):
+        """
+        Fetch vault/{id} for every superform ID concurrently.
+
+        Returns {superform_id: data}; IDs whose request failed after all retries map to None.
+        """
+        results = await asyncio.gather(
+            *[self.get_vault_data(superform_id) for superform_id in superform_ids],
+            return_exceptions=True
+        )
+
+        vaults = {}
+        for superform_id, result in zip(superform_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to get vault data for superform {superform_id}: {str(result)}")
+                vaults[superform_id] = None
+            else:
+                vaults[superform_id] = result
+        return vaults
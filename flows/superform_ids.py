@@ -0,0 +1,42 @@
+import binascii
+import numpy as np
+import pandas as pd
+from eth_utils import to_checksum_address
+
+# A superform ID packs three fields into one uint256 (big-endian byte offsets):
+#   bytes  0..7   chain ID                  (uint64)
+#   bytes  8..11  form implementation ID    (uint32)
+#   bytes 12..31  superform address         (address)
+
+def decode_superform_ids(superform_ids, checksum=True):
+    """
+    Split a whole list of superform IDs into their packed fields in one vectorized pass.
+
+    Returns a DataFrame with superform_address, form_implementation_id and
+    superform_chain_id columns, one row per ID, in input order.
+    """
+    count = len(superform_ids)
+    packed = np.frombuffer(
+        b''.join(int(superform_id).to_bytes(32, 'big') for superform_id in superform_ids),
+        dtype=np.uint8
+    ).reshape(count, 32)
+
+    chain_ids = np.ascontiguousarray(packed[:, 0:8]).view('>u8').ravel().astype(np.uint64)
+    implementation_ids = np.ascontiguousarray(packed[:, 8:12]).view('>u4').ravel().astype(np.uint32)
+
+    # Hex-encode all addresses in a single call over the contiguous byte block
+    address_hex = np.frombuffer(
+        binascii.hexlify(np.ascontiguousarray(packed[:, 12:32]).tobytes()),
+        dtype='S40'
+    )
+    addresses = pd.Series(np.char.add(b'0x', address_hex).astype(str), dtype='string')
+    if checksum:
+        # Checksumming needs keccak, so do it once per distinct address
+        unique = addresses.unique()
+        addresses = addresses.map(dict(zip(unique, map(to_checksum_address, unique)))).astype('string')
+
+    return pd.DataFrame({
+        'superform_address': addresses,
+        'form_implementation_id': implementation_ids,
+        'superform_chain_id': chain_ids
+    })
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from prefect import flow, get_run_logger
+from get_apy import form_metric_calls, build_form_metrics, get_cached_form_metadata, store_form_metadata
+from rpc import get_async_web3
+from chains import get_chain_config, get_chain_id_async
+from superform_ids import decode_superform_ids
+from abi_registry import get_contract
+from rpc_metrics import publish_rpc_metrics
+
+load_dotenv(".env")
+
+MAX_CONCURRENT_FORMS = int(os.getenv('MAX_CONCURRENT_FORMS', 10))
+
+async def fetch_superform_metrics(w3, chain_id, superform_id, form_address, semaphore, block_identifier='latest'):
+    metadata = get_cached_form_metadata(chain_id, form_address)
+    async with semaphore:
+        form = get_contract(w3, 'erc4626_form', form_address)
+        results = await form_metric_calls(form, metadata).call_async(block_identifier=block_identifier)
+    store_form_metadata(chain_id, form_address, results)
+
+    metrics = build_form_metrics({**metadata, **results}, block_identifier)
+    metrics['superform_id'] = superform_id
+    metrics['form_address'] = form.address
+    return metrics
+
+@flow(name="SuperVault Forms Flow", on_completion=[publish_rpc_metrics], on_failure=[publish_rpc_metrics])
+async def supervault_forms_flow(vault_address: str | None = None, max_concurrency: int = MAX_CONCURRENT_FORMS, chain_id: int | None = None):
+    logger = get_run_logger()
+    vault_address = vault_address or os.getenv('VAULT_ADDRESS')
+    chain = get_chain_config(chain_id or int(os.getenv('CHAIN_ID', 1)))
+    w3 = get_async_web3(
+        chain.rpcs,
+        max_requests_per_second=chain.max_requests_per_second,
+        max_compute_units_per_second=chain.max_compute_units_per_second
+    )
+
+    # Pin every read to one block so all forms come from the same snapshot
+    chain_id = await get_chain_id_async(w3)
+    block_number = await w3.eth.block_number
+    supervault = get_contract(w3, 'super_vault', vault_address)
+    whitelist = await supervault.functions.getWhitelist().call(block_identifier=block_number)
+    logger.info(f"Fetching metrics for {len(whitelist)} superforms at block {block_number}")
+
+    # Form addresses are packed into the superform IDs, no factory lookups needed
+    form_addresses = decode_superform_ids(whitelist)['superform_address']
+    
+    # Fetch every whitelisted form concurrently, at most max_concurrency in flight
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(
+        *[
+            fetch_superform_metrics(w3, chain_id, superform_id, form_address, semaphore, block_number)
+            for superform_id, form_address in zip(whitelist, form_addresses)
+        ],
+        return_exceptions=True
+    )
+
+    metrics = []
+    for superform_id, result in zip(whitelist, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to get metrics for superform {superform_id}: {str(result)}")
+        else:
+            metrics.append(result)
+
+    logger.info(f"Fetched metrics for {len(metrics)} of {len(whitelist)} superforms")
+    return metrics
+
+if __name__ == "__main__":
+    asyncio.run(supervault_forms_flow())
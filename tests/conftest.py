@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Flows keep their caches under .cache/; point them at a scratch directory before any flow module is imported
+_cache_dir = tempfile.mkdtemp(prefix='super-vault-tests-')
+for name, filename in (
+    ('RATE_LIMIT_PATH', 'rate_limits.db'),
+    ('CALL_CACHE_PATH', 'eth_call_cache.db'),
+    ('BLOCK_INDEX_PATH', 'block_index.db'),
+    ('METADATA_CACHE_PATH', 'contract_metadata.db'),
+):
+    os.environ.setdefault(name, os.path.join(_cache_dir, filename))
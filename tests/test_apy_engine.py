@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from apy_engine import SECONDS_PER_DAY, SECONDS_PER_YEAR, split_uint256, period_apy, rolling_apy
+
+def test_split_uint256_keeps_106_bits():
+    values = [10**30 + 1, 2**105 - 1, 10**36 + 1, 2**256 - 1, 5]
+
+    hi, lo = split_uint256(values)
+
+    assert hi.dtype == lo.dtype == np.float64
+    joined = [int(h) + int(l) for h, l in zip(hi, lo)]
+    assert joined[:2] == values[:2] and joined[-1] == 5
+    assert all(abs(j - v) <= v >> 105 for j, v in zip(joined, values))
+
+def test_split_uint256_marks_missing_values_nan():
+    hi, lo = split_uint256([10**36, None, np.nan])
+    assert hi[0] == 1e36
+    assert np.isnan(hi[1:]).all()
+
+    hi, lo = split_uint256([1.5, np.nan])
+    assert hi[0] == 1.5 and np.isnan(hi[1])
+    assert (lo == 0).all()
+
+def test_period_apy_compounds_and_annualizes():
+    # 1% over half a year
+    start, end = [10**36, 100], [10**36 + 10**34, 101]
+    half_year = SECONDS_PER_YEAR / 2
+
+    assert period_apy(start, end, half_year) == pytest.approx([2.01, 2.01])
+    assert period_apy(start, end, half_year, compound=False) == pytest.approx([2.0, 2.0])
+
+def test_period_apy_is_nan_without_prices_or_elapsed_time():
+    apy = period_apy([None, 100, 100, 100], [101, np.nan, 101, 100], [SECONDS_PER_DAY] * 2 + [0, 0])
+    assert np.isnan(apy).all()
+
+def test_rolling_apy_starts_each_window_once_covered():
+    days = 10
+    index = pd.date_range('2024-01-01', periods=days, freq='D')
+    # One form at 0.1% a day, one missing a price on the fifth day
+    steady = [10**36 * 1001**day // 1000**day for day in range(days)]
+    gappy = [None if day == 4 else 10**6 for day in range(days)]
+    prices = pd.DataFrame({'steady': steady, 'gappy': gappy}, index=index, dtype=object)
+
+    apy = rolling_apy(prices)
+
+    daily = (1.001**365 - 1) * 100
+    assert apy['1d']['steady'].isna().tolist() == [True] + [False] * 9
+    assert apy['1d']['steady'].iloc[1:].to_numpy() == pytest.approx([daily] * 9, rel=1e-9)
+    assert apy['7d']['steady'].isna().sum() == 7
+    assert apy['30d']['steady'].isna().all()
+    # A missing price blanks the windows ending or starting on it
+    assert apy['1d']['gappy'].isna().tolist() == [True, False, False, False, True, True, False, False, False, False]
+    assert (apy['1d']['gappy'].dropna() == 0).all()
+
+def test_rolling_apy_rejects_unsorted_index():
+    prices = pd.DataFrame({'form': [100, 101]}, index=[SECONDS_PER_DAY, 0])
+    with pytest.raises(ValueError):
+        rolling_apy(prices)
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+import pytest
+from rpc import get_web3
+from block_index import BlockIndex
+from event_backfill import log_block_timestamps
+from mock_rpc import MockChain, MockRPCServer
+
+class IrregularChain(MockChain):
+    """Blocks every 12s, except a stretch of 2s blocks and a skipped hour."""
+    def block_timestamp(self, block_number):
+        timestamp = super().block_timestamp(block_number)
+        if 1_000_000 <= block_number < 1_000_500:
+            timestamp -= 10 * (block_number - 1_000_000)
+        elif block_number >= 1_000_500:
+            timestamp += 3600 - 10 * 500
+        return timestamp
+
+@pytest.fixture
+def index(request, tmp_path):
+    chain = getattr(request, 'param', MockChain)()
+    with MockRPCServer(chain) as server:
+        yield BlockIndex(get_web3(server.url), path=str(tmp_path / 'block_index.db')), chain, server
+
+def test_steady_chain_is_interpolated_from_anchors(index):
+    block_index, chain, server = index
+    block_numbers = range(900_000, 1_100_000, 100)
+
+    timestamps = block_index.interpolate_block_timestamps(block_numbers)
+
+    assert timestamps == {block_number: chain.block_timestamp(block_number) for block_number in block_numbers}
+    # Both ends and the block halfway between them
+    assert server.calls['eth_getBlockByNumber'] == 3
+
+@pytest.mark.parametrize('index', [IrregularChain], indirect=True)
+def test_irregular_stretches_are_fetched_exactly(index):
+    block_index, chain, server = index
+    block_numbers = range(900_000, 1_100_000, 100)
+
+    timestamps = block_index.interpolate_block_timestamps(block_numbers)
+
+    assert timestamps == {block_number: chain.block_timestamp(block_number) for block_number in block_numbers}
+    assert server.calls['eth_getBlockByNumber'] < len(block_numbers) // 4
+
+def test_few_blocks_are_fetched_exactly(index):
+    block_index, chain, server = index
+
+    assert block_index.interpolate_block_timestamps([5, 7, 9]) == {
+        block_number: chain.block_timestamp(block_number) for block_number in (5, 7, 9)
+    }
+    assert server.calls['eth_getBlockByNumber'] == 3
+
+def test_log_block_timestamps_are_used_when_present(index):
+    block_index, chain, server = index
+    logs = [
+        {'blockNumber': hex(10), 'blockTimestamp': hex(1_600_000_000)},
+        {'blockNumber': hex(20)},
+    ]
+
+    assert log_block_timestamps(logs, block_index) == {
+        10: datetime.fromtimestamp(1_600_000_000, timezone.utc),
+        20: datetime.fromtimestamp(chain.block_timestamp(20), timezone.utc),
+    }
+    assert server.calls['eth_getBlockByNumber'] == 1
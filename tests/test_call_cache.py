@@ -0,0 +1,27 @@
+from call_cache import CallCache
+
+TRANSACTION = {
+    'from': '0x473b1CE36Dec21Fc1275c4032731C8469BFf371a',
+    'to': '0xcA11bde05977b3631167028862bE2a173976CA11',
+    'data': '0x70A08231',
+}
+
+def _key(transaction=TRANSACTION, state_overrides=None, block_number=100):
+    return CallCache.make_key(1, block_number, transaction, state_overrides)
+
+def test_key_ignores_address_case_and_input_alias():
+    lowercase = {name: value.lower() for name, value in TRANSACTION.items()}
+    aliased = {'from': TRANSACTION['from'], 'to': TRANSACTION['to'], 'input': TRANSACTION['data']}
+    assert _key(lowercase) == _key(aliased) == _key()
+
+def test_key_depends_on_every_transaction_field():
+    assert _key({**TRANSACTION, 'value': '0x1'}) != _key()
+    assert _key({**TRANSACTION, 'value': '0x1'}) != _key({**TRANSACTION, 'value': '0x2'})
+    assert _key({**TRANSACTION, 'gas': '0x5208'}) != _key()
+    assert _key(block_number=101) != _key()
+
+def test_key_depends_on_state_overrides():
+    override = {TRANSACTION['to']: {'balance': '0x1'}}
+    assert _key(state_overrides=override) != _key()
+    assert _key(state_overrides=override) != _key(state_overrides={TRANSACTION['to']: {'balance': '0x2'}})
+    assert _key(state_overrides={}) == _key()
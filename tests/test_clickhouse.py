@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from clickhouse import insert_dataframe, to_uint256
+
+class RecordingClient:
+    """Stands in for a clickhouse_driver Client, recording which insert path each block took."""
+    def __init__(self):
+        self.inserts = []
+
+    def insert_dataframe(self, query, dataframe, **kwargs):
+        self.inserts.append(('numpy', query, len(dataframe)))
+        return len(dataframe)
+
+    def execute(self, query, columns, columnar=False):
+        self.inserts.append(('columns', query, len(columns[0])))
+        return len(columns[0])
+
+def _paths(data, block_size=2):
+    client = RecordingClient()
+    total_rows = insert_dataframe(client, data, 'events', block_size)
+    assert total_rows == len(data)
+    return [path for path, _, _ in client.inserts]
+
+def test_string_columns_keep_numpy_path():
+    data = pd.DataFrame({
+        'chain_id': [1, 1, 8453],
+        'vault_address': ['0xa', '0xb', '0xc'],
+        'event_name': ['Deposit', 'Withdraw', 'Deposit'],
+    })
+    assert _paths(data) == ['numpy', 'numpy']
+
+def test_uint256_columns_take_column_list_path():
+    data = pd.DataFrame({
+        'vault_address': ['0xa', '0xb', '0xc'],
+        'form_id': to_uint256([1, 2 ** 200, '0xff']),
+    })
+    assert _paths(data) == ['columns', 'columns']
+
+def test_ints_past_64_bits_take_column_list_path():
+    data = pd.DataFrame({'value': pd.Series([None, 2 ** 70], dtype=object)})
+    assert _paths(data) == ['columns']
+
+def test_to_uint256_rejects_out_of_range_values():
+    with pytest.raises(ValueError):
+        to_uint256([-1])
+    with pytest.raises(ValueError):
+        to_uint256([2 ** 256])
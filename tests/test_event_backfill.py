@@ -0,0 +1,77 @@
+import pytest
+import requests
+from web3.exceptions import Web3RPCError
+import mock_rpc
+import event_backfill
+from event_backfill import iter_log_chunks, _is_range_too_large
+from rpc import get_web3
+from mock_rpc import MockChain, MockRPCServer, add_super_positions
+
+def _http_error(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode()
+    return requests.HTTPError(f"{status} error", response=response)
+
+@pytest.mark.parametrize('error', [
+    _http_error(400, '{"error": "block range too large"}'),
+    _http_error(413, ''),
+    Web3RPCError("{'code': -32005, 'message': 'query returned more than 10000 results'}"),
+    Web3RPCError("{'code': -32602, 'message': 'Log response size exceeded'}"),
+    Web3RPCError("{'code': -32000, 'message': 'eth_getLogs is limited to a 10,000 blocks range'}"),
+])
+def test_range_errors_are_recognised(error):
+    assert _is_range_too_large(error)
+
+@pytest.mark.parametrize('error', [
+    _http_error(429, 'Too Many Requests'),
+    _http_error(429, '{"error": "block range too large"}'),
+    _http_error(503, 'Service Unavailable'),
+    Web3RPCError("{'code': -32005, 'message': 'limit exceeded'}"),
+    requests.ConnectionError('connection reset'),
+])
+def test_throttling_and_outages_are_not_range_errors(error):
+    assert not _is_range_too_large(error)
+
+MAX_LOGS = 1_000
+
+@pytest.fixture
+def dense_chain(monkeypatch):
+    """One log per block, so ranges over MAX_LOGS blocks are rejected."""
+    monkeypatch.setattr(mock_rpc, 'MOCK_MAX_LOGS', MAX_LOGS)
+    chain = MockChain()
+    address = add_super_positions(chain, log_interval=1)
+    with MockRPCServer(chain) as server:
+        yield get_web3(server.url), address, server
+
+def _chunk_sizes(chunks):
+    sizes = []
+    expected_from = None
+    for from_block, to_block, logs in chunks:
+        assert expected_from in (None, from_block)
+        assert len(logs) == to_block - from_block + 1
+        sizes.append(to_block - from_block + 1)
+        expected_from = to_block + 1
+    return sizes
+
+def test_rejected_range_is_halved_and_never_regrown(dense_chain, monkeypatch):
+    # Keep doubling while under target, so growth runs into the provider's limit
+    monkeypatch.setattr(event_backfill, 'TARGET_LOGS_PER_CHUNK', 10 * MAX_LOGS)
+    w3, address, server = dense_chain
+
+    sizes = _chunk_sizes(iter_log_chunks(w3, address, None, 0, 3_100, chunk_size=100))
+
+    assert sizes == [100, 200, 400, 800, 800, 800, 1]
+    # The 1,600 block range was asked for once, then never again
+    assert server.calls['eth_getLogs'] == len(sizes) + 1
+
+def test_sparse_ranges_grow_and_dense_ranges_shrink(dense_chain, monkeypatch):
+    monkeypatch.setattr(event_backfill, 'TARGET_LOGS_PER_CHUNK', 100)
+    w3, address, _ = dense_chain
+
+    sizes = _chunk_sizes(iter_log_chunks(w3, address, None, 0, 309, chunk_size=10))
+    # Below half the target doubles, above twice the target halves
+    assert sizes == [10, 20, 40, 80, 80, 80]
+
+    sizes = _chunk_sizes(iter_log_chunks(w3, address, None, 0, 1_599, chunk_size=800))
+    assert sizes == [800, 400, 200, 200]
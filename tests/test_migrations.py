@@ -0,0 +1,92 @@
+import time
+import threading
+import migrations
+from migrations import MIGRATIONS, apply_migrations
+
+class FakeClickHouse:
+    """In-memory schema_migrations and schema_migration_claims; every other statement is recorded."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claims = []
+        self.applied = []
+        self.statements = []
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        with self.lock:
+            if query.startswith('INSERT INTO schema_migration_claims'):
+                self.claims.extend((time.monotonic(), version, owner) for version, owner in params)
+                return len(params)
+            if query.startswith('SELECT owner FROM schema_migration_claims'):
+                live = sorted(
+                    (claimed_at, owner) for claimed_at, version, owner in self.claims
+                    if version == params['version'] and claimed_at > time.monotonic() - params['timeout']
+                )
+                return [(live[0][1],)] if live else []
+            if query.startswith('SELECT DISTINCT version FROM schema_migrations'):
+                return [(version,) for version in sorted({version for version, _, _ in self.applied})]
+            if query.startswith('INSERT INTO schema_migrations'):
+                self.applied.extend(params)
+                return len(params)
+            self.statements.append(query)
+            return []
+
+def _migration(version, calls, duration=0.0):
+    def step(client):
+        calls.append(version)
+        time.sleep(duration)
+    return (version, f'migration_{version}', [step])
+
+def test_applies_pending_migrations_in_order_once():
+    client = FakeClickHouse()
+    calls = []
+
+    applied = apply_migrations(client, [_migration(2, calls), _migration(1, calls)])
+    assert applied == ['migration_1', 'migration_2']
+    assert calls == [1, 2]
+
+    assert apply_migrations(client, [_migration(2, calls), _migration(1, calls)]) == []
+    assert calls == [1, 2]
+
+def test_concurrent_processes_apply_a_migration_once(monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATION_POLL_INTERVAL', 0.01)
+    client = FakeClickHouse()
+    calls = []
+    version, name, steps = _migration(1, calls, duration=0.2)
+    results = []
+
+    # Separate owners stand in for separate processes, which the in-process lock doesn't cover
+    threads = [
+        threading.Thread(target=lambda owner=owner: results.append(
+            migrations._apply_migration(client, version, name, steps, owner)
+        ))
+        for owner in ('process-a', 'process-b', 'process-c')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert sorted(results) == [False, False, True]
+    assert [applied_version for applied_version, _, _ in client.applied] == [1]
+
+def test_lapsed_claim_is_taken_over(monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATION_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(migrations, 'MIGRATION_CLAIM_TIMEOUT', 0.2)
+    client = FakeClickHouse()
+    calls = []
+    # A process that claimed the migration and died before recording it
+    client.claims.append((time.monotonic(), 1, 'dead-process'))
+
+    started = time.monotonic()
+    assert apply_migrations(client, [_migration(1, calls)]) == ['migration_1']
+    assert time.monotonic() - started >= 0.2
+    assert calls == [1]
+
+def test_schema_steps_are_idempotent():
+    # Interrupted migrations are applied again, so every SQL step must tolerate existing objects
+    for _, _, steps in MIGRATIONS:
+        for step in steps:
+            if not callable(step):
+                assert 'IF NOT EXISTS' in step
@@ -0,0 +1,65 @@
+import pytest
+from web3.exceptions import Web3RPCError
+from abi_registry import get_contract
+from multicall import Multicall, multicall
+from mock_rpc import MockChain, MockRPCServer, add_supervault
+from rpc import get_web3
+
+MISSING = '0x' + '11' * 20
+
+@pytest.fixture
+def vault():
+    chain = MockChain()
+    vault_address, forms = add_supervault(chain, forms=3)
+    with MockRPCServer(chain) as server:
+        w3 = get_web3(server.url)
+        yield w3, get_contract(w3, 'super_vault', vault_address), get_contract(w3, 'erc4626_form', forms[1]), server
+
+def test_results_match_direct_calls(vault):
+    w3, super_vault, form, _ = vault
+    block = w3.eth.block_number
+    calls = {
+        'name': form.functions.getVaultName(),
+        'decimals': form.functions.getVaultDecimals(),
+        'data': super_vault.functions.getSuperVaultData(),
+    }
+
+    results = multicall(w3, calls, block_identifier=block)
+
+    assert results == {key: fn.call(block_identifier=block) for key, fn in calls.items()}
+    assert results['name'] == 'Mock Vault 1'
+    assert isinstance(results['data'], list) and len(results['data']) == 2
+
+def test_failed_calls_are_none_when_allowed(vault):
+    w3, _, form, _ = vault
+    missing = get_contract(w3, 'erc4626_form', MISSING)
+
+    results = multicall(w3, {
+        'missing': missing.functions.getVaultName(),
+        'symbol': form.functions.getVaultSymbol(),
+    })
+
+    assert results == {'missing': None, 'symbol': 'MV1'}
+
+def test_failed_calls_revert_the_batch_when_not_allowed(vault):
+    w3, _, form, _ = vault
+    missing = get_contract(w3, 'erc4626_form', MISSING)
+
+    with pytest.raises(Web3RPCError):
+        multicall(w3, {
+            'missing': missing.functions.getVaultName(),
+            'symbol': form.functions.getVaultSymbol(),
+        }, allow_failure=False)
+
+def test_calls_are_split_into_batches(vault):
+    w3, super_vault, _, server = vault
+    batch = Multicall(w3, max_calls_per_batch=2)
+    for index in range(3):
+        batch.add(index, super_vault.functions.superformIds(index))
+    batch.add_chain_id()
+
+    results = batch.call()
+
+    assert list(results) == [0, 1, 2, 'chain_id']
+    assert results['chain_id'] == w3.eth.chain_id
+    assert server.eth_calls['aggregate3'] == 2
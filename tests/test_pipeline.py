@@ -0,0 +1,54 @@
+import time
+import itertools
+import pytest
+from pipeline import Stage, batched
+
+JOIN_TIMEOUT = 5
+
+def _counter(closed):
+    try:
+        for item in itertools.count():
+            # Slower than its consumers, so they are left waiting on it when the chain closes
+            time.sleep(0.05)
+            yield item
+    finally:
+        closed.append(True)
+
+def _doubled(stage):
+    for item in stage:
+        yield item * 2
+
+def test_closing_chain_mid_stream_stops_every_thread():
+    closed = []
+    with Stage(_counter(closed), maxsize=1, name='fetch') as fetch, \
+            Stage(_doubled(fetch), maxsize=2, name='decode') as decode, \
+            Stage(_doubled(decode), maxsize=1, name='insert') as insert:
+        assert [insert.get() for _ in range(3)] == [0, 4, 8]
+
+    for stage in (fetch, decode, insert):
+        stage.thread.join(JOIN_TIMEOUT)
+        assert not stage.thread.is_alive(), f"{stage.thread.name} still running"
+    assert closed == [True]
+
+def test_source_error_reaches_consumer_through_chain():
+    def failing():
+        yield 1
+        raise ValueError('boom')
+
+    with Stage(_doubled(Stage(failing()))) as stage:
+        assert stage.get() == 2
+        with pytest.raises(ValueError, match='boom'):
+            stage.get()
+        with pytest.raises(StopIteration):
+            stage.get()
+
+def test_batched_flushes_on_size_and_interval():
+    def slow():
+        yield from [1, 2, 3]
+        time.sleep(0.3)
+        yield 4
+
+    with Stage(slow()) as stage:
+        batches = list(batched(stage, max_size=2, max_interval=0.1, size=lambda item: 1))
+
+    assert batches == [[1, 2], [3], [4]]
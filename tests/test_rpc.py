@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import rpc
+from rpc import get_web3, batch_request
+
+class StandIn:
+    """
+    JSON-RPC endpoint answering each request with the next (status, body) of `responses`,
+    repeating the last one; a None body answers the request with `result`.
+    """
+    def __init__(self, *responses, result='0x1'):
+        self.responses = list(responses)
+        self.result = result
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _next(self, body):
+        requests = body if isinstance(body, list) else [body]
+        with self.lock:
+            for request in requests:
+                self.calls[request['method']] += 1
+            status, payload = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if payload is None:
+            results = [{'jsonrpc': '2.0', 'id': request['id'], 'result': self.result} for request in requests]
+            payload = results if isinstance(body, list) else results[0]
+        return status, json.dumps(payload).encode()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                status, payload = stand_in._next(body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rpc, 'RPC_RETRY_BACKOFF', 0.0)
+
+RANGE_TOO_LARGE = {'error': 'block range too large'}
+
+def test_client_errors_are_not_retried():
+    with StandIn((400, RANGE_TOO_LARGE)) as endpoint:
+        w3 = get_web3(endpoint.url)
+        with pytest.raises(requests.HTTPError):
+            w3.eth.get_logs({'fromBlock': 0, 'toBlock': 2000})
+    assert endpoint.calls['eth_getLogs'] == 1
+
+def test_server_errors_are_retried():
+    with StandIn((503, {'error': 'unavailable'}), (502, {'error': 'bad gateway'}), (200, None)) as endpoint:
+        w3 = get_web3(endpoint.url)
+        assert w3.eth.block_number == 1
+    assert endpoint.calls['eth_blockNumber'] == 3
+
+def test_batch_client_errors_are_not_retried():
+    with StandIn((413, {'error': 'payload too large'})) as endpoint:
+        w3 = get_web3(endpoint.url)
+        with pytest.raises(requests.HTTPError):
+            batch_request(w3, [('eth_blockNumber', [])] * 3)
+    assert endpoint.calls['eth_blockNumber'] == 3
+
+def test_batch_server_errors_are_retried():
+    with StandIn((503, {'error': 'unavailable'}), (200, None)) as endpoint:
+        w3 = get_web3(endpoint.url)
+        assert batch_request(w3, [('eth_blockNumber', [])] * 2) == ['0x1', '0x1']
+    assert endpoint.calls['eth_blockNumber'] == 4
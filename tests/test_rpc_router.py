@@ -0,0 +1,178 @@
+import time
+import socket
+import asyncio
+import pytest
+import requests
+import rpc_router
+from concurrent.futures import ThreadPoolExecutor
+from rpc_router import RPCRouter, AsyncRPCRouter, EndpointHealth, EndpointScoreboard, EWMA_WEIGHT
+from mock_rpc import MockChain, MockRPCServer
+
+@pytest.fixture
+def chain():
+    return MockChain()
+
+@pytest.fixture
+def start_server(chain):
+    servers = []
+
+    def start(**kwargs):
+        server = MockRPCServer(chain, seed=len(servers), **kwargs)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def unreachable_url():
+    # A port nothing listens on, so connections are refused
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+def _block_numbers(router, count):
+    return [router.make_request('eth_blockNumber', [])['result'] for _ in range(count)]
+
+async def _async_block_numbers(router, count):
+    try:
+        return [(await router.make_request('eth_blockNumber', []))['result'] for _ in range(count)]
+    finally:
+        for provider in router.providers.values():
+            await provider.disconnect()
+
+def test_fails_over_from_failing_endpoint(chain, start_server):
+    failing = start_server(failure_rate=1.0)
+    healthy = start_server()
+    router = RPCRouter([failing.url, healthy.url])
+
+    assert _block_numbers(router, 10) == [hex(chain.head_block)] * 10
+    assert healthy.calls['eth_blockNumber'] == 10
+    # Cooling down after its first failure, the failing endpoint is not tried again
+    assert failing.failures == 1
+
+def test_fails_over_from_unreachable_endpoint(chain, start_server, unreachable_url):
+    healthy = start_server()
+    router = RPCRouter([unreachable_url, healthy.url])
+
+    assert _block_numbers(router, 5) == [hex(chain.head_block)] * 5
+    assert healthy.calls['eth_blockNumber'] == 5
+    assert router.scoreboard.ranked()[0] == healthy.url
+
+def test_raises_when_every_endpoint_fails(start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_ROUTER_RETRIES', 1)
+    servers = [start_server(failure_rate=1.0), start_server(failure_rate=1.0)]
+    router = RPCRouter([server.url for server in servers])
+
+    with pytest.raises(requests.HTTPError):
+        router.make_request('eth_blockNumber', [])
+    # Both endpoints, in both rounds
+    assert [server.failures for server in servers] == [2, 2]
+
+def test_slow_read_is_hedged_after_delay(chain, start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_HEDGE_DEFAULT_DELAY', 0.05)
+    slow = start_server(latency=0.5)
+    fast = start_server()
+    router = RPCRouter([slow.url, fast.url])
+
+    started = time.monotonic()
+    assert _block_numbers(router, 1) == [hex(chain.head_block)]
+    assert time.monotonic() - started < 0.4
+    assert fast.calls['eth_blockNumber'] == 1
+
+    # The primary was sent the request too, and still answers it
+    time.sleep(0.6)
+    assert slow.calls['eth_blockNumber'] == 1
+
+def test_fast_read_is_not_hedged(start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_HEDGE_DEFAULT_DELAY', 0.5)
+    primary = start_server()
+    secondary = start_server()
+    router = RPCRouter([primary.url, secondary.url])
+
+    _block_numbers(router, 5)
+    # Unmeasured endpoints are probed in turn, but no request is sent twice
+    assert primary.calls['eth_blockNumber'] + secondary.calls['eth_blockNumber'] == 5
+    assert router.scoreboard.hedges == 0
+
+def test_recovered_endpoint_wins_back_traffic(start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_MAX_COOLDOWN', 0.1)
+    monkeypatch.setattr(rpc_router, 'RPC_PROBE_INTERVAL', 0.2)
+    fast = start_server(failure_rate=1.0)
+    slow = start_server(latency=0.02)
+    router = RPCRouter([fast.url, slow.url])
+
+    _block_numbers(router, 5)
+    assert slow.calls['eth_blockNumber'] == 5
+    health = router.scoreboard.health[fast.url]
+    error_ewma = health.error_ewma
+    assert error_ewma > 0
+
+    # Once its cooldown and the probe interval pass, the endpoint is measured again,
+    # its error score decays and its lower latency wins the traffic back
+    fast.failure_rate = 0.0
+    time.sleep(0.3)
+    _block_numbers(router, 20)
+    assert fast.calls['eth_blockNumber'] >= 15
+    assert health.error_ewma < error_ewma
+
+def test_unmeasured_endpoints_are_probed_one_request_at_a_time():
+    scoreboard = EndpointScoreboard(['http://a', 'http://b', 'http://c'])
+
+    # Three requests routed before any answers each probe a different endpoint
+    assert [scoreboard.ranked()[0] for _ in range(3)] == ['http://a', 'http://b', 'http://c']
+
+    # Once measured, the fastest takes the traffic while the others' probes are in flight
+    scoreboard.record('http://b', 0.01, failed=False)
+    assert scoreboard.ranked()[:2] == ['http://b', 'http://a']
+    scoreboard.record('http://a', 0.001, failed=False)
+    assert scoreboard.ranked()[0] == 'http://a'
+
+def test_concurrent_first_reads_spread_over_endpoints(start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_HEDGE_DEFAULT_DELAY', 5.0)
+    servers = [start_server(latency=0.2) for _ in range(3)]
+    router = RPCRouter([server.url for server in servers])
+
+    with ThreadPoolExecutor(3) as executor:
+        list(executor.map(lambda _: router.make_request('eth_blockNumber', []), range(3)))
+
+    assert [server.calls['eth_blockNumber'] for server in servers] == [1, 1, 1]
+
+def test_error_score_decays_with_successes():
+    health = EndpointHealth('http://endpoint')
+    health.record(0.01, failed=True)
+    health.record(0.01, failed=True)
+    assert health.error_ewma == pytest.approx(1 - (1 - EWMA_WEIGHT) ** 2)
+    assert health.cooldown_until > time.monotonic()
+
+    error_ewma = health.error_ewma
+    for _ in range(5):
+        health.record(0.01, failed=False)
+    assert health.error_ewma == pytest.approx(error_ewma * (1 - EWMA_WEIGHT) ** 5)
+    assert health.consecutive_failures == 0
+    assert health.cooldown_until == 0.0
+
+def test_async_fails_over_from_failing_endpoint(chain, start_server):
+    failing = start_server(failure_rate=1.0)
+    healthy = start_server()
+    router = AsyncRPCRouter([failing.url, healthy.url])
+
+    assert asyncio.run(_async_block_numbers(router, 10)) == [hex(chain.head_block)] * 10
+    assert healthy.calls['eth_blockNumber'] == 10
+    assert failing.failures == 1
+
+def test_async_slow_read_is_hedged_after_delay(chain, start_server, monkeypatch):
+    monkeypatch.setattr(rpc_router, 'RPC_HEDGE_DEFAULT_DELAY', 0.05)
+    slow = start_server(latency=0.5)
+    fast = start_server()
+    router = AsyncRPCRouter([slow.url, fast.url])
+
+    started = time.monotonic()
+    assert asyncio.run(_async_block_numbers(router, 1)) == [hex(chain.head_block)]
+    assert time.monotonic() - started < 0.4
+    assert fast.calls['eth_blockNumber'] == 1
+    # The cancelled loser was slow, not failing
+    assert router.scoreboard.health[slow.url].error_ewma == 0.0
@@ -0,0 +1,145 @@
+import json
+import time
+import uuid
+import asyncio
+from collections import namedtuple
+import httpx
+import pytest
+from superform_api import SuperformAPI
+
+Request = namedtuple('Request', ['path', 'headers'])
+
+class StandIn:
+    """ASGI stand-in for the Superform API: `handle(request)` returns (status, headers, body)."""
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        self.statuses = []
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope['path'], {name.decode().lower(): value.decode() for name, value in scope['headers']})
+        self.requests.append(request)
+        status, headers, body = self.handle(request)
+        self.statuses.append(status)
+        payload = json.dumps(body).encode() if body is not None else b''
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+                + [(b'content-length', str(len(payload)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+def _api(transport, **kwargs):
+    # A fresh URL per client, so rate budgets and their pauses never leak between tests
+    return SuperformAPI(url=f'http://superform-{uuid.uuid4().hex}/', transport=transport, backoff=0, **kwargs)
+
+def _run(transport, calls, **kwargs):
+    async def main():
+        async with _api(transport, **kwargs) as api:
+            return [await call(api) for call in calls]
+    return asyncio.run(main())
+
+def _scripted(*responses):
+    """Answer with each response in turn, repeating the last one."""
+    responses = list(responses)
+    return lambda request: responses.pop(0) if len(responses) > 1 else responses[0]
+
+def test_unchanged_resource_is_revalidated_with_etag():
+    def handle(request):
+        if request.headers.get('if-none-match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, None
+        return 200, {'ETag': '"v1"'}, [{'id': 1}]
+    app = StandIn(handle)
+
+    first, second = _run(httpx.ASGITransport(app=app), [SuperformAPI.get_vaults, SuperformAPI.get_vaults])
+
+    assert first == second == [{'id': 1}]
+    assert [request.headers.get('if-none-match') for request in app.requests] == [None, '"v1"']
+    assert app.statuses == [200, 304]
+
+def test_last_modified_is_sent_back():
+    last_modified = 'Wed, 21 Oct 2026 07:28:00 GMT'
+    app = StandIn(_scripted((200, {'Last-Modified': last_modified}, {'apy': 5}), (304, {}, None)))
+
+    results = _run(httpx.ASGITransport(app=app), [SuperformAPI.get_supervaults] * 2)
+
+    assert results == [{'apy': 5}, {'apy': 5}]
+    assert app.requests[1].headers.get('if-modified-since') == last_modified
+
+def test_server_errors_are_retried():
+    app = StandIn(_scripted((503, {}, None), (502, {}, None), (200, {}, {'id': 7})))
+
+    [result] = _run(httpx.ASGITransport(app=app), [lambda api: api.get_vault_data(7)])
+
+    assert result == {'id': 7}
+    assert app.statuses == [503, 502, 200]
+    assert {request.path for request in app.requests} == {'/vault/7'}
+
+def test_rate_limited_request_is_retried_after_retry_after():
+    app = StandIn(_scripted((429, {'Retry-After': '0'}, None), (200, {}, {'id': 1})))
+
+    [result] = _run(httpx.ASGITransport(app=app), [SuperformAPI.get_vaults])
+
+    assert result == {'id': 1}
+    assert app.statuses == [429, 200]
+
+def test_retry_after_may_be_an_http_date():
+    app = StandIn(_scripted((429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, None), (200, {}, {'id': 1})))
+
+    started = time.monotonic()
+    [result] = _run(httpx.ASGITransport(app=app), [SuperformAPI.get_vaults])
+
+    # A date already past means retry at once
+    assert result == {'id': 1}
+    assert time.monotonic() - started < 1
+
+def test_server_errors_raise_once_retries_run_out():
+    app = StandIn(_scripted((500, {}, None)))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(httpx.ASGITransport(app=app), [SuperformAPI.get_vaults], max_retries=2)
+    assert app.statuses == [500, 500, 500]
+
+def test_client_errors_are_not_retried():
+    app = StandIn(_scripted((404, {}, None)))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(httpx.ASGITransport(app=app), [SuperformAPI.get_vaults])
+    assert app.statuses == [404]
+
+def test_timeouts_are_retried():
+    attempts = []
+
+    def handle(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise httpx.ReadTimeout('timed out', request=request)
+        return httpx.Response(200, json={'id': 1})
+
+    [result] = _run(httpx.MockTransport(handle), [SuperformAPI.get_vaults])
+
+    assert result == {'id': 1}
+    assert len(attempts) == 3
+
+def test_timeouts_raise_once_retries_run_out():
+    attempts = []
+
+    def handle(request):
+        attempts.append(request)
+        raise httpx.ReadTimeout('timed out', request=request)
+
+    with pytest.raises(httpx.ReadTimeout):
+        _run(httpx.MockTransport(handle), [SuperformAPI.get_vaults], max_retries=1)
+    assert len(attempts) == 2
+
+def test_failed_vaults_map_to_none():
+    def handle(request):
+        if request.path == '/vault/2':
+            return 404, {}, None
+        return 200, {}, {'path': request.path}
+    app = StandIn(handle)
+
+    [vaults] = _run(httpx.ASGITransport(app=app), [lambda api: api.get_vaults_data([1, 2, 3])])
+
+    assert vaults == {1: {'path': '/vault/1'}, 2: None, 3: {'path': '/vault/3'}}
@@ -0,0 +1,25 @@
+from eth_utils import to_checksum_address
+from superform_ids import decode_superform_ids
+
+ADDRESSES = ['0x' + 'ab' * 20, '0x00000000000000000000000000000000000000ff', '0x' + 'ab' * 20]
+
+def _pack(chain_id, implementation_id, address):
+    return (chain_id << 192) | (implementation_id << 160) | int(address, 16)
+
+def test_fields_are_unpacked_in_input_order():
+    fields = [(2**64 - 1, 1, ADDRESSES[0]), (137, 2**32 - 1, ADDRESSES[1]), (1, 0, ADDRESSES[2])]
+
+    decoded = decode_superform_ids([_pack(*field) for field in fields])
+
+    assert decoded['superform_chain_id'].tolist() == [2**64 - 1, 137, 1]
+    assert decoded['form_implementation_id'].tolist() == [1, 2**32 - 1, 0]
+    assert decoded['superform_address'].tolist() == [to_checksum_address(address) for address in ADDRESSES]
+
+def test_addresses_can_stay_lowercase():
+    decoded = decode_superform_ids([str(_pack(8453, 3, ADDRESSES[1]))], checksum=False)
+    assert decoded.iloc[0].tolist() == [ADDRESSES[1], 3, 8453]
+
+def test_no_ids_decode_to_an_empty_frame():
+    decoded = decode_superform_ids([])
+    assert decoded.empty
+    assert list(decoded.columns) == ['superform_address', 'form_implementation_id', 'superform_chain_id']